@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 from pathlib import Path
+from typing import Iterator
 import boto3
 import os
 import logging
@@ -31,7 +32,7 @@ def upload_file_object(file_name: Path, object_name: str) -> None:
     """
     try:
         response = S3_CLIENT.upload_file(file_name, S3_BUCKET, object_name)
-        logger.info(f"Save {object_name} successfully to {S3_BUCKET}")
+        logger.info("Save %s successfully to %s", object_name, S3_BUCKET, extra={"fields": {"object_name": object_name, "bucket": S3_BUCKET}})
     except ClientError as error:
         logger.error(error)
         raise error
@@ -58,13 +59,45 @@ def upload_file_bytes(file_content: bytes, object_name: str) -> None:
         raise error
 
     if response:
-        logger.info(f"Save {object_name} successfully to {S3_BUCKET}")
+        logger.info("Save %s successfully to %s", object_name, S3_BUCKET, extra={"fields": {"object_name": object_name, "bucket": S3_BUCKET}})
 
 
 def download_file(object_name: str, save_path: str):
     return S3_CLIENT.download_file(S3_BUCKET, object_name, save_path)
 
 
+def list_objects(prefix: str = "") -> Iterator[dict]:
+    """
+    List the objects of the bucket, page by page
+
+    Args:
+        prefix (str): only the objects whose name starts with it
+
+    Yields:
+        dict: the S3 description of an object, with `Key`, `ETag`, `LastModified` and `Size`
+    """
+    paginator = S3_CLIENT.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=S3_BUCKET, Prefix=prefix):
+        yield from page.get("Contents", [])
+
+
+def read_object(object_name: str) -> bytes:
+    """
+    Read the content of an object of the bucket
+
+    Args:
+        object_name (str): the name of the file on the data lake
+
+    Raises:
+        error: fail to read the object due to ClientError
+    """
+    try:
+        return S3_CLIENT.get_object(Bucket=S3_BUCKET, Key=object_name)["Body"].read()
+    except ClientError as error:
+        logger.error(error)
+        raise error
+
+
 def download_bucket(save_folder: str | Path):
     for object in S3_CLIENT.list_objects(Bucket=S3_BUCKET)["Contents"]:
         try:
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""Local HTTP server faking FinnHub, Yahoo and the news sites from the fixtures (see `benchmark/fixtures.py`).
+
+Every response is delayed by `latency` seconds, log-normally spread by `jitter`, and fails with a random 429 / 500 /
+502 with probability `error_rate`. Run from the `app` folder:
+    python -m benchmark.fake_upstream --port 8900 --latency 0.2 --jitter 0.5 --error-rate 0.02
+
+Routes:
+    GET /api/v1/stock/candle?symbol=&from=&to=   FinnHub `stock_candles`
+    GET /yahoo/<TICKER>/history?period=           Yahoo history as records, Date as ISO string
+    GET /news/<N>                                 article HTML
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+
+import pandas as pd
+import requests
+from aiohttp import web
+
+from . import fixtures
+
+INJECTED_STATUSES = (429, 500, 502)
+
+
+def create_app(latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, seed: int | None = None) -> web.Application:
+    rng = random.Random(seed)
+
+    @web.middleware
+    async def inject(request: web.Request, handler):
+        delay = latency * rng.lognormvariate(0, jitter) if jitter else latency
+        if delay:
+            await asyncio.sleep(delay)
+        if rng.random() < error_rate:
+            return web.json_response({"error": "Injected failure"}, status=rng.choice(INJECTED_STATUSES))
+        return await handler(request)
+
+    async def finnhub_candle(request: web.Request) -> web.Response:
+        query = request.query
+        return web.json_response(fixtures.finnhub_window(query["symbol"], int(query["from"]), int(query["to"])))
+
+    async def yahoo_history(request: web.Request) -> web.Response:
+        frame = fixtures.ReplayYFinance.Ticker(request.match_info["ticker"]).history(period=request.query.get("period", "1mo")).reset_index()
+        frame["Date"] = frame["Date"].map(lambda value: value.isoformat())
+        return web.Response(text=frame.to_json(orient="records"), content_type="application/json")
+
+    async def news(request: web.Request) -> web.Response:
+        return web.Response(text=fixtures.news_html(int(request.match_info["index"])), content_type="text/html")
+
+    app = web.Application(middlewares=[inject])
+    app.router.add_get("/api/v1/stock/candle", finnhub_candle)
+    app.router.add_get("/yahoo/{ticker}/history", yahoo_history)
+    app.router.add_get("/news/{index:\\d+}", news)
+    return app
+
+
+def serve(host: str = "127.0.0.1", port: int = 8900, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, seed: int | None = None) -> None:
+    web.run_app(create_app(latency, jitter, error_rate, seed), host=host, port=port, print=None)
+
+
+def http_yfinance(base_url: str) -> type:
+    """Build a stand-in for the `yfinance` module fetching the history from the fake upstream at *base_url*."""
+    session = requests.Session()
+
+    class HttpTicker:
+        def __init__(self, ticker: str):
+            self.ticker = ticker
+
+        def history(self, period: str = "1mo", **_) -> pd.DataFrame:
+            response = session.get(f"{base_url}/yahoo/{self.ticker}/history", params={"period": period}, timeout=30)
+            response.raise_for_status()
+            frame = pd.DataFrame(response.json())
+            frame["Date"] = pd.to_datetime(frame["Date"], utc=True).dt.tz_convert("America/New_York")
+            return frame.set_index("Date")
+
+    return type("HttpYFinance", (), {"Ticker": HttpTicker})
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.0, help="median delay of a response in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="sigma of the log-normal spread of the delay")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of an injected failure")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    serve(args.host, args.port, args.latency, args.jitter, args.error_rate, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""Recorded upstream responses, and replay clients serving them instead of the network.
+
+Fixtures live in `benchmark/fixtures`, see `benchmark/record.py` to record them:
+    finnhub_<TICKER>.json   raw `stock_candles` response (keys c, h, l, o, v, t, s) over the whole recorded range
+    yahoo_<TICKER>.json     `history(period="max")` as records (Date as ISO string, Open, High, Low, Close, Volume, ...)
+    news_<N>.html           raw article HTML, N starting at 0
+
+A ticker without a recorded fixture gets a synthetic one, a seeded random walk over business days shaped like the
+recorded responses, so the suite can run at any universe size. Results always say which kind was used.
+"""
+from __future__ import annotations
+
+import datetime
+import json
+import re
+import zlib
+from bisect import bisect_left, bisect_right
+from contextlib import ExitStack, contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterator
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+FIXTURE_DIR = Path(__file__).parent / "fixtures"
+
+# Synthetic series cover 20 years of business days ending on this date.
+SYNTHETIC_END = datetime.date(2023, 12, 29)
+SYNTHETIC_YEARS = 20
+
+REGEX_PERIOD = re.compile(r"(\d+)(d|wk|mo|y)")
+PERIOD_DAYS = {"d": 1, "wk": 7, "mo": 30, "y": 365}
+
+
+def _unix(day: datetime.date) -> int:
+    return int(datetime.datetime(day.year, day.month, day.day, tzinfo=datetime.timezone.utc).timestamp())
+
+
+def is_recorded(ticker: str) -> bool:
+    """Whether a real recording exists for the ticker."""
+    return (FIXTURE_DIR / f"finnhub_{ticker}.json").exists()
+
+
+@lru_cache(maxsize=None)
+def finnhub_candles(ticker: str) -> dict:
+    """Raw FinnHub daily candles of a ticker, recorded or synthetic. Treat the result as read-only."""
+    path = FIXTURE_DIR / f"finnhub_{ticker}.json"
+    if path.exists():
+        return json.loads(path.read_text())
+
+    start = SYNTHETIC_END.replace(year=SYNTHETIC_END.year - SYNTHETIC_YEARS)
+    days = pd.bdate_range(start, SYNTHETIC_END)
+    rng = np.random.default_rng(zlib.crc32(ticker.encode()))
+    close = 50 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, len(days))))
+    open_ = close * (1 + rng.normal(0, 0.005, len(days)))
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.01, len(days)))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.01, len(days)))
+    volume = rng.integers(1_000_000, 50_000_000, len(days))
+    return {
+        "c": close.round(2).tolist(),
+        "h": high.round(2).tolist(),
+        "l": low.round(2).tolist(),
+        "o": open_.round(2).tolist(),
+        "v": volume.tolist(),
+        "t": [_unix(day.date()) for day in days],
+        "s": "ok",
+    }
+
+
+def finnhub_window(ticker: str, from_date: int, to_date: int) -> dict:
+    """The response FinnHub would give for `stock_candles(ticker, "D", from_date, to_date)`, as a fresh dict."""
+    candles = finnhub_candles(ticker)
+    start = bisect_left(candles["t"], from_date)
+    end = bisect_right(candles["t"], to_date)
+    if start == end:
+        return {"s": "no_data"}
+    return {key: candles[key][start:end] for key in ("c", "h", "l", "o", "v", "t")} | {"s": "ok"}
+
+
+def last_dates(ticker: str, days: int) -> tuple[str, str]:
+    """`from_date` and `to_date` ('YYYY-MM-DD') covering the last *days* calendar days of a ticker's fixture."""
+    end = datetime.datetime.fromtimestamp(finnhub_candles(ticker)["t"][-1], tz=datetime.timezone.utc).date()
+    start = end - datetime.timedelta(days=days - 1)
+    return start.isoformat(), end.isoformat()
+
+
+@lru_cache(maxsize=None)
+def yahoo_history(ticker: str) -> pd.DataFrame:
+    """`yf.Ticker(ticker).history(period="max")` of a ticker, recorded or derived from its FinnHub fixture."""
+    path = FIXTURE_DIR / f"yahoo_{ticker}.json"
+    if path.exists():
+        frame = pd.DataFrame(json.loads(path.read_text()))
+    else:
+        candles = finnhub_candles(ticker)
+        frame = pd.DataFrame(
+            {
+                "Date": pd.to_datetime(candles["t"], unit="s"),
+                "Open": candles["o"],
+                "High": candles["h"],
+                "Low": candles["l"],
+                "Close": candles["c"],
+                "Volume": candles["v"],
+                "Dividends": 0.0,
+                "Stock Splits": 0.0,
+            }
+        )
+    frame["Date"] = pd.to_datetime(frame["Date"], utc=True).dt.tz_convert("America/New_York")
+    return frame.set_index("Date")
+
+
+@lru_cache(maxsize=None)
+def news_html(index: int) -> str:
+    """Raw HTML of a recorded article, or a synthetic article page."""
+    path = FIXTURE_DIR / f"news_{index}.html"
+    if path.exists():
+        return path.read_text()
+
+    rng = np.random.default_rng(index)
+    words = np.array("market shares rally investors earnings quarter guidance revenue growth analysts stock price".split())
+    paragraphs = "".join(f"<p>{' '.join(rng.choice(words, 60))}.</p>" for _ in range(20))
+    return (
+        f"<html><head><title>Synthetic article {index}</title>"
+        f'<meta name="author" content="Jane Doe"><meta property="article:published_time" content="2023-12-{index % 28 + 1:02d}"></head>'
+        f"<body><article><h1>Synthetic article {index}</h1>{paragraphs}</article></body></html>"
+    )
+
+
+class ReplayFinnHubClient:
+    """Stands in for `finnhub.Client`, serving `stock_candles` from the fixtures."""
+
+    def stock_candles(self, symbol: str, resolution: str, _from: int, to: int) -> dict:
+        return finnhub_window(symbol, _from, to)
+
+
+class _ReplayTicker:
+    def __init__(self, ticker: str):
+        self.ticker = ticker
+
+    def history(self, period: str = "1mo", **_) -> pd.DataFrame:
+        frame = yahoo_history(self.ticker)
+        if period == "max":
+            return frame.copy()
+
+        amount, unit = REGEX_PERIOD.fullmatch(period).groups()  # type: ignore
+        days = int(amount) * PERIOD_DAYS[unit]
+        return frame[frame.index >= frame.index[-1] - pd.Timedelta(days=days - 1)].copy()
+
+
+class ReplayYFinance:
+    """Stands in for the `yfinance` module."""
+
+    Ticker = _ReplayTicker
+
+
+@contextmanager
+def replay(finnhub_api=None) -> Iterator[None]:
+    """Serve every upstream from the fixtures while inside the block.
+
+    Args:
+        finnhub_api (FinnHubAPI, optional): instance whose client is swapped for `ReplayFinnHubClient`
+    """
+    from newspaper import Article
+
+    urls: dict[str, int] = {}
+
+    class ReplayArticle(Article):
+        def download(self, input_html=None, title=None, recursion_counter=0):
+            index = urls.setdefault(self.url, len(urls))
+            return super().download(input_html=input_html or news_html(index), title=title, recursion_counter=recursion_counter)
+
+    with ExitStack() as stack:
+        stack.enter_context(mock.patch("model.api.yahoo.yf", ReplayYFinance))
+        stack.enter_context(mock.patch("model.api.news.Article", ReplayArticle))
+        if finnhub_api is not None:
+            stack.enter_context(mock.patch.object(finnhub_api, "client_api", ReplayFinnHubClient()))
+        yield
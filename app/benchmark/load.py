@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""Load test of the backend against the fake upstream server (see `benchmark/fake_upstream.py`).
+
+Starts the fake upstream and the backend in their own processes, then drives the backend with a closed loop of
+`concurrency` clients per step, raising the concurrency step by step. Every step reports throughput, latency
+percentiles, status codes and the peak queue depth of each pool read from `/monitor/pools`.
+
+Run from the `app` folder, a `.streamlit/secrets.toml` with any FINNHUB_API_KEY must exist, nothing is sent upstream:
+    python -m benchmark.load --scenario mixed --concurrency 1 2 4 8 16 32 64 --latency 0.2 --error-rate 0.02
+    python -m benchmark.load --backend-url http://127.0.0.1:8000 --upstream-url http://127.0.0.1:8900   # already running
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+from collections import Counter
+from contextlib import suppress
+from typing import Any, Callable
+
+import aiohttp
+
+from . import fake_upstream, fixtures
+
+PREFIX = "/api/shelby-backend"
+SCENARIOS = ("finnhub", "yahoo", "news", "mixed")
+# The synthetic fixtures cover these years, leave room for a one year window.
+FIRST_YEAR = fixtures.SYNTHETIC_END.year - fixtures.SYNTHETIC_YEARS + 1
+LAST_YEAR = fixtures.SYNTHETIC_END.year
+
+
+def serve_backend(host: str, port: int, upstream_url: str) -> None:
+    """Run the backend with every upstream pointed at the fake upstream server."""
+    # Modules read these at import time, the load test never reaches AWS or FinnHub.
+    for key in ("FINNHUB_API_KEY", "AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"):
+        os.environ.setdefault(key, "replay")
+    # The fake upstream has no rate limit, the load must not be refused by the FinnHub budget of a free plan.
+    os.environ.setdefault("FINNHUB_CALLS_PER_MINUTE", "1000000")
+
+    import uvicorn
+    from main import app
+    from model.api import yahoo as yahoo_module
+    from router import finnhub as finnhub_router
+
+    finnhub_router.finnhub.client_api.API_URL = f"{upstream_url}/api/v1"
+    yahoo_module.yf = fake_upstream.http_yfinance(upstream_url)
+    uvicorn.run(app, host=host, port=port, log_level="warning")
+
+
+def request_factory(scenario: str, upstream_url: str, universe: int, articles: int, rng: random.Random) -> Callable[[], tuple[str, str, dict]]:
+    """Build a function returning the (name, path, form) of the next request of a scenario.
+
+    Tickers and date ranges are drawn at random from the universe, so the caches only help as much as they would with
+    that many distinct tickers.
+    """
+
+    def finnhub() -> tuple[str, str, dict]:
+        end = datetime.date(rng.randint(FIRST_YEAR, LAST_YEAR), rng.randint(1, 12), rng.randint(1, 28))
+        start = end - datetime.timedelta(days=364)
+        form = {"ticker": f"T{rng.randrange(universe):04d}", "from_date": start.isoformat(), "end_date": end.isoformat()}
+        return "finnhub", f"{PREFIX}/finnhub/pull-data", form
+
+    def yahoo() -> tuple[str, str, dict]:
+        return "yahoo", f"{PREFIX}/yahoo/pull-data", {"ticker": f"T{rng.randrange(universe):04d}"}
+
+    def news() -> tuple[str, str, dict]:
+        return "news", f"{PREFIX}/news/pull-data", {"url": f"{upstream_url}/news/{rng.randrange(articles)}"}
+
+    builders = {"finnhub": finnhub, "yahoo": yahoo, "news": news}
+    if scenario != "mixed":
+        return builders[scenario]
+    return lambda: rng.choice((finnhub, yahoo, news))()
+
+
+def percentile(values: list[float], percent: float) -> float:
+    """Nearest-rank percentile of sorted values, 0 when empty."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+async def client_loop(session: aiohttp.ClientSession, backend_url: str, next_request: Callable, deadline: float, samples: list) -> None:
+    while time.perf_counter() < deadline:
+        name, path, form = next_request()
+        started = time.perf_counter()
+        try:
+            async with session.post(backend_url + path, data=form) as response:
+                await response.read()
+                status = response.status
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            status = 0
+        samples.append((name, status, time.perf_counter() - started))
+
+
+async def poll_pools(session: aiohttp.ClientSession, backend_url: str, interval: float, peaks: dict, stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        try:
+            async with session.get(f"{backend_url}{PREFIX}/monitor/pools") as response:
+                for name, stats in (await response.json()).items():
+                    # Rejections are counted since the pool was created, `rejected` starts at minus the first reading.
+                    peak = peaks.setdefault(name, {"max_queued": 0, "max_active": 0, "max_workers": 0, "rejected": -stats["rejected"], "_last_rejected": 0})
+                    peak["max_queued"] = max(peak["max_queued"], stats["queued"])
+                    peak["max_active"] = max(peak["max_active"], stats["active"])
+                    peak["max_workers"] = max(peak["max_workers"], stats["workers"])
+                    peak["_last_rejected"] = stats["rejected"]
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            pass
+        with suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(stop.wait(), interval)
+
+
+async def run_step(backend_url: str, next_request: Callable, concurrency: int, duration: float, poll_interval: float, timeout: float) -> dict[str, Any]:
+    samples: list[tuple[str, int, float]] = []
+    peaks: dict[str, dict] = {}
+    stop = asyncio.Event()
+    connector = aiohttp.TCPConnector(limit=concurrency + 1)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        poller = asyncio.create_task(poll_pools(session, backend_url, poll_interval, peaks, stop))
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*(client_loop(session, backend_url, next_request, deadline, samples) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await poller
+
+    latencies = sorted(latency for _, status, latency in samples if 200 <= status < 300)
+    statuses = Counter(str(status) for _, status, _ in samples)
+    for peak in peaks.values():
+        peak["rejected"] += peak.pop("_last_rejected")
+
+    result = {
+        "concurrency": concurrency,
+        "requests": len(samples),
+        "throughput": len(latencies) / elapsed,
+        "error_rate": 1 - len(latencies) / len(samples) if samples else 0.0,
+        "statuses": dict(statuses),
+        "by_route": dict(Counter(name for name, _, _ in samples)),
+        "p50": percentile(latencies, 50),
+        "p90": percentile(latencies, 90),
+        "p99": percentile(latencies, 99),
+        "max": latencies[-1] if latencies else 0.0,
+        "pools": peaks,
+    }
+    max_queued = max((peak["max_queued"] for peak in peaks.values()), default=0)
+    print(
+        f"{concurrency:>6}{result['requests']:>10}{result['throughput']:>10.1f}/s{result['p50'] * 1000:>10.1f}{result['p90'] * 1000:>10.1f}" f"{result['p99'] * 1000:>10.1f}ms{result['error_rate'] * 100:>9.1f}%{max_queued:>10}",
+        file=sys.stderr,
+    )
+    return result
+
+
+async def wait_ready(url: str, timeout: float = 60.0) -> None:
+    deadline = time.perf_counter() + timeout
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.get(url) as response:
+                    if response.status < 500:
+                        return
+            except aiohttp.ClientError:
+                pass
+            if time.perf_counter() > deadline:
+                raise TimeoutError(f"{url} did not come up within {timeout}s")
+            await asyncio.sleep(0.2)
+
+
+async def run(args: argparse.Namespace) -> list[dict]:
+    await wait_ready(f"{args.upstream_url}/news/0")
+    await wait_ready(f"{args.backend_url}/metrics")
+
+    next_request = request_factory(args.scenario, args.upstream_url, args.universe, args.articles, random.Random(args.seed))
+    print(f"{'users':>6}{'requests':>10}{'rps':>12}{'p50':>10}{'p90':>10}{'p99':>12}{'errors':>10}{'queued':>10}", file=sys.stderr)
+    results = []
+    for concurrency in args.concurrency:
+        results.append(await run_step(args.backend_url, next_request, concurrency, args.duration, args.poll_interval, args.timeout))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=SCENARIOS, default="mixed")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64], help="concurrent clients of each step")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per step")
+    parser.add_argument("--universe", type=int, default=500, help="distinct tickers requested")
+    parser.add_argument("--articles", type=int, default=1000, help="distinct news articles requested")
+    parser.add_argument("--latency", type=float, default=0.1, help="median delay of the fake upstream in seconds")
+    parser.add_argument("--jitter", type=float, default=0.5, help="sigma of the log-normal spread of the upstream delay")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of an injected upstream failure")
+    parser.add_argument("--timeout", type=float, default=60.0, help="client timeout of a request in seconds")
+    parser.add_argument("--poll-interval", type=float, default=0.25, help="seconds between two reads of /monitor/pools")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend-url", help="use an already running backend instead of starting one")
+    parser.add_argument("--upstream-url", help="use an already running fake upstream instead of starting one")
+    parser.add_argument("--backend-port", type=int, default=8800)
+    parser.add_argument("--upstream-port", type=int, default=8900)
+    parser.add_argument("--output", help="write the results as JSON to this file instead of stdout")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    if not args.upstream_url:
+        args.upstream_url = f"http://127.0.0.1:{args.upstream_port}"
+        processes.append(context.Process(target=fake_upstream.serve, args=("127.0.0.1", args.upstream_port, args.latency, args.jitter, args.error_rate, args.seed), daemon=True))
+    if not args.backend_url:
+        args.backend_url = f"http://127.0.0.1:{args.backend_port}"
+        processes.append(context.Process(target=serve_backend, args=("127.0.0.1", args.backend_port, args.upstream_url), daemon=True))
+
+    for process in processes:
+        process.start()
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        for process in processes:
+            process.terminate()
+            process.join()
+
+    upstream = {"latency": args.latency, "jitter": args.jitter, "error_rate": args.error_rate}
+    output = json.dumps({"scenario": args.scenario, "universe": args.universe, "duration": args.duration, "upstream": upstream, "results": results}, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
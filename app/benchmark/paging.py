@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""Benchmark of `helpers.paging.Base` against the previous `__getattribute__` based implementation.
+
+Run from the `app` folder:
+    python -m benchmark.paging
+"""
+from __future__ import annotations
+
+import timeit
+import typing as t
+from copy import deepcopy
+from uuid import uuid4
+
+from helpers.paging import Base, Paging, PagingInfo
+
+
+class LegacyBase(dict):
+    """The previous Base, kept verbatim for comparison."""
+
+    def __init__(self, **kwargs) -> None:
+        super().__init__()
+        self._generate_default_values()
+        self._generate_id(kwargs)
+        self._check_required_attributes(kwargs)
+        self._get_attributes(kwargs)
+
+    def _generate_default_values(self) -> None:
+        for key in tuple(dir(self)):
+            if key in self.__annotations__:
+                value_default = getattr(self, key)
+                self[key] = deepcopy(value_default)
+
+    def _generate_id(self, kwargs: dict) -> None:
+        if "id" in self.__annotations__:
+            kwargs["id"] = kwargs.get("id", str(uuid4()))
+
+    def _check_required_attributes(self, kwargs: dict) -> None:
+        for key in kwargs:
+            if key not in self.__annotations__ and key not in self:
+                raise AttributeError(f"{self.__class__.__name__} does not have attribute: {key!r}")
+
+    def _get_attributes(self, kwargs: dict) -> None:
+        for key in self.__annotations__:
+            try:
+                self[key] = kwargs[key]
+            except KeyError as err:
+                if key not in self:
+                    raise AttributeError(f"{self.__class__.__name__} missing required attribute: {key!r}") from err
+
+    def __getattribute__(self, name: str) -> t.Any:
+        if name.startswith("_"):
+            return super().__getattribute__(name)
+
+        if name in self.__annotations__ and name in self:
+            return self[name]
+
+        return super().__getattribute__(name)
+
+    def __getattr__(self, name: str) -> t.Any:
+        try:
+            return self[name]
+        except KeyError as err:
+            raise AttributeError(f"{self.__class__.__name__} does not have attribute: {name!r}") from err
+
+    def __setattr__(self, name: str, value: t.Any) -> None:
+        self[name] = value
+
+
+class LegacyPagingInfo(LegacyBase):
+    page_count: int = 1
+    page_number: int = 1
+    page_size: int = 10
+    total_record_count: int = 1
+
+
+class LegacyPaging(LegacyBase):
+    data: tuple
+    paging: LegacyPagingInfo
+
+
+class Record(Base):
+    __slots__ = ()
+
+    id: str
+    ticker: str
+    close: float = 0.0
+    tags: list = []
+
+
+class LegacyRecord(LegacyBase):
+    id: str
+    ticker: str
+    close: float = 0.0
+    tags: list = []
+
+
+def build_page(record_cls, paging_cls, info_cls, size: int):
+    data = tuple(record_cls(ticker="AAPL", close=float(index)) for index in range(size))
+    return paging_cls(data=data, paging=info_cls(page_size=size, total_record_count=size))
+
+
+def read_page(page) -> float:
+    total = 0.0
+    for record in page.data:
+        total += record.close
+        _ = record.ticker
+    return total + page.paging.page_size
+
+
+def main(size: int = 1000, repeat: int = 5, number: int = 20) -> None:
+    cases = {
+        "construct": (
+            lambda: build_page(LegacyRecord, LegacyPaging, LegacyPagingInfo, size),
+            lambda: build_page(Record, Paging, PagingInfo, size),
+        ),
+    }
+    legacy_page = build_page(LegacyRecord, LegacyPaging, LegacyPagingInfo, size)
+    page = build_page(Record, Paging, PagingInfo, size)
+    cases["attribute access"] = (lambda: read_page(legacy_page), lambda: read_page(page))
+
+    print(f"{'case':<20}{'legacy (ms)':>14}{'current (ms)':>14}{'speedup':>10}")
+    for name, (legacy, current) in cases.items():
+        legacy_time = min(timeit.repeat(legacy, repeat=repeat, number=number)) / number * 1000
+        current_time = min(timeit.repeat(current, repeat=repeat, number=number)) / number * 1000
+        print(f"{name:<20}{legacy_time:>14.3f}{current_time:>14.3f}{legacy_time / current_time:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""Record real upstream responses into `benchmark/fixtures` for the benchmark suite to replay.
+
+Needs network access and FINNHUB_API_KEY. Run from the `app` folder:
+    python -m benchmark.record --tickers AAPL TSLA --news-url https://... --news-url https://...
+"""
+from __future__ import annotations
+
+import argparse
+import datetime
+import json
+import os
+
+import finnhub as fb
+import requests
+import yfinance as yf
+
+from .fixtures import FIXTURE_DIR
+
+
+def record_finnhub(client: fb.Client, ticker: str, years: int) -> None:
+    to_date = datetime.datetime.now(tz=datetime.timezone.utc)
+    from_date = to_date - datetime.timedelta(days=365 * years)
+    response = client.stock_candles(ticker, "D", int(from_date.timestamp()), int(to_date.timestamp()))
+    (FIXTURE_DIR / f"finnhub_{ticker}.json").write_text(json.dumps(response))
+    print(f"FinnHub {ticker}: {len(response.get('t', []))} candles")
+
+
+def record_yahoo(ticker: str) -> None:
+    frame = yf.Ticker(ticker).history(period="max").reset_index()
+    frame["Date"] = frame["Date"].map(lambda value: value.isoformat())
+    (FIXTURE_DIR / f"yahoo_{ticker}.json").write_text(frame.to_json(orient="records"))
+    print(f"Yahoo {ticker}: {len(frame)} rows")
+
+
+def record_news(index: int, url: str) -> None:
+    response = requests.get(url, timeout=30, headers={"User-Agent": "Mozilla/5.0"})
+    response.raise_for_status()
+    (FIXTURE_DIR / f"news_{index}.html").write_text(response.text)
+    print(f"News {index}: {url}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tickers", nargs="*", default=["AAPL", "TSLA"])
+    parser.add_argument("--years", type=int, default=20)
+    parser.add_argument("--news-url", action="append", default=[])
+    args = parser.parse_args()
+
+    FIXTURE_DIR.mkdir(exist_ok=True)
+    client = fb.Client(api_key=os.environ["FINNHUB_API_KEY"])
+    for ticker in args.tickers:
+        record_finnhub(client, ticker, args.years)
+        record_yahoo(ticker)
+    for index, url in enumerate(args.news_url):
+        record_news(index, url)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""Benchmark suite of the data-pull hot paths, replaying recorded upstream responses (see `benchmark/fixtures.py`).
+
+Run from the `app` folder, a `.streamlit/secrets.toml` with any FINNHUB_API_KEY must exist, nothing is sent upstream:
+    python -m benchmark.run --output results.json
+    python -m benchmark.run --quick --compare results.json   # exit code 1 on a regression
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Optional
+
+# Modules read these at import time, the suite never reaches AWS or FinnHub.
+for key in ("FINNHUB_API_KEY", "AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"):
+    os.environ.setdefault(key, "replay")
+
+from unittest import mock  # noqa: E402
+
+from fastapi.testclient import TestClient  # noqa: E402
+from helpers.pogger import WebhookHandler  # noqa: E402
+from helpers.utility import Utility  # noqa: E402
+from model.api import bars  # noqa: E402
+from model.api.finnhub import FINNHUB_UPSTREAM, FinnHubAPI  # noqa: E402
+from model.api.yahoo import YahooFinanceAPI  # noqa: E402
+from model import indicators  # noqa: E402
+from model.data.finance_api import FinanceAPIOutput  # noqa: E402
+
+from . import fixtures  # noqa: E402
+
+DAY_SIZES = {"1d": 1, "1m": 30, "1y": 365, "5y": 5 * 365, "20y": 20 * 365}
+YAHOO_PERIODS = {"1d": "1d", "1m": "30d", "1y": "1y", "5y": "5y", "20y": "20y"}
+TICKER_SIZES = (1, 10, 100, 500)
+LOG_SIZES = (10, 100, 1000)
+TICKER = "AAPL"
+INDICATORS = "sma_20,ema_50,rsi_14,macd,bbands_20_2,atr_14,vwap"
+
+QUICK_DAY_SIZES = ("1d", "1y")
+QUICK_TICKER_SIZES = (1, 10)
+QUICK_LOG_SIZES = (10,)
+
+
+def measure(name: str, params: dict[str, Any], func: Callable[[Any], Any], setup: Optional[Callable[[], Any]] = None, min_time: float = 0.5, min_iterations: int = 5, max_iterations: int = 1000) -> dict[str, Any]:
+    """Time `func(setup())` until `min_time` seconds were spent, only the call to *func* is timed."""
+    timings: list[float] = []
+    spent = 0.0
+    while len(timings) < min_iterations or (spent < min_time and len(timings) < max_iterations):
+        argument = setup() if setup else None
+        started = time.perf_counter()
+        func(argument)
+        timings.append(time.perf_counter() - started)
+        spent += timings[-1]
+
+    timings.sort()
+    result = {
+        "name": name,
+        "params": params,
+        "iterations": len(timings),
+        "min": timings[0],
+        "median": statistics.median(timings),
+        "p95": timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        "mean": statistics.fmean(timings),
+    }
+    print(f"{name:<32}{json.dumps(params):<32}{result['median'] * 1000:>12.3f}ms{result['iterations']:>8}", file=sys.stderr)
+    return result
+
+
+def stage_benchmarks(api: FinnHubAPI, day_sizes: list[str], ticker_sizes: list[int], log_sizes: list[int]) -> list[dict]:
+    results = []
+    for label in day_sizes:
+        from_date, to_date = fixtures.last_dates(TICKER, DAY_SIZES[label])
+        window = (TICKER, api.convert_date_to_unix(from_date), api.convert_date_to_unix(to_date) + 86399)
+        cleaned = api.clean_data(fixtures.finnhub_window(*window))
+        params = {"range": label, "candles": len(cleaned["close"])}
+
+        results.append(measure("finnhub.clean_data", params, api.clean_data, setup=lambda window=window: fixtures.finnhub_window(*window)))
+        results.append(
+            measure(
+                "FinanceAPIOutput",
+                params,
+                lambda _, data=cleaned: FinanceAPIOutput(close=data["close"], open=data["open"], high=data["high"], low=data["low"], volumn=data["volumn"], date=data["time"]),
+            )
+        )
+        results.append(measure("Utility.to_camel", params, lambda _, data=cleaned: Utility.to_camel({"data": data})))
+        results.append(measure("yahoo.pull_data", {"range": label}, lambda _, period=YAHOO_PERIODS[label]: YahooFinanceAPI().pull_data(TICKER, period)))
+
+        response = fixtures.finnhub_window(*window)
+        results.append(measure("bars.resample_candles", params | {"resolution": "W"}, lambda _, response=response: bars.resample_candles(response, "W")))
+
+        names = indicators.parse_names(INDICATORS)
+        results.append(measure("indicators", params, lambda cache, data=cleaned: cache.get(label, data, names), setup=indicators.IndicatorCache))
+        cache = indicators.IndicatorCache()
+        cache.get(label, cleaned, names)
+        results.append(measure("indicators.cached", params, lambda _, data=cleaned: cache.get(label, data, names)))
+
+    # The series cache is cleared before each run to measure the pull itself.
+    pull_data = FinnHubAPI.pull_data
+    from_date, to_date = fixtures.last_dates(TICKER, 365)
+    for size in ticker_sizes:
+        tickers = tuple(f"T{index:04d}" for index in range(size))
+        for ticker in tickers:
+            fixtures.finnhub_candles(ticker)
+        results.append(measure("finnhub.pull_data", {"range": "1y", "tickers": size}, lambda _, tickers=tickers: pull_data(api, tickers, from_date, to_date), setup=FINNHUB_UPSTREAM.clear))
+
+    handler = WebhookHandler("https://discord.invalid/api/webhooks/0/replay")
+    loop = asyncio.new_event_loop()
+
+    def fill(size: int) -> None:
+        handler._queue = [logging.LogRecord(f"Logger{index % 5}", logging.INFO, __file__, 0, "Successfully pulling %s", (f"T{index:04d}",), None) for index in range(size)]
+
+    with mock.patch.object(handler, "_send", mock.AsyncMock()):
+        for size in log_sizes:
+            results.append(measure("pogger.embeds", {"records": size}, lambda _: loop.run_until_complete(handler._emit(None)), setup=lambda size=size: fill(size)))
+    loop.close()
+    return results
+
+
+def clear_caches() -> None:
+    FINNHUB_UPSTREAM.clear()
+
+
+def router_benchmarks(day_sizes: list[str]) -> list[dict]:
+    from main import app
+
+    results = []
+    client = TestClient(app)
+    for label in day_sizes:
+        from_date, to_date = fixtures.last_dates(TICKER, DAY_SIZES[label])
+        form = {"ticker": TICKER, "from_date": from_date, "end_date": to_date}
+        results.append(measure("POST /finnhub/pull-data", {"range": label}, lambda _, form=form: client.post("/api/shelby-backend/finnhub/pull-data", data=form), setup=clear_caches))
+        results.append(measure("POST /finnhub/pull-data/page", {"range": label, "page_size": 100}, lambda _, form=form: client.post("/api/shelby-backend/finnhub/pull-data/page", data=form | {"page_size": 100})))
+
+    results.append(measure("POST /yahoo/pull-data", {"range": "1m"}, lambda _: client.post("/api/shelby-backend/yahoo/pull-data", data={"ticker": TICKER})))
+    results.append(measure("POST /news/pull-data", {}, lambda _: client.post("/api/shelby-backend/news/pull-data", data={"url": "https://news.invalid/0"})))
+    return results
+
+
+def metadata() -> dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.datetime.now(tz=datetime.timezone.utc).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "fixtures": "recorded" if fixtures.is_recorded(TICKER) else "synthetic",
+    }
+
+
+def compare(results: list[dict], baseline_path: str, tolerance: float) -> bool:
+    """Print the cases whose median got slower than the baseline by more than *tolerance*, True if there are none."""
+    with open(baseline_path, encoding="utf-8") as file:
+        baseline = {(result["name"], json.dumps(result["params"], sort_keys=True)): result for result in json.load(file)["results"]}
+
+    regressions = []
+    for result in results:
+        if (previous := baseline.get((result["name"], json.dumps(result["params"], sort_keys=True)))) and result["median"] > previous["median"] * (1 + tolerance):
+            regressions.append(result)
+            print(f"REGRESSION {result['name']} {json.dumps(result['params'])}: {previous['median'] * 1000:.3f}ms -> {result['median'] * 1000:.3f}ms", file=sys.stderr)
+    return not regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="only the smallest sizes, for CI")
+    parser.add_argument("--output", help="write the results as JSON to this file instead of stdout")
+    parser.add_argument("--compare", help="results JSON of a previous run to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown of the median before a case counts as a regression")
+    args = parser.parse_args()
+
+    day_sizes = list(QUICK_DAY_SIZES if args.quick else DAY_SIZES)
+    ticker_sizes = list(QUICK_TICKER_SIZES if args.quick else TICKER_SIZES)
+    log_sizes = list(QUICK_LOG_SIZES if args.quick else LOG_SIZES)
+
+    logging.disable(logging.CRITICAL)
+    from router import finnhub as finnhub_router
+
+    with fixtures.replay(finnhub_router.finnhub):
+        results = stage_benchmarks(finnhub_router.finnhub, day_sizes, ticker_sizes, log_sizes)
+        results += router_benchmarks(day_sizes)
+
+    output = json.dumps({"meta": metadata(), "results": results}, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output)
+    else:
+        print(output)
+
+    if args.compare and not compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""Low overhead metrics."""
+from __future__ import annotations
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Iterator, Optional, Tuple
+
+# Label pairs of a series, sorted by label name.
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _escape(value: str) -> str:
+    """Escape a label value for the Prometheus text format."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter:
+    """A monotonically increasing value. With *function*, the value is read from it at collection time instead."""
+
+    __slots__ = ("value", "function", "_lock")
+
+    kind = "counter"
+
+    def __init__(self, function: Optional[Callable[[], float]] = None):
+        self.value = 0.0
+        self.function = function
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        """Increase the value."""
+        with self._lock:
+            self.value += amount
+
+    def get(self) -> float:
+        """Get the current value."""
+        return self.function() if self.function else self.value
+
+
+class Gauge(Counter):
+    """A value that goes up and down, e.g. the amount of calls in flight."""
+
+    __slots__ = ()
+
+    kind = "gauge"
+
+    def dec(self, amount: float = 1) -> None:
+        """Decrease the value."""
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        """Replace the value."""
+        self.value = value
+
+
+class Histogram:
+    """A log-bucketed histogram of durations in seconds.
+
+    Bucket bounds grow geometrically, `buckets_per_doubling` buckets for every doubling of the value, so recording is a
+    single bisect over a few dozen floats and the relative error of a percentile is bounded whatever the scale.
+    """
+
+    __slots__ = ("bounds", "counts", "count", "total", "_lock")
+
+    kind = "histogram"
+
+    def __init__(self, lowest: float = 1e-5, highest: float = 120.0, buckets_per_doubling: int = 4):
+        ratio = 2 ** (1 / buckets_per_doubling)
+        bounds: list[float] = []
+        bound = lowest
+        while bound < highest:
+            bounds.append(bound)
+            bound *= ratio
+        bounds.append(highest)
+
+        self.bounds = tuple(bounds)
+        # The extra bucket holds everything above `highest`.
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, value: float) -> None:
+        """Add a value."""
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value
+
+    def percentile(self, percent: float) -> float:
+        """Get the upper bound of the bucket holding the given percentile, 0 when empty."""
+        if not self.count:
+            return 0.0
+
+        rank = self.count * percent / 100
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                return self.bounds[min(index, len(self.bounds) - 1)]
+        return self.bounds[-1]
+
+    def mean(self) -> float:
+        """Get the average value, 0 when empty."""
+        return self.total / self.count if self.count else 0.0
+
+    def snapshot(self) -> dict[str, float]:
+        """Summarize the histogram."""
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "mean": self.mean(),
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+        }
+
+
+class MetricsRegistry:
+    """Holds every metric of the process and renders them in the Prometheus text exposition format."""
+
+    def __init__(self, prefix: str = "shelby_"):
+        self.prefix = prefix
+        self._help: dict[str, str] = {}
+        self._series: dict[str, dict[Labels, Any]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _labels(labels: dict[str, Any]) -> Labels:
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def register(self, name: str, metric: Any, description: str = "", **labels) -> Any:
+        """Add an existing metric under *name* and *labels*, replacing any previous one."""
+        name = self.prefix + name
+        with self._lock:
+            self._help.setdefault(name, description)
+            self._series.setdefault(name, {})[self._labels(labels)] = metric
+        return metric
+
+    def unregister(self, name: str, **labels) -> None:
+        """Remove the metric under *name* and *labels*."""
+        with self._lock:
+            self._series.get(self.prefix + name, {}).pop(self._labels(labels), None)
+
+    def _get_or_create(self, metric_type: type, name: str, description: str, labels: dict[str, Any]) -> Any:
+        with self._lock:
+            series = self._series.get(self.prefix + name, {})
+            if (metric := series.get(self._labels(labels))) is not None:
+                return metric
+        return self.register(name, metric_type(), description, **labels)
+
+    def counter(self, name: str, description: str = "", **labels) -> Counter:
+        """Get or create a counter."""
+        return self._get_or_create(Counter, name, description, labels)
+
+    def gauge(self, name: str, description: str = "", **labels) -> Gauge:
+        """Get or create a gauge."""
+        return self._get_or_create(Gauge, name, description, labels)
+
+    def histogram(self, name: str, description: str = "", **labels) -> Histogram:
+        """Get or create a histogram of durations in seconds."""
+        return self._get_or_create(Histogram, name, description, labels)
+
+    @staticmethod
+    def _format_labels(labels: Labels, extra: str = "") -> str:
+        pairs = [f'{key}="{_escape(value)}"' for key, value in labels]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def _render_series(self, name: str, labels: Labels, metric: Any) -> Iterator[str]:
+        if metric.kind != "histogram":
+            yield f"{name}{self._format_labels(labels)} {metric.get()}"
+            return
+
+        cumulative = 0
+        for bound, bucket_count in zip(metric.bounds, metric.counts):
+            cumulative += bucket_count
+            bucket_labels = self._format_labels(labels, f'le="{bound:.6g}"')
+            yield f"{name}_bucket{bucket_labels} {cumulative}"
+        bucket_labels = self._format_labels(labels, 'le="+Inf"')
+        yield f"{name}_bucket{bucket_labels} {metric.count}"
+        yield f"{name}_sum{self._format_labels(labels)} {metric.total}"
+        yield f"{name}_count{self._format_labels(labels)} {metric.count}"
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        with self._lock:
+            series = {name: dict(metrics) for name, metrics in self._series.items() if metrics}
+
+        lines: list[str] = []
+        for name, metrics in series.items():
+            kind = next(iter(metrics.values())).kind
+            lines.append(f"# HELP {name} {self._help.get(name, '')}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, metric in metrics.items():
+                lines.extend(self._render_series(name, labels, metric))
+        return "\n".join(lines) + "\n"
+
+
+class CallMetrics:
+    """Duration histogram, error counter and in-flight gauge of one instrumented callable."""
+
+    __slots__ = ("duration", "errors", "in_flight")
+
+    def __init__(self, registry: MetricsRegistry, name: str, **labels):
+        self.duration = registry.histogram(f"{name}_duration_seconds", f"Duration of {name} calls.", **labels)
+        self.errors = registry.counter(f"{name}_errors_total", f"Failed {name} calls.", **labels)
+        self.in_flight = registry.gauge(f"{name}_in_flight", f"{name.capitalize()} calls currently running.", **labels)
+
+    def start(self) -> float:
+        """Mark a call as started, returns the start time to pass to `stop`."""
+        self.in_flight.inc()
+        return time.perf_counter()
+
+    def stop(self, started: float, failed: bool = False) -> float:
+        """Mark a call as done, returns its duration."""
+        elapsed = time.perf_counter() - started
+        self.duration.record(elapsed)
+        if failed:
+            self.errors.inc()
+        self.in_flight.dec()
+        return elapsed
+
+
+METRICS = MetricsRegistry()
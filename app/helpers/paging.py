@@ -2,56 +2,113 @@
 """Paging model."""
 from typing import Generic, Tuple, TypeVar
 
+import itertools
+import json
 import typing as t
+from base64 import urlsafe_b64decode, urlsafe_b64encode
 from copy import deepcopy
 from uuid import uuid4
 
+# Defaults of these types are shared between instances instead of being deep-copied.
+IMMUTABLE_TYPES = (int, float, complex, bool, str, bytes, type(None), frozenset)
+
+
+class InvalidCursorError(ValueError):
+    """A cursor that was not returned by the paged endpoint, or no longer matches its records: answer with a 400."""
+
+
+def encode_cursor(value: t.Any) -> str:
+    """Turn the key of the last returned record into an opaque cursor."""
+    return urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+
+def decode_cursor(cursor: t.Optional[str]) -> t.Any:
+    """Get back the key of the last returned record, None for the first page."""
+    if not cursor:
+        return None
+    try:
+        return json.loads(urlsafe_b64decode(cursor.encode()))
+    except ValueError as err:
+        raise InvalidCursorError(f"Invalid cursor: {cursor!r}") from err
+
+
+def _field_property(name: str) -> property:
+    """Read a field straight from the underlying dict."""
+
+    def getter(self: dict) -> t.Any:
+        try:
+            return self[name]
+        except KeyError as err:
+            raise AttributeError(f"{self.__class__.__name__} does not have attribute: {name!r}") from err
+
+    return property(getter, doc=f"Field {name!r}.")
+
 
 class Base(dict):
-    """Base of all models, inheriting from dict."""
+    """Base of all models, inheriting from dict.
+
+    Field names, defaults and which defaults need a deepcopy are computed once per class in `__init_subclass__`,
+    and every field is exposed as a property reading the dict, so attribute access needs no per-call lookup.
+    Subclasses should declare `__slots__ = ()` to keep instances free of a `__dict__`.
+    """
+
+    __slots__ = ()
+
+    _fields: t.Tuple[str, ...] = ()
+    _field_set: t.FrozenSet[str] = frozenset()
+    _defaults: t.Dict[str, t.Any] = {}
+    _copied_defaults: t.FrozenSet[str] = frozenset()
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        fields: t.Dict[str, None] = {}
+        defaults: t.Dict[str, t.Any] = {}
+        for base in reversed(cls.__mro__[1:]):
+            if issubclass(base, Base):
+                fields.update(dict.fromkeys(base._fields))
+                defaults.update(base._defaults)
+
+        for key in cls.__dict__.get("__annotations__", {}):
+            fields[key] = None
+            if key in cls.__dict__:
+                defaults[key] = cls.__dict__[key]
+            setattr(cls, key, _field_property(key))
+
+        cls._fields = tuple(fields)
+        cls._field_set = frozenset(fields)
+        cls._defaults = defaults
+        cls._copied_defaults = frozenset(key for key, value in defaults.items() if not isinstance(value, IMMUTABLE_TYPES))
 
     def __init__(self, **kwargs) -> None:
         super().__init__()
-        self._generate_default_values()
-        self._generate_id(kwargs)
         self._check_required_attributes(kwargs)
+        self._generate_id(kwargs)
         self._get_attributes(kwargs)
 
-    def _generate_default_values(self) -> None:
-        """Generate default values from class annotations."""
-        for key in tuple(dir(self)):
-            if key in self.__annotations__:
-                value_default = getattr(self, key)
-                self[key] = deepcopy(value_default)
-
     def _generate_id(self, kwargs: dict) -> None:
         # Create a new id if there's no id.
-        if "id" in self.__annotations__:
+        if "id" in self._field_set:
             kwargs["id"] = kwargs.get("id", str(uuid4()))
 
     def _check_required_attributes(self, kwargs: dict) -> None:
         """Check if any required attribute is missing."""
         for key in kwargs:
-            if key not in self.__annotations__ and key not in self:
+            if key not in self._field_set:
                 raise AttributeError(f"{self.__class__.__name__} does not have attribute: {key!r}")
 
     def _get_attributes(self, kwargs: dict) -> None:
-        """Get all attributes from keyworded arguments."""
-        for key in self.__annotations__:
-            try:
+        """Get all attributes from keyworded arguments, falling back to the class defaults."""
+        defaults = self._defaults
+        copied_defaults = self._copied_defaults
+        for key in self._fields:
+            if key in kwargs:
                 self[key] = kwargs[key]
-            except KeyError as err:
-                if key not in self:
-                    raise AttributeError(f"{self.__class__.__name__} missing required attribute: {key!r}") from err
-
-    def __getattribute__(self, name: str) -> t.Any:
-        if name.startswith("_"):
-            return super().__getattribute__(name)
-
-        if name in self.__annotations__ and name in self:
-            return self[name]
-
-        return super().__getattribute__(name)
+            elif key in copied_defaults:
+                self[key] = deepcopy(defaults[key])
+            elif key in defaults:
+                self[key] = defaults[key]
+            else:
+                raise AttributeError(f"{self.__class__.__name__} missing required attribute: {key!r}")
 
     def __getattr__(self, name: str) -> t.Any:
         try:
@@ -60,7 +117,11 @@ class Base(dict):
             raise AttributeError(f"{self.__class__.__name__} does not have attribute: {name!r}") from err
 
     def __setattr__(self, name: str, value: t.Any) -> None:
-        self[name] = value
+        if name.startswith("_"):
+            # Private names never go into the dict, without an instance __dict__ this raises AttributeError.
+            super().__setattr__(name, value)
+        else:
+            self[name] = value
 
     def __deepcopy__(self, memo):
         return self.__class__(**deepcopy(dict(self)))
@@ -72,6 +133,8 @@ DataType = TypeVar("DataType", bound=Base)
 class PagingInfo(Base):
     """Paging info."""
 
+    __slots__ = ()
+
     page_count: int = 1
     """How many pages."""
 
@@ -88,6 +151,8 @@ class PagingInfo(Base):
 class Paging(Base, Generic[DataType]):
     """A Paging."""
 
+    __slots__ = ()
+
     data: Tuple[DataType, ...]
     """The actual data."""
 
@@ -96,3 +161,45 @@ class Paging(Base, Generic[DataType]):
 
     def to_response(self):
         return {"data": self.data, "paging": self.paging}
+
+
+class CursorPagingInfo(Base):
+    """Cursor paging info."""
+
+    __slots__ = ()
+
+    page_size: int = 10
+    """Current page size."""
+
+    next_cursor: t.Optional[str] = None
+    """Cursor to send back to get the next page, None on the last page."""
+
+    has_more: bool = False
+    """Whether there is a next page."""
+
+
+class CursorPaging(Paging[DataType]):
+    """A Paging keyed on the last returned record instead of an offset.
+
+    The data source is consumed lazily, only the records of the current page are ever materialized.
+    """
+
+    __slots__ = ()
+
+    paging: CursorPagingInfo
+    """Information on current paging."""
+
+    @classmethod
+    def from_iterable(cls, iterable: t.Iterable[DataType], page_size: int, key: t.Callable[[DataType], t.Any]) -> "CursorPaging[DataType]":
+        """Take one page from *iterable*, reading a single record past the page to know whether there is a next one.
+
+        Args:
+            iterable (Iterable): the data source, already positioned right after the previous cursor
+            page_size (int): maximum amount of records in the page
+            key (Callable): gets the cursor value of a record
+        """
+        items = tuple(itertools.islice(iterable, page_size + 1))
+        has_more = len(items) > page_size
+        items = items[:page_size]
+        next_cursor = encode_cursor(key(items[-1])) if has_more else None
+        return cls(data=items, paging=CursorPagingInfo(page_size=page_size, next_cursor=next_cursor, has_more=has_more))
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""Opt-in sampling profiler that keeps flamegraph data of slow calls only."""
+from __future__ import annotations
+
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Optional
+
+# Deepest stack kept in a sample, deeper frames are cut from the root side.
+MAX_STACK_DEPTH = 128
+
+
+class ProfileSession:
+    """Stack samples of one profiled call."""
+
+    __slots__ = ("id", "name", "started", "elapsed", "stacks")
+
+    def __init__(self, session_id: int, name: str):
+        self.id = session_id
+        self.name = name
+        self.started = time.time()
+        self.elapsed = 0.0
+        self.stacks: Counter[str] = Counter()
+
+    def summary(self) -> dict[str, Any]:
+        return {"id": self.id, "name": self.name, "started": self.started, "elapsed": self.elapsed, "samples": sum(self.stacks.values())}
+
+    def collapsed(self) -> str:
+        """Render the samples in the collapsed-stack format read by flamegraph.pl / speedscope."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class SamplingProfiler:
+    """Samples the stacks of the threads running a profiled call from a background thread.
+
+    The sampler thread only runs while at least one call is being profiled. When a call ends, its samples are kept if it
+    took at least `threshold` seconds and dropped otherwise, so fast calls only pay for registering their thread.
+
+    Only threads are profiled: the work of the routes is sampled on the pool threads running it, never on the event
+    loop shared by every request.
+    """
+
+    logger = logging.getLogger("SamplingProfiler")
+
+    def __init__(self, enabled: bool = False, interval: float = 0.005, threshold: float = 5.0, keep: int = 50):
+        self.enabled = enabled
+        self.interval = interval
+        self.threshold = threshold
+        self.profiles: deque[ProfileSession] = deque(maxlen=keep)
+        self._threads: dict[int, ProfileSession] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._sampler: Optional[threading.Thread] = None
+
+    def start(self, name: str) -> Optional[ProfileSession]:
+        """Start profiling the current thread, None when disabled or the thread is already profiled by an outer call."""
+        if not self.enabled:
+            return None
+
+        ident = threading.get_ident()
+        with self._lock:
+            if ident in self._threads:
+                return None
+            session = self._threads[ident] = ProfileSession(next(self._ids), name)
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample, name="Thread - Sampling Profiler", daemon=True)
+                self._sampler.start()
+        return session
+
+    def stop(self, session: Optional[ProfileSession], elapsed: float) -> None:
+        """Stop profiling the current thread, keeping the samples if the call was slow."""
+        if session is None:
+            return
+
+        with self._lock:
+            self._threads.pop(threading.get_ident(), None)
+        session.elapsed = elapsed
+        if elapsed >= self.threshold and session.stacks:
+            self.profiles.append(session)
+            self.logger.info("Kept profile %s of %s - %.2fs", session.id, session.name, elapsed)
+
+    @staticmethod
+    def _collapse(frame) -> str:
+        names: list[str] = []
+        while frame is not None and len(names) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def _sample(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._threads:
+                    self._sampler = None
+                    return
+                targets = list(self._threads.items())
+
+            frames = sys._current_frames()
+            for ident, session in targets:
+                if (frame := frames.get(ident)) is not None:
+                    session.stacks[self._collapse(frame)] += 1
+            del frames
+
+    def get(self, session_id: int) -> Optional[ProfileSession]:
+        """Get a kept profile by id."""
+        return next((session for session in self.profiles if session.id == session_id), None)
+
+
+PROFILER = SamplingProfiler(
+    enabled=os.environ.get("PROFILING", "0") == "1",
+    threshold=float(os.environ.get("PROFILING_THRESHOLD", 5)),
+)
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""Timeouts, circuit breaking and stale-while-revalidate caching of the calls to an upstream provider.
+
+Every provider has its own `Upstream`: a small thread pool running its calls, within an optional calls per minute
+budget, a circuit breaker and a cache of the last good response of each call. A call beyond the budget is not queued, it
+is answered like one to an open circuit, and the calls of one `call_all` are sent all together or not at all. A fresh response is served from the cache,
+a stale one is served at once while it is pulled again in the background, and only a missing or too old one makes the
+caller wait, at most `timeout` seconds.
+
+After `failures` calls in a row failed or timed out the circuit opens: nothing is sent to the provider for
+`reset_after` seconds, callers get the cached response however old, or `UpstreamUnavailableError` right away, instead of
+holding a request thread for the whole timeout. Then a single call probes the provider and closes the circuit again if
+it succeeds. Only the errors of the provider count as failures, see `is_provider_failure`: a client error such as a
+403 or 422 is raised to the caller as is.
+"""
+from __future__ import annotations
+
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Hashable, Optional
+
+from .metrics import METRICS
+
+MODULE_NAME = "Resilience"
+logger = logging.getLogger(MODULE_NAME)
+
+UPSTREAM_TIMEOUT = float(os.environ.get("UPSTREAM_TIMEOUT", 10))
+UPSTREAM_FAILURES = int(os.environ.get("UPSTREAM_FAILURES", 5))
+UPSTREAM_RESET_SECONDS = float(os.environ.get("UPSTREAM_RESET_SECONDS", 30))
+UPSTREAM_STALE_SECONDS = float(os.environ.get("UPSTREAM_STALE_SECONDS", 24 * 60 * 60))
+
+# Whether the last calls of the current thread waited for a provider, see `pulled_upstream`.
+_thread_calls = threading.local()
+
+
+class UpstreamUnavailableError(Exception):
+    """The provider failed, timed out or its circuit is open, and nothing was cached: answer with a 503."""
+
+
+def is_provider_failure(error: Exception) -> bool:
+    """Whether *error* says the provider is unwell: a timeout, a connection error, a 5xx or a 429 answer."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status >= 500 or status == 429
+    # Timeouts and connection errors, of the socket as well as of requests, are all OSError.
+    return isinstance(error, OSError)
+
+
+def pulled_upstream() -> bool:
+    """Whether the last `Upstream.call` or `Upstream.call_all` of the current thread waited for its provider, rather than
+    answering from the cache."""
+    return getattr(_thread_calls, "pulled", False)
+
+
+class CircuitBreaker:
+    """Opens after *failures* failures in a row, lets a single probe through *reset_after* seconds later."""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+    def __init__(self, provider: str, failures: int = UPSTREAM_FAILURES, reset_after: float = UPSTREAM_RESET_SECONDS):
+        self.provider = provider
+        self.failures = failures
+        self.reset_after = reset_after
+        self.state = self.CLOSED
+        self._failed = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+        self._open_gauge = METRICS.gauge("upstream_circuit_open", "1 while the circuit of the provider is open or half-open.", provider=provider)
+        self._opened = METRICS.counter("upstream_circuit_opened", "Times the circuit of the provider opened.", provider=provider)
+
+    def allow(self) -> bool:
+        """Whether a call may be sent, a half-open circuit only lets the first one through."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_after:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def success(self) -> None:
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("Circuit of %s closed", self.provider, extra={"fields": {"provider": self.provider}})
+            self.state = self.CLOSED
+            self._failed = 0
+            self._open_gauge.set(0)
+
+    def failure(self) -> None:
+        with self._lock:
+            self._failed += 1
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self._failed >= self.failures):
+                logger.warning("Circuit of %s opened after %s failures", self.provider, self._failed, extra={"fields": {"provider": self.provider, "failures": self._failed}})
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._open_gauge.set(1)
+                self._opened.inc()
+
+
+class RateLimiter:
+    """At most *calls* calls in any *period* seconds, checked before a call is sent rather than waited for."""
+
+    def __init__(self, calls: int, period: float = 60.0):
+        self.calls = calls
+        self.period = period
+        self._sent: deque[float] = deque()
+        self._lock = threading.Lock()
+
+    def retry_after(self, calls: int = 1) -> float:
+        """Seconds until the budget allows *calls* more calls, 0 when it does now, infinite when it never does."""
+        if calls > self.calls:
+            return math.inf
+        with self._lock:
+            now = time.monotonic()
+            while self._sent and now - self._sent[0] >= self.period:
+                self._sent.popleft()
+            over = len(self._sent) + calls - self.calls
+            return 0.0 if over <= 0 else self._sent[over - 1] + self.period - now
+
+    def acquire(self, calls: int = 1) -> None:
+        """Spend *calls* calls of the budget."""
+        with self._lock:
+            now = time.monotonic()
+            self._sent.extend(now for _ in range(calls))
+
+
+class Upstream:
+    """Runs the calls to one provider, see the module documentation.
+
+    Cached responses are shared between callers and must not be modified.
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        timeout: float = UPSTREAM_TIMEOUT,
+        failures: int = UPSTREAM_FAILURES,
+        reset_after: float = UPSTREAM_RESET_SECONDS,
+        stale_for: float = UPSTREAM_STALE_SECONDS,
+        max_entries: int = 256,
+        workers: int = 4,
+        calls_per_minute: Optional[int] = None,
+        is_failure: Callable[[Exception], bool] = is_provider_failure,
+    ):
+        self.provider = provider
+        self.timeout = timeout
+        self.stale_for = stale_for
+        self.max_entries = max_entries
+        self.is_failure = is_failure
+        self.breaker = CircuitBreaker(provider, failures, reset_after)
+        self.rate_limiter = RateLimiter(calls_per_minute) if calls_per_minute else None
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"upstream-{provider}")
+        # Key to (response, monotonic time it was pulled at), least recently used first.
+        self._cache: OrderedDict[Hashable, tuple[Any, float]] = OrderedDict()
+        self._in_flight: dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self._results = {result: METRICS.counter("upstream_cache", "Calls to the provider by how they were answered.", provider=provider, result=result) for result in ("fresh", "stale", "pulled", "stale_on_error", "unavailable")}
+        self._rate_limited = METRICS.counter("upstream_rate_limited", "Calls not sent because the rate budget of the provider was spent.", provider=provider)
+
+    def clear(self) -> None:
+        """Forget every cached response."""
+        with self._lock:
+            self._cache.clear()
+
+    def call(self, key: Hashable, func: Callable[..., Any], *args, ttl: Optional[float] = None) -> Any:
+        """
+        The response of `func(*args)`, cached under *key*.
+
+        Args:
+            key (Hashable): Identifies the call, e.g. its arguments.
+            func (Callable): The call to the provider, run in the provider's threads.
+            ttl (float, optional): Seconds the response stays fresh, forever by default. A stale response is served
+                while it is pulled again, for `stale_for` more seconds.
+
+        Raises:
+            UpstreamUnavailableError: When the call failed, timed out or the circuit is open, and nothing was cached.
+            Exception: The error of the call when it is not a failure of the provider, e.g. a 4xx answer.
+        """
+        return self.call_all([(key, func, args, ttl)])[0]
+
+    def call_all(self, calls: list[tuple[Hashable, Callable[..., Any], tuple, Optional[float]]]) -> list[Any]:
+        """
+        Same as `call` for many (key, func, args, ttl) calls, those to the provider run concurrently, within `timeout`.
+
+        Raises:
+            UpstreamUnavailableError: When a call failed, timed out or the circuit is open, and nothing was cached.
+            Exception: The error of a call when it is not a failure of the provider, e.g. a 4xx answer.
+        """
+        deadline = time.monotonic() + self.timeout
+        results: list[Any] = [None] * len(calls)
+        # Index, cached response, its age and ttl of the calls to pull.
+        pulls: list[tuple[int, Optional[tuple[Any, float]], float, Optional[float]]] = []
+        for index, (key, _, _, ttl) in enumerate(calls):
+            with self._lock:
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+            age = time.monotonic() - cached[1] if cached is not None else 0.0
+
+            if cached is not None and (ttl is None or age < ttl):
+                self._results["fresh"].inc()
+                results[index] = cached[0]
+                continue
+            pulls.append((index, cached, age, ttl))
+
+        futures = self._pull([calls[index][:3] for index, *_ in pulls]) if pulls else []
+        # Index, running call or the reason there is none, cached response and its age.
+        waiting: list[tuple[int, Future | UpstreamUnavailableError, Optional[tuple[Any, float]], float]] = []
+        for (index, cached, age, ttl), future in zip(pulls, futures):
+            if cached is not None and ttl is not None and age < ttl + self.stale_for:
+                self._results["stale"].inc()
+                results[index] = cached[0]
+                continue
+            waiting.append((index, future, cached, age))
+
+        _thread_calls.pulled = bool(waiting)
+        for index, future, cached, age in waiting:
+            try:
+                if isinstance(future, UpstreamUnavailableError):
+                    raise future
+                try:
+                    results[index] = future.result(max(0.0, deadline - time.monotonic()))
+                except FutureTimeoutError as error:
+                    # The call keeps running and caches its response if it ever succeeds.
+                    raise UpstreamUnavailableError(f"{self.provider} did not answer within {self.timeout:g}s") from error
+                except Exception as error:  # pylint: disable=broad-except
+                    if not self.is_failure(error):
+                        raise
+                    raise UpstreamUnavailableError(f"{self.provider} failed: {error}") from error
+                self._results["pulled"].inc()
+            except UpstreamUnavailableError as error:
+                if cached is None:
+                    self._results["unavailable"].inc()
+                    raise
+                logger.warning("Serving a %.0fs old response: %s", age, error, extra={"fields": {"provider": self.provider, "age": age}})
+                self._results["stale_on_error"].inc()
+                results[index] = cached[0]
+        return results
+
+    def _pull(self, calls: list[tuple[Hashable, Callable[..., Any], tuple]]) -> list[Future | UpstreamUnavailableError]:
+        """The running call of each (key, func, args), or a new one when the budget and the circuit allow it, or the
+        reason there is none.
+
+        The budget is checked for all the new calls at once: sending only some of them would spend it for nothing when
+        the caller needs them all.
+        """
+        with self._lock:
+            pulls: list[Future | UpstreamUnavailableError | None] = [self._in_flight.get(key) for key, _, _ in calls]
+            new = len({key for (key, _, _), future in zip(calls, pulls) if future is None})
+            # Checked before the circuit, a half-open circuit must not let its probe through for nothing.
+            if new and self.rate_limiter is not None and (retry_after := self.rate_limiter.retry_after(new)) > 0:
+                self._rate_limited.inc(new)
+                if math.isinf(retry_after):
+                    error = UpstreamUnavailableError(f"{new} calls exceed the rate budget of {self.provider}, {self.rate_limiter.calls} every {self.rate_limiter.period:g}s")
+                else:
+                    error = UpstreamUnavailableError(f"The rate budget of {self.provider} is spent for {retry_after:.0f}s")
+                return [error if future is None else future for future in pulls]
+
+            sent = 0
+            for index, (key, func, args) in enumerate(calls):
+                if pulls[index] is not None:
+                    continue
+                # The same key twice shares one call.
+                if (future := self._in_flight.get(key)) is not None:
+                    pulls[index] = future
+                    continue
+                if not self.breaker.allow():
+                    pulls[index] = UpstreamUnavailableError(f"The circuit of {self.provider} is open")
+                    continue
+                pulls[index] = self._in_flight[key] = self._executor.submit(self._run, key, func, args)
+                sent += 1
+            if sent and self.rate_limiter is not None:
+                self.rate_limiter.acquire(sent)
+            return pulls
+
+    def _run(self, key: Hashable, func: Callable[..., Any], args: tuple) -> Any:
+        started = time.monotonic()
+        try:
+            response = func(*args)
+        except Exception as error:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            # A client error is an answer all the same, it closes a half-open circuit.
+            if self.is_failure(error):
+                self.breaker.failure()
+            else:
+                self.breaker.success()
+            raise
+        with self._lock:
+            # Cached before the call leaves the in-flight ones, so no caller in between pulls it again.
+            self._cache[key] = (response, time.monotonic())
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+            self._in_flight.pop(key, None)
+        # Counted once per call, however many callers gave up waiting for it.
+        if time.monotonic() - started > self.timeout:
+            self.breaker.failure()
+        else:
+            self.breaker.success()
+        return response
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""Structured (JSON) log formatting and per-logger sampling."""
+from __future__ import annotations
+
+import logging
+import random
+from contextlib import suppress
+from typing import Any, Dict, Optional, Tuple
+
+import orjson
+
+
+class JsonFormatter(logging.Formatter):
+    """Format a LogRecord as a single JSON line.
+
+    Structured fields are passed with `extra={"fields": {...}}`. A field value can be a callable, in which case it is
+    only evaluated when the record is actually formatted, i.e. after every filter has let it through.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload: Dict[str, Any] = {
+            "time": record.created,
+            "name": record.name,
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+
+        if fields := getattr(record, "fields", None):
+            for key, value in fields.items():
+                payload[key] = value() if callable(value) else value
+
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+
+        return orjson.dumps(payload, default=str).decode()
+
+
+class SamplingFilter(logging.Filter):
+    """Only let a fraction of the records of a given logger name and level through.
+
+    Pairs without a rate are never sampled, so errors stay at 100% unless explicitly configured otherwise.
+    """
+
+    def __init__(self, rates: Optional[Dict[Tuple[str, str], float]] = None):
+        super().__init__()
+        self._rates: Dict[Tuple[str, str], float] = {}
+        for (levelname, name), rate in (rates or {}).items():
+            self.set_rate(levelname, name, rate)
+
+    def set_rate(self, levelname: str, name: str, rate: float) -> None:
+        """Keep `rate` (0 to 1) of the records of logger `name` at `levelname`."""
+        if rate >= 1:
+            self._rates.pop((name, levelname), None)
+        else:
+            self._rates[(name, levelname)] = max(rate, 0.0)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # The same filter can sit on several handlers, keep the first decision so they all see the same sample.
+        with suppress(AttributeError):
+            return record.sampled  # type: ignore
+
+        rate = self._rates.get((record.name, record.levelname))
+        record.sampled = rate is None or random.random() < rate
+        return record.sampled
@@ -4,6 +4,7 @@ from __future__ import annotations
 
 import asyncio
 import contextvars
+import datetime
 import inspect
 import logging
 import math
@@ -12,6 +13,7 @@ import time
 import traceback
 import os
 import tempfile
+import threading
 import json
 from concurrent.futures import ThreadPoolExecutor
 from contextlib import suppress
@@ -20,9 +22,11 @@ from functools import lru_cache, partial, wraps
 from typing import Any, Callable, Coroutine, Iterable
 
 import discord
-from .paging import Paging
+from .metrics import METRICS, CallMetrics, Counter, Gauge, Histogram
+from .paging import Base, InvalidCursorError, Paging
+from .profiler import PROFILER
+from .resilience import UpstreamUnavailableError
 from aws.bucket import upload_file_object
-from loguru import logger
 from pydantic import BaseModel
 from starlette.responses import JSONResponse
 
@@ -30,28 +34,232 @@ SIZE_NAME = ("B", "KB", "MB", "GB", "TB", "PB", "EB", "ZB", "YB")
 REGEX_CAPITALIZED = re.compile(r"[A-Z]+")
 REGEX_TO_SNAKE_CASE = re.compile(r"([^A-Z]+)([A-Z]+)")
 REGEX_PAGE_COUNT = re.compile(r"/Type\s*/Page([^s]|$)", re.MULTILINE | re.DOTALL)
+REGEX_CAMEL_SEPARATOR = re.compile(r"[ \(\)\{\}\[\]-]+")
+
+# Values of these types have no keys to rename, they are copied as-is by `Utility.to_camel`.
+LEAF_TYPES = frozenset((str, int, float, bool, type(None), bytes, datetime.date, datetime.datetime))
+
+# camelCased field names, computed once per model class.
+CAMEL_KEY_MAPS: dict[type, dict[str, str]] = {}
+
+
+# How often, in seconds, a pool's worker count is reconsidered.
+AUTOTUNE_INTERVAL = 5.0
+
+# How far above its configured size a pool may grow.
+AUTOTUNE_GROWTH_LIMIT = 4
+
+
+class PoolSaturatedError(Exception):
+    """A pool queue is full, the request should be rejected with a 503."""
+
+
+class PoolStats:
+    """Counters of a pool, updated from both the event loop and the worker threads."""
+
+    __slots__ = (
+        "workers",
+        "min_workers",
+        "max_workers",
+        "max_queue",
+        "active",
+        "queued",
+        "completed",
+        "failed",
+        "rejected",
+        "wait_time",
+        "run_time",
+        "_lock",
+        "_window_started",
+        "_window_completed",
+        "_window_wait",
+        "_window_run",
+        "_window_peak",
+        "_last_run_time",
+        "_last_grown",
+    )
+
+    def __init__(self, workers: int, max_workers: int, max_queue: int):
+        self.workers = workers
+        self.min_workers = 1
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.active = 0
+        self.queued = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.wait_time = Histogram()
+        self.run_time = Histogram()
+        self._lock = threading.Lock()
+        self._reset_window(time.perf_counter())
+        self._last_run_time = 0.0
+        self._last_grown = False
+
+    def _reset_window(self, now: float) -> None:
+        self._window_started = now
+        self._window_completed = 0
+        self._window_wait = 0.0
+        self._window_run = 0.0
+        self._window_peak = self.active
+
+    def try_enqueue(self) -> bool:
+        """Reserve a queue slot, False when the queue is full."""
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                return False
+            self.queued += 1
+            return True
+
+    def start(self, wait_time: float) -> None:
+        """A queued task got a worker."""
+        self.wait_time.record(wait_time)
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+            self._window_wait += wait_time
+            self._window_peak = max(self._window_peak, self.active)
+
+    def finish(self, run_time: float, failed: bool) -> None:
+        """A running task is done."""
+        self.run_time.record(run_time)
+        with self._lock:
+            self.active -= 1
+            self.completed += 1
+            self.failed += failed
+            self._window_completed += 1
+            self._window_run += run_time
+
+    def cancel(self) -> None:
+        """A queued task was cancelled before it got a worker."""
+        with self._lock:
+            self.queued -= 1
+
+    def snapshot(self) -> dict[str, Any]:
+        """Summarize the pool."""
+        return {
+            "workers": self.workers,
+            "active": self.active,
+            "queued": self.queued,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "wait_time": self.wait_time.snapshot(),
+            "run_time": self.run_time.snapshot(),
+        }
 
 
 class PoolManager:
-    """A manager for ThreadPoolExecutor."""
+    """A manager for ThreadPoolExecutor.
+
+    Each pool has a bounded queue, work submitted to a full pool raises `PoolSaturatedError`. The total amount of
+    workers across all pools is capped by `max_total_workers`. With `autotune`, the worker count of a pool is
+    periodically grown while tasks are queueing and growing does not slow the tasks down, and shrunk when it is
+    mostly idle.
+    """
 
     logger = logging.getLogger("PoolManager")
 
-    def __init__(self):
+    def __init__(self, max_total_workers: int | None = None, max_queue: int = 64, autotune: bool = True):
         self.pools: dict[str, ThreadPoolExecutor] = {}
+        self.stats: dict[str, PoolStats] = {}
+        self.max_total_workers = max_total_workers
+        self.max_queue = max_queue
+        self.autotune = autotune
         self.logger.debug("Initialized")
 
-    def initialize(self, name: str, max_workers: int | None = None):
+    def _fit_budget(self, name: str, workers: int) -> int:
+        """Clamp a worker count to what is left of the global budget, keeping at least one worker."""
+        if self.max_total_workers is None:
+            return workers
+        used = sum(stats.workers for pool_name, stats in self.stats.items() if pool_name != name)
+        return max(1, min(workers, self.max_total_workers - used))
+
+    def initialize(self, name: str, max_workers: int | None = None, max_queue: int | None = None):
         """Create and initialize a ThreadPoolExecutor.
 
         Arguments:
         -----------
         name: :class:`str`
+        max_workers: :class:`int`
+            Starting amount of workers, autotuning keeps it between 1 and `AUTOTUNE_GROWTH_LIMIT` times that.
+        max_queue: :class:`int`
+            How many tasks may wait for a worker before submissions are rejected.
         """
         if name not in self.pools:
-            self.pools[name] = ThreadPoolExecutor(thread_name_prefix=name, max_workers=max_workers)
+            # Same default as ThreadPoolExecutor.
+            workers = self._fit_budget(name, max_workers or min(32, (os.cpu_count() or 1) + 4))
+            self.stats[name] = PoolStats(workers, max_workers=workers * AUTOTUNE_GROWTH_LIMIT, max_queue=max_queue or self.max_queue)
+            self.pools[name] = ThreadPoolExecutor(thread_name_prefix=name, max_workers=workers)
+            self._register_metrics(name, self.stats[name])
             self.logger.info("Initialized pool %r, %s workers", name, self.pools[name]._max_workers)
 
+    @staticmethod
+    def _register_metrics(name: str, stats: PoolStats):
+        """Expose the counters of a pool on the `/metrics` endpoint."""
+        METRICS.register("pool_workers", Gauge(lambda: stats.workers), "Workers of the pool.", pool=name)
+        METRICS.register("pool_active", Gauge(lambda: stats.active), "Tasks running in the pool.", pool=name)
+        METRICS.register("pool_queued", Gauge(lambda: stats.queued), "Tasks waiting for a worker.", pool=name)
+        METRICS.register("pool_completed_total", Counter(lambda: stats.completed), "Tasks completed by the pool.", pool=name)
+        METRICS.register("pool_failed_total", Counter(lambda: stats.failed), "Tasks that raised.", pool=name)
+        METRICS.register("pool_rejected_total", Counter(lambda: stats.rejected), "Tasks rejected because the queue was full.", pool=name)
+        METRICS.register("pool_wait_seconds", stats.wait_time, "Time spent waiting for a worker.", pool=name)
+        METRICS.register("pool_run_seconds", stats.run_time, "Time spent running on a worker.", pool=name)
+
+    @staticmethod
+    def _unregister_metrics(name: str):
+        for metric_name in ("pool_workers", "pool_active", "pool_queued", "pool_completed_total", "pool_failed_total", "pool_rejected_total", "pool_wait_seconds", "pool_run_seconds"):
+            METRICS.unregister(metric_name, pool=name)
+
+    def resize(self, name: str, workers: int):
+        """Change the amount of workers of a pool.
+
+        The executor is swapped for a new one, work already handed to the old one still completes on its threads.
+        """
+        if not (stats := self.stats.get(name)):
+            return
+
+        workers = self._fit_budget(name, max(stats.min_workers, min(workers, stats.max_workers)))
+        if workers == stats.workers:
+            return
+
+        old_pool = self.pools[name]
+        self.pools[name] = ThreadPoolExecutor(thread_name_prefix=name, max_workers=workers)
+        old_pool.shutdown(wait=False)
+        self.logger.info("Resized pool %r, %s -> %s workers", name, stats.workers, workers)
+        stats.workers = workers
+
+    def _autotune(self, name: str):
+        """Reconsider the worker count of a pool once every `AUTOTUNE_INTERVAL` seconds."""
+        stats = self.stats[name]
+        now = time.perf_counter()
+        elapsed = now - stats._window_started
+        if elapsed < AUTOTUNE_INTERVAL or not stats._window_completed:
+            return
+
+        mean_wait = stats._window_wait / stats._window_completed
+        mean_run = stats._window_run / stats._window_completed
+        # Tasks spend a noticeable share of their time waiting for a worker.
+        queueing = stats.queued > 0 or mean_wait > 0.1 * mean_run
+        step = max(1, stats.workers // 4)
+
+        workers = stats.workers
+        if stats._last_grown and mean_run > stats._last_run_time * 1.5:
+            # The last growth made every task slower, the bottleneck is downstream (e.g. the upstream API is
+            # throttling us) and more threads only add contention. Undo it and stop growing past that point.
+            workers -= step
+            stats.max_workers = max(stats.min_workers, workers)
+        elif queueing and workers < stats.max_workers:
+            workers += step
+        elif not queueing and stats._window_peak < workers // 2:
+            workers -= 1
+
+        stats._last_grown = workers > stats.workers
+        stats._last_run_time = mean_run
+        stats._reset_window(now)
+        self.resize(name, workers)
+
     async def unblock(self, name: str, func, *args, max_workers: int | None = None, **kwargs):
         """Submit work to a ThreadPoolExecutor via name, and asynchronously run function *func* in a separate thread.
 
@@ -75,12 +283,51 @@ class PoolManager:
         Returns:
         -----------
         :class:`Any`
+
+        Raises:
+        -----------
+        :class:`PoolSaturatedError`
+            The queue of the pool is full.
         """
         self.initialize(name, max_workers=max_workers)
+        stats = self.stats[name]
+        if not stats.try_enqueue():
+            raise PoolSaturatedError(f"Pool {name!r} is saturated, {stats.queued} tasks are already waiting.")
+
         loop = asyncio.get_event_loop()
         ctx = contextvars.copy_context()
-        func_call = partial(ctx.run, func, *args, **kwargs)
-        return await loop.run_in_executor(self.pools[name], func_call)
+        submitted = time.perf_counter()
+        started = False
+        profile_name = f"{name}:{getattr(func, '__module__', None)}.{getattr(func, '__qualname__', type(func).__qualname__)}"
+
+        def func_call():
+            nonlocal started
+            started = True
+            run_started = time.perf_counter()
+            stats.start(run_started - submitted)
+            # Sampled here, on the worker thread running *func*, not on the event loop awaiting it.
+            session = PROFILER.start(profile_name)
+            failed = True
+            try:
+                response = ctx.run(func, *args, **kwargs)
+                failed = False
+                return response
+            finally:
+                elapsed = time.perf_counter() - run_started
+                PROFILER.stop(session, elapsed)
+                stats.finish(elapsed, failed)
+
+        try:
+            return await loop.run_in_executor(self.pools[name], func_call)
+        finally:
+            if not started:
+                stats.cancel()
+            if self.autotune:
+                self._autotune(name)
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        """Summarize every pool."""
+        return {name: stats.snapshot() for name, stats in self.stats.items()}
 
     def shutdown(self, name: str):
         """Shutdown a ThreadPoolExecutor via name.
@@ -89,6 +336,8 @@ class PoolManager:
         -----------
         name: :class:`str`
         """
+        self.stats.pop(name, None)
+        self._unregister_metrics(name)
         if not (pool := self.pools.pop(name, None)):
             return
 
@@ -99,8 +348,10 @@ class PoolManager:
         """Shutdown all pool."""
         for name, pool in self.pools.items():
             pool.shutdown(wait=False, cancel_futures=True)
+            self._unregister_metrics(name)
             self.logger.info("Pool %r shutdown", name)
         self.pools.clear()
+        self.stats.clear()
 
 
 class Utility:
@@ -109,7 +360,7 @@ class Utility:
     __slots__ = ()
 
     logger = logging.getLogger("Utility")
-    pool = PoolManager()
+    pool = PoolManager(max_total_workers=int(os.environ.get("POOL_MAX_TOTAL_WORKERS", 64)), max_queue=int(os.environ.get("POOL_MAX_QUEUE", 64)))
 
     @staticmethod
     async def unblock(
@@ -200,24 +451,62 @@ class Utility:
         return f"{s} {SIZE_NAME[i]}"
 
     @staticmethod
-    def to_camel(data: list | dict) -> dict | list:
+    def camel_key_map(model: type) -> dict[str, str]:
+        """Get the camelCased field names of a `Base` or pydantic model class, computed once per class."""
+        with suppress(KeyError):
+            return CAMEL_KEY_MAPS[model]
+
+        fields: Iterable[str] = ()
+        if issubclass(model, Base):
+            fields = model._fields
+        elif issubclass(model, BaseModel):
+            fields = model.__fields__
+        key_map = CAMEL_KEY_MAPS[model] = {key: Utility.camel_case(key) for key in fields}
+        return key_map
+
+    @staticmethod
+    def to_camel(data: Any) -> Any:
         """
         Turning all keys to camelCase to comply with FE.
 
+        Walks the data with an explicit stack instead of recursion. Models reuse a key map computed once per class,
+        and a list whose first item is a leaf (e.g. the close prices of a candle series) is assumed homogeneous and
+        passed through untouched instead of being rebuilt item by item.
+
         Args:
-            data (dict): The data in question, can be a child of Base / an object from pymongo.
+            data (Any): The data in question, can be a child of Base / a pydantic model / an object from pymongo.
 
         Returns:
-            dict: The data whose keys have been camelCased.
+            Any: The data whose keys have been camelCased.
         """
-        if isinstance(data, (list, tuple)):
-            return list(map(Utility.to_camel, data))
-
-        if not isinstance(data, dict):
-            # Can be str int etc, return it raw.
-            return data
-
-        return {Utility.camel_case(key): Utility.to_camel(value) for key, value in data.items()}
+        holder = [data]
+        stack: list[tuple[Any, Any, Any]] = [(holder, 0, data)]
+        while stack:
+            parent, slot, value = stack.pop()
+
+            if isinstance(value, (dict, BaseModel)):
+                # Empty for plain dicts, their keys go through the `camel_case` cache instead.
+                key_map = Utility.camel_key_map(type(value))
+                items = value.items() if isinstance(value, dict) else ((key, getattr(value, key)) for key in key_map)
+
+                result = {}
+                for key, item in items:
+                    camel_key = key_map.get(key) or Utility.camel_case(key)
+                    result[camel_key] = item
+                    if type(item) not in LEAF_TYPES:
+                        stack.append((result, camel_key, item))
+                parent[slot] = result
+
+            elif isinstance(value, (list, tuple)):
+                if not value or type(value[0]) in LEAF_TYPES:
+                    continue
+                result = list(value)
+                for index, item in enumerate(result):
+                    if type(item) not in LEAF_TYPES:
+                        stack.append((result, index, item))
+                parent[slot] = result
+
+        return holder[0]
 
     @staticmethod
     def to_snake_case(text: str) -> str:
@@ -258,7 +547,7 @@ class Utility:
     @lru_cache(maxsize=2048)
     def camel_case(text: str) -> str:
         """Convert snake_case to camelCase."""
-        text_cleaned = re.sub(pattern=r"[ \(\)\{\}\[\]-]+", repl="_", string=text)
+        text_cleaned = REGEX_CAMEL_SEPARATOR.sub("_", text)
         first, *rest = text_cleaned.split("_")
         return f"{first.lower()}{''.join(map(str.capitalize, rest))}"
 
@@ -277,41 +566,54 @@ class Utility:
         source = inspect.getsourcefile(func) or "unknown"
         filename = source.strip(".py").rsplit("\\")[-1].title()
         local_logger = logging.getLogger(filename)
+        metrics = CallMetrics(METRICS, "route", module=func.__module__, function=func.__qualname__)
 
         @wraps(func)
         async def wrapper(*args, **kwargs):
+            started = metrics.start()
+            failed = True
             try:
-                f = logger.catch()(func)
-                started = time.perf_counter()
                 local_logger.debug(func.__name__)
-                response = await f(*args, **kwargs)
+                response = await func(*args, **kwargs)
                 local_logger.info("%s - %.2fs", func.__name__, time.perf_counter() - started)
                 if not isinstance(response, dict):
                     response = {"data": response}
                 if isinstance(response, Paging):
                     response = {"data": response.to_response()}
-                return Utility.to_camel(response)
+                response = Utility.to_camel(response)
+                failed = False
+                return response
+            except InvalidCursorError as error:
+                return JSONResponse(status_code=400, content={"message": str(error)})
+            except (PoolSaturatedError, UpstreamUnavailableError) as error:
+                local_logger.warning(str(error))
+                return JSONResponse(status_code=503, content={"message": str(error)})
             except Exception as error:  # pylint: disable=broad-except
                 local_logger.error(Utility.format_exception(error))
                 return JSONResponse(status_code=500, content={"message": str(error)})
+            finally:
+                metrics.stop(started, failed)
 
         return wrapper
 
     @staticmethod
     def measure_runtime(func):
-        """Measure how much time a function run."""
+        """Measure how much time a function run, and record it on the `/metrics` endpoint.
+
+        A failed call is logged, counted in the errors of the function and returns None.
+        """
         source = inspect.getsourcefile(func) or "unknown"
-        f = logger.catch()(func)
         filename = source.strip(".py").rsplit("\\")[-1].title()
         local_logger = logging.getLogger(filename)
+        metrics = CallMetrics(METRICS, "function", module=func.__module__, function=func.__qualname__)
+        profile_name = f"{func.__module__}.{func.__qualname__}"
 
         def pre_run():
-            started = time.perf_counter()
             local_logger.debug(func.__name__)
-            return started
+            return metrics.start()
 
         def post_run(started):
-            time_consumed = time.perf_counter() - started
+            time_consumed = metrics.stop(started)
 
             logging_method = None
             if time_consumed >= 5:
@@ -324,28 +626,61 @@ class Utility:
 
         @wraps(func)
         def wrapper(*args, **kwargs):
+            started = pre_run()
+            session = PROFILER.start(profile_name)
             try:
-                started = pre_run()
-                response = f(*args, **kwargs)
+                response = func(*args, **kwargs)
                 post_run(started)
                 return response
             except Exception as error:  # pylint: disable=broad-except
+                metrics.stop(started, failed=True)
                 local_logger.error(Utility.format_exception(error))
-                return JSONResponse(status_code=500, content={"message": str(error)})
+                return None
+            finally:
+                PROFILER.stop(session, time.perf_counter() - started)
 
         @wraps(func)
         async def async_wrapper(*args, **kwargs):
+            started = pre_run()
             try:
-                started = pre_run()
-                response = await f(*args, **kwargs)
+                response = await func(*args, **kwargs)
                 post_run(started)
                 return response
             except Exception as error:  # pylint: disable=broad-except
+                metrics.stop(started, failed=True)
                 local_logger.error(Utility.format_exception(error))
-                return JSONResponse(status_code=500, content={"message": str(error)})
+                return None
 
         return async_wrapper if inspect.iscoroutinefunction(func) else wrapper
 
+    @staticmethod
+    def track_upstream(provider: str):
+        """Record the latency, errors and in-flight calls of a call to an upstream provider.
+
+        Unlike `measure_runtime`, exceptions are re-raised untouched.
+
+        Args:
+            provider (str): name of the upstream, used as the `provider` label
+        """
+
+        def decorator(func):
+            metrics = CallMetrics(METRICS, "upstream", provider=provider, function=func.__qualname__)
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                started = metrics.start()
+                failed = True
+                try:
+                    response = func(*args, **kwargs)
+                    failed = False
+                    return response
+                finally:
+                    metrics.stop(started, failed)
+
+            return wrapper
+
+        return decorator
+
     @staticmethod
     def async_now(func=None, executor=None):
         def wrapper(f):
@@ -1,12 +1,16 @@
 # -*- coding: utf-8 -*-
 import asyncio
+import atexit
 import logging
 import os
+import queue
 import sys
+from logging.handlers import QueueHandler, QueueListener
 from threading import Thread
 
 import coloredlogs
 from helpers.pogger import WebhookHandler
+from helpers.structured_log import JsonFormatter, SamplingFilter
 from loguru import logger
 
 logger.remove()
@@ -19,6 +23,12 @@ class InterceptHandler(logging.Handler):
 
     loggers = {}
 
+    def __init__(self, level=logging.NOTSET, find_caller: bool = True):
+        super().__init__(level=level)
+        # When records are replayed by a QueueListener the current stack belongs to the listener thread,
+        # walking it would only point Loguru at the listener, so the caller lookup is skipped.
+        self.find_caller = find_caller
+
     def emit(self, record):
         # Get corresponding Loguru level if it exists
         try:
@@ -27,16 +37,31 @@ class InterceptHandler(logging.Handler):
             level = record.levelno
 
         # Find caller from where originated the logged message
-        frame, depth = sys._getframe(2), 2
-        while frame.f_code.co_filename == logging.__file__:  # type: ignore
-            frame = frame.f_back  # type: ignore
-            depth += 1
+        depth = 0
+        if self.find_caller:
+            frame, depth = sys._getframe(2), 2
+            while frame.f_code.co_filename == logging.__file__:  # type: ignore
+                frame = frame.f_back  # type: ignore
+                depth += 1
 
         if record.name not in self.loggers:
             self.loggers[record.name] = logger.bind(name=record.name)
         self.loggers[record.name].opt(depth=depth, exception=record.exc_info).log(level, record.getMessage())
 
 
+class LocalQueueHandler(QueueHandler):
+    """Enqueue records as-is for a QueueListener living in the same process.
+
+    The stock `QueueHandler.prepare` formats the message and strips the record so it can be pickled,
+    which would put the formatting cost right back on the calling thread."""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.enqueue(record)
+        except Exception:  # pylint: disable=broad-except
+            self.handleError(record)
+
+
 coloredlogs.DEFAULT_LEVEL_STYLES = {
     **coloredlogs.DEFAULT_LEVEL_STYLES,
     "critical": {"background": "red"},
@@ -47,12 +72,45 @@ log_level = logging.DEBUG if os.environ.get("PRODUCTION", False) == "DEBUG" else
 if isinstance(log_level, str):
     log_level = logging.INFO
 
+# With ASYNC_LOGGING=1 the request threads only push records onto a queue, a single listener thread does the
+# formatting and fans them out to the console, Loguru and the Discord webhook.
+async_logging = os.environ.get("ASYNC_LOGGING", "0") == "1"
+
+# With STRUCTURED_LOGGING=1 the console prints one JSON object per line instead of the colored text format.
+structured_logging = os.environ.get("STRUCTURED_LOGGING", "0") == "1"
+
 format_string = "%(asctime)s | %(name)s | %(levelname)s | %(message)s"
 
 coloredlogs.install(stream=sys.stdout, level=log_level, fmt=format_string)
 
 logging.basicConfig(level=log_level, format=format_string)
-logging.getLogger().addHandler(InterceptHandler(level=log_level))
+if structured_logging:
+    for handler in logging.getLogger().handlers:
+        handler.setFormatter(JsonFormatter())
+logging.getLogger().addHandler(InterceptHandler(level=log_level, find_caller=not async_logging))
+
+# Per-logger sampling of the high-volume success logs, LOG_SAMPLE_RATE=0.01 keeps 1% of them.
+# Anything not listed here, errors included, is always kept.
+sampling_filter = SamplingFilter()
+success_sample_rate = float(os.environ.get("LOG_SAMPLE_RATE", 1))
+sampling_filter.set_rate(levelname="INFO", name="FinnHub_API", rate=success_sample_rate)
+sampling_filter.set_rate(levelname="INFO", name="YahooFinance_API", rate=success_sample_rate)
+sampling_filter.set_rate(levelname="INFO", name="Newspaper3k_API", rate=success_sample_rate)
+sampling_filter.set_rate(levelname="INFO", name="AWS_S3_BUCKET", rate=success_sample_rate)
+
+log_listener: QueueListener | None = None
+if async_logging:
+    root_logger = logging.getLogger()
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    log_listener = QueueListener(log_queue, *root_logger.handlers, respect_handler_level=True)
+    root_logger.handlers = [LocalQueueHandler(log_queue)]
+    log_listener.start()
+    atexit.register(log_listener.stop)
+
+# Sample on whatever sits on the root logger, in async mode that is the queue handler so dropped records are never
+# enqueued.
+for handler in logging.getLogger().handlers:
+    handler.addFilter(sampling_filter)
 
 try:
     webhook_handler = WebhookHandler.create(os.environ["DISCORD_WEBHOOK"])
@@ -4,7 +4,7 @@ import logging
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from router import finnhub, yahoo, news
+from router import finnhub, yahoo, candles, news, monitor, stream, backtest, screener, prediction, features
 
 logger = logging.getLogger("Backend")
 
@@ -27,7 +27,15 @@ app.add_middleware(
 
 app.include_router(finnhub.router)
 app.include_router(yahoo.router)
+app.include_router(candles.router)
 app.include_router(news.router)
+app.include_router(monitor.router)
+app.include_router(monitor.metrics_router)
+app.include_router(stream.router)
+app.include_router(backtest.router)
+app.include_router(screener.router)
+app.include_router(prediction.router)
+app.include_router(features.router)
 
 if __name__ == "__main__":
     uvicorn.run("main:app", workers=1, host="0.0.0.0", port=8000)
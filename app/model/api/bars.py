@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+from enum import StrEnum
+
+import numpy as np
+import pandas as pd
+
+
+class Resolution(StrEnum):
+    MINUTE = "1m"
+    MINUTE_5 = "5m"
+    MINUTE_15 = "15m"
+    MINUTE_60 = "60m"
+    DAY = "D"
+    WEEK = "W"
+
+
+# Length of a bar in seconds.
+BAR_SECONDS = {
+    Resolution.MINUTE: 60,
+    Resolution.MINUTE_5: 5 * 60,
+    Resolution.MINUTE_15: 15 * 60,
+    Resolution.MINUTE_60: 60 * 60,
+    Resolution.DAY: 24 * 60 * 60,
+    Resolution.WEEK: 7 * 24 * 60 * 60,
+}
+INTRADAY = (Resolution.MINUTE, Resolution.MINUTE_5, Resolution.MINUTE_15, Resolution.MINUTE_60)
+# The UNIX epoch is a Thursday, weeks start 4 days later on Monday.
+WEEK_ORIGIN = 4 * 24 * 60 * 60
+# Intraday bars are aligned on the opening of the regular session, 09:30 on the clock of the exchange.
+EXCHANGE_TIMEZONE = "America/New_York"
+SESSION_OPEN = (9 * 60 + 30) * 60
+
+
+def base_resolution(resolution: str) -> Resolution:
+    """The resolution pulled upstream to derive *resolution* from: 1 minute bars for intraday, daily bars otherwise.
+
+    Daily and weekly bars are not derived from minute bars, the upstream daily bars already account for the auctions and
+    corrections the minute bars miss.
+    """
+    return Resolution.MINUTE if resolution in INTRADAY else Resolution.DAY
+
+
+def exchange_offsets(time: np.ndarray, timezone: str = EXCHANGE_TIMEZONE) -> np.ndarray:
+    """Seconds to add to each UNIX time (UTC) to read the wall clock of the exchange, daylight saving time included."""
+    wall_clock = pd.to_datetime(time, unit="s", utc=True).tz_convert(timezone).tz_localize(None)
+    return wall_clock.values.astype("datetime64[s]").astype(np.int64) - time
+
+
+def bucket_starts(time: np.ndarray, resolution: str, offset: np.ndarray | int = 0) -> np.ndarray:
+    """Start (UNIX seconds) of the bar of *resolution* holding each time.
+
+    Intraday bars start from `SESSION_OPEN` on the wall clock of the exchange, *offset* being the seconds to add to the
+    times to read that clock, so 60 minute bars start at 09:30, 10:30 and so on. Weeks start on Monday.
+    """
+    seconds = BAR_SECONDS[Resolution(resolution)]
+    if resolution in INTRADAY:
+        wall_clock = time + offset
+        return (wall_clock - SESSION_OPEN) // seconds * seconds + SESSION_OPEN - offset
+    origin = WEEK_ORIGIN if resolution == Resolution.WEEK else 0
+    return (time - origin) // seconds * seconds + origin
+
+
+def resample(time, open_, high, low, close, volume, resolution: str, offset: np.ndarray | int = 0) -> tuple[np.ndarray, ...]:
+    """Aggregate chronological OHLCV bars into coarser bars of *resolution*, without a Python loop over the bars.
+
+    Args:
+        time: Start of each bar in UNIX seconds, ascending.
+        open_, high, low, close, volume: The bar values, same length as *time*.
+        resolution (str): The coarser resolution.
+        offset: Seconds to add to *time* to read the wall clock of the exchange, see `bucket_starts`.
+
+    Returns:
+        tuple[np.ndarray, ...]: (time, open, high, low, close, volume) of the coarser bars, time being the start of each
+        bar. Empty buckets are skipped, not filled.
+    """
+    time = np.asarray(time, dtype=np.int64)
+    if not len(time):
+        return time, *(np.asarray(values, dtype=float) for values in (open_, high, low, close, volume))
+
+    buckets = bucket_starts(time, resolution, offset)
+    # Bars are sorted, a new bucket starts wherever the bucket changes.
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(time)] - 1
+    return (
+        buckets[starts],
+        np.asarray(open_)[starts],
+        np.maximum.reduceat(np.asarray(high), starts),
+        np.minimum.reduceat(np.asarray(low), starts),
+        np.asarray(close)[ends],
+        np.add.reduceat(np.asarray(volume), starts),
+    )
+
+
+def resample_candles(response: dict, resolution: str) -> dict:
+    """Resample a FinnHub `stock_candles` response (keys c, h, l, o, v, t, s) into a new response of *resolution*.
+
+    Its times are UTC, intraday bars are aligned on the session open of `EXCHANGE_TIMEZONE`.
+    """
+    offset = exchange_offsets(np.asarray(response["t"], dtype=np.int64)) if resolution in INTRADAY else 0
+    time, open_, high, low, close, volume = resample(response["t"], response["o"], response["h"], response["l"], response["c"], response["v"], resolution, offset)
+    return {"c": close.tolist(), "h": high.tolist(), "l": low.tolist(), "o": open_.tolist(), "v": volume.tolist(), "t": time.tolist(), "s": response["s"]}
+
+
+def resample_frame(frame: pd.DataFrame, resolution: str) -> pd.DataFrame:
+    """Resample a yfinance `history` frame (DatetimeIndex, Open, High, Low, Close, Volume) into a new frame of *resolution*.
+
+    Bars are bucketed on the wall clock of the index, so intraday bars start from the session open and a week starts on
+    Monday in the timezone of the exchange.
+    """
+    wall_clock = frame.index.tz_localize(None) if frame.index.tz is not None else frame.index
+    time, open_, high, low, close, volume = resample(
+        wall_clock.values.astype("datetime64[s]").astype(np.int64),
+        frame["Open"].to_numpy(),
+        frame["High"].to_numpy(),
+        frame["Low"].to_numpy(),
+        frame["Close"].to_numpy(),
+        frame["Volume"].to_numpy(),
+        resolution,
+    )
+    index = pd.to_datetime(time, unit="s")
+    if frame.index.tz is not None:
+        index = index.tz_localize(frame.index.tz)
+    return pd.DataFrame({"Open": open_, "High": high, "Low": low, "Close": close, "Volume": volume}, index=index.rename(frame.index.name))
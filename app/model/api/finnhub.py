@@ -2,23 +2,68 @@
 from __future__ import annotations
 from contextlib import suppress
 
+import calendar
 import datetime
+import os
 import time
 import logging
 
 from functools import lru_cache
+from typing import Iterator
 
 import streamlit as st
 import finnhub as fb
 
 from finnhub.client import Client
 
+from . import bars
 from .base import BaseFinanceAPI
+from helpers.paging import CursorPaging, InvalidCursorError, decode_cursor
+from helpers.resilience import Upstream
 from helpers.utility import Utility
+from model.data.finance_api import Candle
+from model.indicators import INDICATOR_CACHE, series_key
 
 MODULE_NAME = "FinnHub_API"
 logger = logging.getLogger(MODULE_NAME)
 
+# FinnHub name of each resolution.
+FINNHUB_RESOLUTIONS = {"1m": "1", "5m": "5", "15m": "15", "60m": "60", "D": "D", "W": "W"}
+# Series reaching into the last day may still get bars, they are pulled again after this many seconds.
+SERIES_TTL = 60
+# Daily ranges longer than this are pulled in calendar years.
+YEAR_SECONDS = 366 * 24 * 60 * 60
+FINNHUB_UPSTREAM = Upstream("FinnHub", max_entries=1024, calls_per_minute=int(os.environ.get("FINNHUB_CALLS_PER_MINUTE", 60)))
+
+
+def year_chunks(from_date: int, to_date: int) -> list[tuple[int, int]]:
+    """
+    The calendar years (UTC) covering a range, as (first second, last second) in UNIX seconds.
+
+    Ranges overlapping the same years split into the very same chunks, so they share their cached responses.
+    """
+    first = datetime.datetime.fromtimestamp(from_date, tz=datetime.timezone.utc).year
+    last = datetime.datetime.fromtimestamp(to_date, tz=datetime.timezone.utc).year
+    return [(calendar.timegm((year, 1, 1, 0, 0, 0)), calendar.timegm((year + 1, 1, 1, 0, 0, 0)) - 1) for year in range(first, last + 1)]
+
+
+def merge_chunks(responses: list[dict], from_date: int, to_date: int) -> dict:
+    """
+    One `stock_candles` response of the bars of chunk *responses*, in chronological order, within the range.
+
+    Chunks without data are skipped, the response of the first chunk is returned as-is when none has any.
+    """
+    merged: dict[str, list] = {key: [] for key in ("c", "h", "l", "o", "t", "v")}
+    found = False
+    for response in responses:
+        if response.get("s") != "ok":
+            continue
+        found = True
+        keep = [index for index, value in enumerate(response["t"]) if from_date <= value <= to_date]
+        for key, values in merged.items():
+            values.extend(response[key][index] for index in keep)
+    return merged | {"s": "ok"} if found else dict(responses[0])
+
 
 class FinnHubAPI(BaseFinanceAPI):
     """`FinnHub API Object`. For documentation, please use this link: https://finnhub.io/docs/api"""
@@ -42,9 +87,13 @@ class FinnHubAPI(BaseFinanceAPI):
             Client: The connected API client.
         """
         with suppress(ValueError, KeyError):
-            return fb.Client(api_key=self.api_key)
+            client = fb.Client(api_key=self.api_key)
+            # Give the provider's threads back when `FINNHUB_UPSTREAM` gives up waiting.
+            client.DEFAULT_TIMEOUT = FINNHUB_UPSTREAM.timeout
+            return client
 
-    def pull_data_sync(self, ticker: str, from_date: int, to_date: int) -> dict:
+    @Utility.track_upstream("FinnHub")
+    def pull_data_sync(self, ticker: str, from_date: int, to_date: int, resolution: str = "D") -> dict:
         """
         Retrieves stock candle data for a given ticker symbol
         within a specified date range.
@@ -53,19 +102,64 @@ class FinnHubAPI(BaseFinanceAPI):
             ticker (str): The ticker symbol to retrieve data.
             from_date (int): The start date in UNIX timestamp format.
             to_date (int): The ending date in UNIX timestamp format.
+            resolution (str): One of 1m, 5m, 15m, 60m, D, W.
 
         Returns:
             dict: The retrieved stock candle data.
         """
-        return self.client_api.stock_candles(ticker, "D", from_date, to_date)
+        return self.client_api.stock_candles(ticker, FINNHUB_RESOLUTIONS[resolution], from_date, to_date)
+
+    def pull_series(self, ticker: str, from_date: int, to_date: int, resolution: str = "D") -> dict:
+        """
+        Same as `pull_data_sync`, through `FINNHUB_UPSTREAM`: cached, served stale while the provider is slow or down.
+        The response is shared between callers and must not be modified.
+
+        Daily series longer than a year are pulled one calendar year at a time (see `year_chunks`), concurrently, each
+        year cached on its own, then merged: a long history is never one huge upstream call, and overlapping long ranges
+        share their years. Shorter ones are a single call of their own range, not of every year they touch.
+
+        Raises:
+            UpstreamUnavailableError: When FinnHub failed and the series was never pulled.
+        """
+        chunks = year_chunks(from_date, to_date) if resolution == "D" and to_date - from_date > YEAR_SECONDS else [(from_date, to_date)]
+        calls = [
+            # Past chunks never change.
+            ((ticker, start, end, resolution), self.pull_data_sync, (ticker, start, end, resolution), SERIES_TTL if end > time.time() - 86400 else None)
+            for start, end in chunks
+        ]
+        responses = FINNHUB_UPSTREAM.call_all(calls)
+        return responses[0] if resolution != "D" else merge_chunks(responses, from_date, to_date)
+
+    def pull_candles(self, ticker: str, from_date: int, to_date: int, resolution: str = "D") -> dict:
+        """
+        Retrieves stock candle data at any resolution, derived from the cached series of its base resolution
+        (see `bars.base_resolution`), so switching between resolutions does not pull the upstream again.
+
+        Args:
+            ticker (str): The ticker symbol to retrieve data.
+            from_date (int): The start date in UNIX timestamp format.
+            to_date (int): The ending date in UNIX timestamp format.
+            resolution (str): One of 1m, 5m, 15m, 60m, D, W.
+
+        Returns:
+            dict: A new response in the shape of `pull_data_sync`.
+        """
+        base = bars.base_resolution(resolution)
+        response = self.pull_series(ticker, from_date, to_date, base)
+        if response.get("s") != "ok":
+            # FinnHub answers a range without bars with its status alone.
+            return {key: [] for key in ("c", "h", "l", "o", "t", "v")} | {"s": response.get("s")}
+        if base == resolution:
+            return dict(response)
+        return bars.resample_candles(response, resolution)
 
-    @lru_cache
     @Utility.measure_runtime
     def pull_data(
         self,
         ticker: str | tuple[str],
         from_date: str,
         to_date: str,
+        resolution: str = "D",
     ) -> dict[str, int | float | str] | list[dict[str, int | float | str]] | None:
         """
         Retrieves stock candle data for a given ticker symbol or list of
@@ -74,31 +168,124 @@ class FinnHubAPI(BaseFinanceAPI):
         Args:
             ticker (str | list[str]): The ticker symbol(s) for which to retrieve data.
             from_date (str): The starting date in the format 'YYYY-MM-DD'.
-            to_date (str): The ending date in the format 'YYYY-MM-DD'.
+            to_date (str): The ending date in the format 'YYYY-MM-DD', included.
+            resolution (str): One of 1m, 5m, 15m, 60m, D, W.
 
         Returns:
             dict | list[dict]: The retrieved stock candle data.
             If a single ticker is provided, a dictionary is returned.
             If a list of tickers is provided, a list of dictionaries is returned.
+            None when the data could not be pulled, see `pull_columns` for the reason.
+        """
+        return self.pull_columns(ticker, from_date, to_date, resolution)
+
+    def pull_columns(
+        self,
+        ticker: str | tuple[str],
+        from_date: str,
+        to_date: str,
+        resolution: str = "D",
+    ) -> dict[str, int | float | str] | list[dict[str, int | float | str]]:
+        """
+        Same as `pull_data`, raising instead of returning None.
+
+        Raises:
+            UpstreamUnavailableError: When FinnHub failed and the candles were never pulled.
         """
         from_date_unix = self.convert_date_to_unix(from_date)
-        to_date_unix = self.convert_date_to_unix(to_date)
-        try:
-            if not isinstance(ticker, tuple):
-                response = self.pull_data_sync(ticker, from_date_unix, to_date_unix)
-                logger.info(f"Successfully pulling {ticker} from {from_date} to {to_date}")
-                return self.clean_data(response)
-
-            result = []
-            for name in ticker:
-                response = {name: self.pull_data_sync(name, from_date_unix, to_date_unix)}
-                result.append(response)
-
-            logger.info(f"Successfully pulling {ticker} from {from_date} to {to_date}")
-            return result
-        except Exception as error:
-            logger.error(error)
-            return None
+        # Up to the end of the day, for the intraday bars of the last day.
+        to_date_unix = self.convert_date_to_unix(to_date) + 86399
+        fields = {"ticker": ticker, "from_date": from_date, "to_date": to_date, "resolution": resolution}
+        if not isinstance(ticker, tuple):
+            response = self.pull_candles(ticker, from_date_unix, to_date_unix, resolution)
+            logger.info("Successfully pulling %s from %s to %s", ticker, from_date, to_date, extra={"fields": fields})
+            return self.clean_data(response, resolution)
+
+        result = []
+        for name in ticker:
+            response = {name: self.pull_candles(name, from_date_unix, to_date_unix, resolution)}
+            result.append(response)
+
+        logger.info("Successfully pulling %s from %s to %s", ticker, from_date, to_date, extra={"fields": fields})
+        return result
+
+    def compute_indicators(self, ticker: str, resolution: str, response: dict, names: tuple[str, ...]) -> dict[str, list]:
+        """
+        Computes technical indicators over candles returned by `pull_data`, cached per series.
+
+        Args:
+            ticker (str): The ticker symbol of the candles.
+            resolution (str): The resolution of the candles.
+            response (dict): The cleaned candles.
+            names (tuple[str, ...]): Indicators as parsed by `model.indicators.parse_names`.
+
+        Returns:
+            dict[str, list]: Column name to values, None while an indicator warms up.
+        """
+        key = series_key(self.api_name, ticker, resolution, response["time"])
+        return INDICATOR_CACHE.get(key, response, names)
+
+    def iter_candles(self, ticker: str, from_date: str, to_date: str, window_days: int = 365) -> Iterator[Candle]:
+        """
+        Lazily yields the daily candles of a ticker, pulling the upstream one window of `window_days` at a time,
+        through `pull_series`.
+
+        Args:
+            ticker (str): The ticker symbol to retrieve data.
+            from_date (str): The starting date in the format 'YYYY-MM-DD'.
+            to_date (str): The ending date in the format 'YYYY-MM-DD'.
+            window_days (int): How many calendar days each upstream call covers.
+
+        Yields:
+            Candle: The candles in chronological order.
+
+        Raises:
+            UpstreamUnavailableError: When FinnHub failed and a window was never pulled.
+        """
+        start = datetime.date.fromisoformat(from_date)
+        end = datetime.date.fromisoformat(to_date)
+        while start <= end:
+            window_end = min(start + datetime.timedelta(days=window_days - 1), end)
+            # Stop right before the next window starts so that no bar falls in between two windows.
+            window_end_unix = self.convert_date_to_unix((window_end + datetime.timedelta(days=1)).isoformat()) - 1
+            response = self.pull_series(ticker, self.convert_date_to_unix(start.isoformat()), window_end_unix)
+            if response.get("s") == "ok":
+                # The cached response is shared, cleaned as a copy.
+                response = self.clean_data(dict(response))
+                for day, open_, high, low, close, volumn in zip(response["time"], response["open"], response["high"], response["low"], response["close"], response["volumn"]):
+                    yield Candle(time=day, open=open_, high=high, low=low, close=close, volumn=volumn)
+            start = window_end + datetime.timedelta(days=1)
+
+    def pull_data_page(self, ticker: str, from_date: str, to_date: str, cursor: str | None = None, page_size: int = 100) -> CursorPaging[Candle]:
+        """
+        Retrieves one page of daily candles, keyed on the date of the last candle of the previous page.
+
+        Only the upstream windows needed for this page are pulled, so a deep page costs the same as the first one.
+
+        Args:
+            ticker (str): The ticker symbol to retrieve data.
+            from_date (str): The starting date in the format 'YYYY-MM-DD'.
+            to_date (str): The ending date in the format 'YYYY-MM-DD'.
+            cursor (str, optional): The `next_cursor` of the previous page.
+            page_size (int): The maximum amount of candles in the page.
+
+        Returns:
+            CursorPaging[Candle]: The page of candles.
+
+        Raises:
+            InvalidCursorError: When the cursor is malformed or does not hold a date.
+            UpstreamUnavailableError: When FinnHub failed and a window of the page was never pulled.
+        """
+        if last_date := decode_cursor(cursor):
+            try:
+                from_date = (datetime.date.fromisoformat(last_date) + datetime.timedelta(days=1)).isoformat()
+            except (TypeError, ValueError) as err:
+                raise InvalidCursorError(f"Cursor {cursor!r} does not point to a date") from err
+
+        # Roughly 252 trading days a year, size the windows so one upstream call usually fills a page.
+        window_days = page_size * 365 // 252 + 7
+        candles = self.iter_candles(ticker, from_date, to_date, window_days=window_days)
+        return CursorPaging.from_iterable(candles, page_size, key=lambda candle: candle.time)
 
     @lru_cache
     def convert_date_to_unix(self, date: str) -> int:
@@ -128,7 +315,20 @@ class FinnHubAPI(BaseFinanceAPI):
         """
         return datetime.datetime.fromtimestamp(unix_date, tz=datetime.timezone.utc).strftime("%Y-%m-%d")
 
-    def clean_data(self, response_dict):
+    @lru_cache(maxsize=65536)
+    def convert_unix_to_datetime(self, unix_date: int) -> str:
+        """
+        Converts a UNIX timestamp to a UTC date time string in the format 'YYYY-MM-DD HH:MM:SS'.
+
+        Args:
+            unix_date (int): The UNIX timestamp to convert.
+
+        Returns:
+            str: The date time string corresponding to the input UNIX timestamp.
+        """
+        return datetime.datetime.fromtimestamp(unix_date, tz=datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+    def clean_data(self, response_dict, resolution: str = "D"):
         response_dict["close"] = response_dict["c"]
         response_dict["high"] = response_dict["h"]
         response_dict["low"] = response_dict["l"]
@@ -146,5 +346,6 @@ class FinnHubAPI(BaseFinanceAPI):
             response_dict["s"],
         )
 
-        response_dict["time"] = [self.convert_unix_to_date(value) for value in response_dict["time"]]
+        convert = self.convert_unix_to_datetime if resolution in bars.INTRADAY else self.convert_unix_to_date
+        response_dict["time"] = [convert(value) for value in response_dict["time"]]
         return response_dict
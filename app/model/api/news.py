@@ -3,11 +3,15 @@ from __future__ import annotations
 from fastapi import FastAPI
 
 from functools import lru_cache
+from typing import Iterator
 
 import logging
 from newspaper import Article
 
 from .base import BaseFinanceAPI
+from helpers.utility import Utility
+from helpers.paging import CursorPaging, CursorPagingInfo, InvalidCursorError, decode_cursor, encode_cursor
+from model.data.news_api import NewsArticle
 
 MODULE_NAME = "Newspaper3k_API"
 logger = logging.getLogger(MODULE_NAME)
@@ -21,11 +25,12 @@ class NewsAPI(BaseFinanceAPI):
     def connect_api(self):
         return
 
+    @Utility.track_upstream("Newspaper")
     def pull_data(self, url):
         self.article = Article(url)
         self.article.download()
         self.article.parse()
-        logger.info(f"Successfully scrapping news: '{self.article.title}'.")
+        logger.info("Successfully scrapping news: %r.", self.article.title, extra={"fields": {"url": url, "title": self.article.title}})
 
     def get_article_data(self):
         if self.article is None:
@@ -34,5 +39,45 @@ class NewsAPI(BaseFinanceAPI):
         article_data = {"title": self.article.title, "authors": self.article.authors, "publish_date": self.article.publish_date, "text": self.article.text}
         return article_data
 
+    def iter_articles(self, urls: list[str]) -> Iterator[NewsArticle]:
+        """Lazily scrape the articles, one URL at a time. Articles that fail to scrape are skipped."""
+        for url in urls:
+            try:
+                self.pull_data(url)
+            except Exception as error:  # pylint: disable=broad-except
+                logger.error("Failed to scrape %s: %s", url, error)
+                continue
+            yield NewsArticle(url=url, **self.get_article_data())
+
+    def pull_data_page(self, urls: list[str], cursor: str | None = None, page_size: int = 10) -> CursorPaging[NewsArticle]:
+        """
+        Scrape one page of articles, keyed on the last URL of the previous page.
+
+        Only the URLs of the requested page are scraped.
+
+        Args:
+            urls (list[str]): The article URLs, in the order they should be paged.
+            cursor (str, optional): The `next_cursor` of the previous page.
+            page_size (int): The maximum amount of articles in the page.
+
+        Returns:
+            CursorPaging[NewsArticle]: The page of articles.
+
+        Raises:
+            InvalidCursorError: When the cursor is malformed or its URL is not in *urls*.
+        """
+        start = 0
+        if last_url := decode_cursor(cursor):
+            try:
+                start = urls.index(last_url) + 1
+            except ValueError as err:
+                raise InvalidCursorError(f"Cursor {cursor!r} does not point to one of the URLs") from err
+
+        page_urls = urls[start : start + page_size]
+        has_more = start + page_size < len(urls)
+        # Key on the last URL of the page rather than the last article, it may have failed to scrape.
+        next_cursor = encode_cursor(page_urls[-1]) if has_more else None
+        return CursorPaging(data=tuple(self.iter_articles(page_urls)), paging=CursorPagingInfo(page_size=page_size, next_cursor=next_cursor, has_more=has_more))
+
     def clean_data(self):
         pass
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager, suppress
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+import aiohttp
+import orjson
+
+from helpers.metrics import METRICS
+
+MODULE_NAME = "Stream_API"
+logger = logging.getLogger(MODULE_NAME)
+
+FINNHUB_WEBSOCKET_URL = "wss://ws.finnhub.io"
+# Longest pause of a replay between two ticks, so market closes do not stall it.
+MAX_REPLAY_GAP = 5.0
+# Seconds to wait before reconnecting a dropped upstream.
+RECONNECT_DELAY = 5.0
+
+# A trade, in the shape of the FinnHub websocket: symbol, price, volume, time in milliseconds.
+Tick = dict
+
+
+class TickSource(ABC):
+    """Upstream of the trades of one ticker."""
+
+    @abstractmethod
+    def ticks(self, ticker: str) -> AsyncIterator[Tick]:
+        pass
+
+
+class FinnHubTickSource(TickSource):
+    """Trades from the FinnHub websocket. For documentation: https://finnhub.io/docs/api/websocket-trades
+
+    Every ticker shares a single connection, opened with the first subscribed ticker and closed with the last one. A
+    ticker is subscribed on the connection when its first reader comes and unsubscribed when its last reader leaves, and
+    they are all subscribed again whenever the connection is reopened.
+    """
+
+    def __init__(self, api_key: str, url: str = FINNHUB_WEBSOCKET_URL):
+        self.api_key = api_key
+        self.url = url
+        self._readers: dict[str, set[asyncio.Queue]] = {}
+        self._websocket: Optional[aiohttp.ClientWebSocketResponse] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def _send(self, kind: str, ticker: str) -> None:
+        if self._websocket is not None and not self._websocket.closed:
+            await self._websocket.send_str(orjson.dumps({"type": kind, "symbol": ticker}).decode())
+
+    async def _connect(self) -> None:
+        """Keep the connection open and dispatch its trades to the readers of their ticker, until cancelled."""
+        while True:
+            try:
+                async with aiohttp.ClientSession() as session:
+                    async with session.ws_connect(self.url, params={"token": self.api_key}, heartbeat=30) as websocket:
+                        self._websocket = websocket
+                        for ticker in list(self._readers):
+                            await self._send("subscribe", ticker)
+                        async for message in websocket:
+                            if message.type != aiohttp.WSMsgType.TEXT:
+                                break
+                            payload = orjson.loads(message.data)
+                            if payload.get("type") == "trade":
+                                for tick in payload["data"]:
+                                    for queue in self._readers.get(tick["s"], ()):
+                                        queue.put_nowait(tick)
+                logger.info("FinnHub websocket closed, reconnecting in %ss", RECONNECT_DELAY)
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:  # pylint: disable=broad-except
+                logger.error("FinnHub websocket failed, reconnecting in %ss: %s", RECONNECT_DELAY, error)
+            finally:
+                self._websocket = None
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def ticks(self, ticker: str) -> AsyncIterator[Tick]:
+        queue: asyncio.Queue = asyncio.Queue()
+        readers = self._readers.setdefault(ticker, set())
+        readers.add(queue)
+        try:
+            if len(readers) == 1:
+                await self._send("subscribe", ticker)
+            if self._task is None:
+                self._task = asyncio.create_task(self._connect(), name="finnhub-websocket")
+            while True:
+                yield await queue.get()
+        finally:
+            readers.discard(queue)
+            if not readers:
+                del self._readers[ticker]
+                if self._readers:
+                    await self._send("unsubscribe", ticker)
+                elif self._task is not None:
+                    self._task.cancel()
+                    self._task = None
+
+
+class ReplayTickSource(TickSource):
+    """Trades replayed from a JSON lines file of FinnHub ticks (`{"s": "AAPL", "p": 189.3, "v": 100, "t": 1700000000000}`).
+
+    The ticks of a ticker are replayed in a loop at `speed` times the recorded pace, their times shifted by the span of
+    the file on every loop so the bars keep moving forward.
+    """
+
+    def __init__(self, path: str | Path, speed: float = 1.0):
+        self.path = Path(path)
+        self.speed = speed
+
+    def _load(self, ticker: str) -> list[Tick]:
+        with self.path.open("rb") as file:
+            ticks = [tick for line in file if line.strip() and (tick := orjson.loads(line))["s"] == ticker]
+        return sorted(ticks, key=lambda tick: tick["t"])
+
+    async def ticks(self, ticker: str) -> AsyncIterator[Tick]:
+        ticks = await asyncio.to_thread(self._load, ticker)
+        if not ticks:
+            logger.warning("No tick of %s in %s", ticker, self.path)
+            return
+
+        span = ticks[-1]["t"] - ticks[0]["t"] + 1000
+        offset = int(time.time() * 1000) - ticks[0]["t"]
+        while True:
+            previous = ticks[0]["t"]
+            for tick in ticks:
+                await asyncio.sleep(min((tick["t"] - previous) / 1000 / self.speed, MAX_REPLAY_GAP))
+                previous = tick["t"]
+                yield tick | {"t": tick["t"] + offset}
+            offset += span
+
+
+class LiveFeed:
+    """Aggregates the trades of one ticker into bars and fans the bar updates out to its subscribers.
+
+    A subscriber first gets the whole current bar, then only the fields that changed since the previous update, always
+    with the `time` of the bar they belong to. Updates are queued JSON encoded, once for all subscribers. A subscriber
+    too slow to keep up loses its oldest updates, never blocking the feed.
+    """
+
+    def __init__(self, ticker: str, source: TickSource, bar_seconds: int = 60, queue_size: int = 256):
+        self.ticker = ticker
+        self.source = source
+        self.bar_seconds = bar_seconds
+        self.queue_size = queue_size
+        self.bar: Optional[dict] = None
+        self.subscribers: set[asyncio.Queue] = set()
+        self.task: Optional[asyncio.Task] = None
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        if self.bar:
+            queue.put_nowait(orjson.dumps(self.bar))
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self.subscribers.discard(queue)
+
+    def update(self, tick: Tick) -> Optional[dict]:
+        """Fold a trade into the current bar, returns the changed fields or None when nothing changed."""
+        price, volume = tick["p"], tick.get("v") or 0
+        bar_time = tick["t"] // 1000 // self.bar_seconds * self.bar_seconds
+        if self.bar is None or bar_time > self.bar["time"]:
+            self.bar = {"time": bar_time, "open": price, "high": price, "low": price, "close": price, "volumn": volume}
+            return dict(self.bar)
+        if bar_time < self.bar["time"]:
+            return None
+
+        bar = self.bar
+        delta = {}
+        if price > bar["high"]:
+            bar["high"] = delta["high"] = price
+        if price < bar["low"]:
+            bar["low"] = delta["low"] = price
+        if price != bar["close"]:
+            bar["close"] = delta["close"] = price
+        if volume:
+            bar["volumn"] = delta["volumn"] = bar["volumn"] + volume
+        if not delta:
+            return None
+        return {"time": bar["time"]} | delta
+
+    def publish(self, delta: dict) -> None:
+        message = orjson.dumps(delta)
+        for queue in self.subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+    async def run(self) -> None:
+        while True:
+            try:
+                async for tick in self.source.ticks(self.ticker):
+                    if (delta := self.update(tick)) is not None:
+                        self.publish(delta)
+                logger.info("Upstream of %s ended", self.ticker)
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:  # pylint: disable=broad-except
+                logger.error("Upstream of %s failed, reconnecting in %ss: %s", self.ticker, RECONNECT_DELAY, error)
+                await asyncio.sleep(RECONNECT_DELAY)
+
+
+class FeedHub:
+    """Keeps one `LiveFeed`, and so one upstream subscription, per ticker while it has subscribers."""
+
+    def __init__(self, source: TickSource, bar_seconds: int = 60):
+        self.source = source
+        self.bar_seconds = bar_seconds
+        self.feeds: dict[str, LiveFeed] = {}
+        self._feeds_gauge = METRICS.gauge("stream_feeds", "Tickers with an upstream subscription.")
+        self._subscribers_gauge = METRICS.gauge("stream_subscribers", "Clients subscribed to a live feed.")
+
+    @asynccontextmanager
+    async def subscribe(self, ticker: str) -> AsyncIterator[asyncio.Queue]:
+        """Subscribe to the bar updates of a ticker while inside the block."""
+        if (feed := self.feeds.get(ticker)) is None:
+            feed = self.feeds[ticker] = LiveFeed(ticker, self.source, self.bar_seconds)
+            feed.task = asyncio.create_task(feed.run(), name=f"feed-{ticker}")
+            self._feeds_gauge.inc()
+            logger.info("Subscribed upstream to %s", ticker)
+
+        queue = feed.subscribe()
+        self._subscribers_gauge.inc()
+        try:
+            yield queue
+        finally:
+            feed.unsubscribe(queue)
+            self._subscribers_gauge.dec()
+            if not feed.subscribers and self.feeds.get(ticker) is feed:
+                del self.feeds[ticker]
+                self._feeds_gauge.dec()
+                feed.task.cancel()  # type: ignore
+                with suppress(asyncio.CancelledError):
+                    await feed.task  # type: ignore
+                logger.info("Unsubscribed upstream from %s", ticker)
@@ -3,15 +3,33 @@ from __future__ import annotations
 
 import datetime
 import logging
+import re
 from functools import lru_cache
 
 import yfinance as yf
 
+from . import bars
 from .base import BaseFinanceAPI
+from helpers.resilience import Upstream
+from helpers.utility import Utility
+from model.indicators import INDICATOR_CACHE, series_key
 
 MODULE_NAME = "YahooFinance_API"
 logger = logging.getLogger(MODULE_NAME)
 
+# Yahoo name of each resolution.
+YAHOO_INTERVALS = {"1m": "1m", "5m": "5m", "15m": "15m", "60m": "60m", "D": "1d", "W": "1wk"}
+# Yahoo only serves intraday bars this many days back.
+YAHOO_INTRADAY_DAYS = {"1m": 7, "5m": 60, "15m": 60, "60m": 730}
+REGEX_PERIOD = re.compile(r"(\d+)(d|wk|mo|y)")
+PERIOD_DAYS = {"d": 1, "wk": 7, "mo": 30, "y": 365}
+# Periods are relative to now, cached histories are only fresh for this many seconds.
+SERIES_TTL = 60
+# yfinance raises a bare Exception for any failed history, with one of these when Yahoo gave no usable answer, and with
+# the error Yahoo answered otherwise, e.g. an unknown symbol.
+YAHOO_NO_ANSWER = ("No price data found", "No timezone found")
+YAHOO_UPSTREAM = Upstream("Yahoo")
+
 
 class YahooFinanceAPI(BaseFinanceAPI):
     def __init__(self, api_name: str = "Yahoo Finance API", api_key: str | None = None):
@@ -23,15 +41,74 @@ class YahooFinanceAPI(BaseFinanceAPI):
     def connect_api(self):
         return
 
-    def pull_data(self, ticker: str, period: str = "30d"):
-        info = yf.Ticker(ticker)
-        history_data = info.history(period=period)
-        clean_data = self.clean_data(history_data).to_dict("list")
-        logger.info(f"Successfully pulling {ticker} from {datetime.datetime.now().date()} to {period} before")
+    @Utility.track_upstream("Yahoo")
+    def pull_data_sync(self, ticker: str, period: str = "30d", resolution: str = "D"):
+        """
+        History of *ticker*, closes not adjusted for dividends like those of FinnHub.
+
+        Raises:
+            ConnectionError: When Yahoo is down or gave no usable answer.
+            LookupError: When Yahoo has no bars of the ticker over the period.
+        """
+        try:
+            # By default yfinance logs its errors and returns an empty frame, which would be cached as a good history.
+            history = yf.Ticker(ticker).history(period=period, interval=YAHOO_INTERVALS[resolution], auto_adjust=False, raise_errors=True)
+        except RuntimeError as error:
+            raise ConnectionError(str(error)) from error
+        except Exception as error:  # pylint: disable=broad-except
+            if any(reason in str(error) for reason in YAHOO_NO_ANSWER):
+                raise ConnectionError(str(error)) from error
+            raise LookupError(str(error)) from error
+        if history.empty:
+            raise LookupError(f"Yahoo has no {resolution} bars of {ticker} over {period}")
+        return history
+
+    def pull_series(self, ticker: str, period: str, resolution: str):
+        """Same as `pull_data_sync`, through `YAHOO_UPSTREAM`: cached, served stale while Yahoo is slow or down.
+
+        The frame is shared between callers and must not be modified.
+
+        Raises:
+            LookupError: When Yahoo has no bars of the ticker over the period.
+            UpstreamUnavailableError: When Yahoo failed and the history was never pulled.
+        """
+        return YAHOO_UPSTREAM.call((ticker, period, resolution), self.pull_data_sync, ticker, period, resolution, ttl=SERIES_TTL)
+
+    @staticmethod
+    def base_resolution(period: str, resolution: str) -> str:
+        """The finest resolution Yahoo serves over *period* that *resolution* can be derived from."""
+        base = bars.base_resolution(resolution)
+        if base == resolution or resolution not in bars.INTRADAY:
+            return base
+
+        match = REGEX_PERIOD.fullmatch(period)
+        days = int(match.group(1)) * PERIOD_DAYS[match.group(2)] if match else None
+        for candidate in bars.INTRADAY[: bars.INTRADAY.index(resolution)]:
+            if days is not None and days <= YAHOO_INTRADAY_DAYS[candidate]:
+                return candidate
+        return resolution
+
+    def pull_data(self, ticker: str, period: str = "30d", resolution: str = "D"):
+        base = self.base_resolution(period, resolution)
+        history_data = self.pull_series(ticker, period, base)
+        if base != resolution:
+            history_data = bars.resample_frame(history_data, resolution)
+        clean_data = self.clean_data(history_data, resolution).to_dict("list")
+        logger.info("Successfully pulling %s from %s to %s before", ticker, datetime.date.today(), period, extra={"fields": {"ticker": ticker, "period": period, "resolution": resolution}})
         return clean_data
 
-    def clean_data(self, response_data):
-        response_data = response_data.reset_index()
-        response_data["Date"] = response_data["Date"].dt.date
+    def compute_indicators(self, ticker: str, resolution: str, response: dict, names: tuple[str, ...]) -> dict[str, list]:
+        """Technical indicators over the output of `pull_data`, cached per series, see `FinnHubAPI.compute_indicators`."""
+        series = {"time": response["Date"], "open": response["Open"], "high": response["High"], "low": response["Low"], "close": response["Close"], "volumn": response["Volume"]}
+        key = series_key(self.api_name, ticker, resolution, series["time"])
+        return INDICATOR_CACHE.get(key, series, names)
+
+    def clean_data(self, response_data, resolution: str = "D"):
+        # Intraday histories are indexed by `Datetime` instead of `Date`.
+        response_data = response_data.reset_index().rename(columns={"Datetime": "Date"})
+        if resolution in bars.INTRADAY:
+            response_data["Date"] = response_data["Date"].dt.strftime("%Y-%m-%d %H:%M:%S")
+        else:
+            response_data["Date"] = response_data["Date"].dt.date
 
         return response_data
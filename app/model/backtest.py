@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""Vectorized backtests of long-only strategies over candle closes, and parameter sweeps spread over a process pool.
+
+A strategy turns the closes of a ticker into the position held after each bar (0 or 1) with array operations only. The
+position decided at the close of a bar earns the return of the next bar, minus `fee` per unit of position traded.
+
+Sweeps put the closes of every ticker in one shared memory block, so each worker process reads them without a copy, and
+send one task per ticker and batch of consecutive configurations: a sweep of a single ticker still keeps every process
+busy, and the indicators shared by the configurations of a batch are computed once.
+"""
+from __future__ import annotations
+
+import atexit
+import inspect
+import itertools
+import logging
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+from model.api.bars import BAR_SECONDS, Resolution
+from model.indicators import bollinger, ema, rsi, sma
+
+MODULE_NAME = "Backtest"
+logger = logging.getLogger(MODULE_NAME)
+
+# Most backtests, tickers times configurations, a single sweep may run.
+MAX_BACKTESTS = int(os.environ.get("BACKTEST_MAX_RUNS", 1_000_000))
+# Tasks a sweep is split into per process, enough to even out the slow ones.
+TASKS_PER_PROCESS = 4
+# Parameters of the strategies counted in bars.
+WINDOW_PARAMETERS = ("fast", "slow", "period", "lookback")
+
+# Bars in a year of trading, 252 sessions of 6.5 hours, to annualize the returns.
+BARS_PER_YEAR = {resolution: 52 if resolution == Resolution.WEEK else 252 if resolution == Resolution.DAY else int(252 * 6.5 * 3600 // seconds) for resolution, seconds in BAR_SECONDS.items()}
+
+
+def hold(enter: np.ndarray, exit_: np.ndarray) -> np.ndarray:
+    """Position 1 from every *enter* bar until the next *exit_* bar, exiting wins when both happen on the same bar."""
+    state = np.full(len(enter), np.nan)
+    state[enter] = 1.0
+    state[exit_] = 0.0
+    # Forward fill the last decision, before the first one there is no position.
+    last = np.where(np.isnan(state), 0, np.arange(len(state)))
+    np.maximum.accumulate(last, out=last)
+    position = state[last]
+    position[np.isnan(position)] = 0.0
+    return position
+
+
+def _cached(memo: dict, key: tuple, function: Callable[[], Any]) -> Any:
+    if key not in memo:
+        memo[key] = function()
+    return memo[key]
+
+
+def sma_cross(close: np.ndarray, memo: dict, fast: int = 10, slow: int = 50) -> np.ndarray:
+    """Long while the fast SMA is above the slow one."""
+    with np.errstate(invalid="ignore"):
+        return (_cached(memo, ("sma", fast), lambda: sma(close, fast)) > _cached(memo, ("sma", slow), lambda: sma(close, slow))).astype(float)
+
+
+def ema_cross(close: np.ndarray, memo: dict, fast: int = 12, slow: int = 26) -> np.ndarray:
+    """Long while the fast EMA is above the slow one."""
+    with np.errstate(invalid="ignore"):
+        return (_cached(memo, ("ema", fast), lambda: ema(close, fast)) > _cached(memo, ("ema", slow), lambda: ema(close, slow))).astype(float)
+
+
+def rsi_reversion(close: np.ndarray, memo: dict, period: int = 14, lower: float = 30, upper: float = 70) -> np.ndarray:
+    """Enter when the RSI falls below *lower*, exit when it rises above *upper*."""
+    values = _cached(memo, ("rsi", period), lambda: rsi(close, period))
+    with np.errstate(invalid="ignore"):
+        return hold(values < lower, values > upper)
+
+
+def bollinger_reversion(close: np.ndarray, memo: dict, period: int = 20, width: float = 2.0) -> np.ndarray:
+    """Enter when the close falls below the lower band, exit when it gets back above the middle band."""
+    bands = _cached(memo, ("bbands", period, width), lambda: bollinger(close, period, width))
+    with np.errstate(invalid="ignore"):
+        return hold(close < bands["lower"], close > bands["middle"])
+
+
+def momentum(close: np.ndarray, memo: dict, lookback: int = 20) -> np.ndarray:
+    """Long while the close is above the close *lookback* bars earlier."""
+    position = np.zeros(len(close))
+    position[lookback:] = close[lookback:] > close[:-lookback]
+    return position
+
+
+# Name: (strategy, parameter names, constraint on a configuration).
+STRATEGIES: dict[str, tuple[Callable[..., np.ndarray], tuple[str, ...], Callable[..., bool]]] = {
+    "sma_cross": (sma_cross, ("fast", "slow"), lambda fast, slow: fast < slow),
+    "ema_cross": (ema_cross, ("fast", "slow"), lambda fast, slow: fast < slow),
+    "rsi_reversion": (rsi_reversion, ("period", "lower", "upper"), lambda period, lower, upper: lower < upper),
+    "bollinger_reversion": (bollinger_reversion, ("period", "width"), lambda period, width: period > 1),
+    "momentum": (momentum, ("lookback",), lambda lookback: lookback > 0),
+}
+
+
+def evaluate(close: np.ndarray, position: np.ndarray, fee: float = 0.0005, bars_per_year: int = 252) -> dict[str, float]:
+    """Performance of holding *position* after each bar.
+
+    Returns:
+        dict[str, float]: total_return, cagr, sharpe, max_drawdown, trades (position changes) and exposure (share of bars
+        in the market).
+    """
+    if len(close) < 2:
+        return {"total_return": 0.0, "cagr": 0.0, "sharpe": 0.0, "max_drawdown": 0.0, "trades": 0, "exposure": 0.0}
+
+    changes = np.abs(np.diff(np.r_[0.0, position]))
+    returns = position[:-1] * (close[1:] / close[:-1] - 1.0) - fee * changes[:-1]
+    equity = np.cumprod(1.0 + returns)
+    years = len(returns) / bars_per_year
+    deviation = returns.std()
+    return {
+        "total_return": float(equity[-1] - 1.0),
+        "cagr": float(equity[-1] ** (1.0 / years) - 1.0) if equity[-1] > 0 else -1.0,
+        "sharpe": float(returns.mean() / deviation * np.sqrt(bars_per_year)) if deviation > 0 else 0.0,
+        "max_drawdown": float((1.0 - equity / np.maximum.accumulate(equity)).max()),
+        "trades": int(changes.sum()),
+        "exposure": float(position.mean()),
+    }
+
+
+def configurations(strategy: str, grid: dict[str, list]) -> list[dict[str, Any]]:
+    """Every valid combination of the *grid* values, parameters left out of the grid take their default.
+
+    Raises:
+        ValueError: On an unknown strategy or parameter, or a window that is not a positive whole number of bars.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy {strategy!r}, expected one of {', '.join(STRATEGIES)}")
+    function, parameters, valid = STRATEGIES[strategy]
+    if unknown := set(grid) - set(parameters):
+        raise ValueError(f"Unknown parameters {', '.join(sorted(unknown))} of {strategy}, expected {', '.join(parameters)}")
+    for name in (name for name in grid if name in WINDOW_PARAMETERS):
+        for value in grid[name]:
+            if type(value) is not int or value < 1:
+                raise ValueError(f"{name} of {strategy} must be a positive whole number of bars, got {value!r}")
+
+    signature = inspect.signature(function).parameters
+    defaults = {name: signature[name].default for name in parameters}
+    names = list(grid)
+    result = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        config = defaults | dict(zip(names, values))
+        if valid(*(config[name] for name in parameters)):
+            result.append(config)
+    return result
+
+
+def run_ticker(ticker: str, close: np.ndarray, strategy: str, configs: list[dict[str, Any]], fee: float, bars_per_year: int) -> list[dict[str, Any]]:
+    """Backtest every configuration of a strategy over the closes of one ticker."""
+    function = STRATEGIES[strategy][0]
+    memo: dict = {}
+    return [{"ticker": ticker, "params": config} | evaluate(close, function(close, memo, **config), fee, bars_per_year) for config in configs]
+
+
+# Shared memory blocks attached by this worker process, by name.
+_attached: dict[str, tuple[shared_memory.SharedMemory, np.ndarray]] = {}
+
+
+def _run_shared(name: str, size: int, ticker: str, start: int, end: int, strategy: str, configs: list[dict[str, Any]], fee: float, bars_per_year: int) -> list[dict[str, Any]]:
+    """`run_ticker` in a worker process, over the closes found at [start, end) of the shared memory block *name*."""
+    if name not in _attached:
+        for block, _ in _attached.values():
+            block.close()
+        _attached.clear()
+        # Spawned workers share the resource tracker of the parent, which unlinks the block once the sweep is over.
+        block = shared_memory.SharedMemory(name=name)
+        _attached[name] = (block, np.ndarray((size,), dtype=np.float64, buffer=block.buf))
+    return run_ticker(ticker, _attached[name][1][start:end], strategy, configs, fee, bars_per_year)
+
+
+class BacktestEngine:
+    """Runs parameter sweeps over a lazily started process pool."""
+
+    def __init__(self, processes: Optional[int] = None):
+        self.processes = processes or os.cpu_count() or 1
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # Spawned workers do not inherit the threads and locks of the server.
+                self._executor = ProcessPoolExecutor(max_workers=self.processes, mp_context=multiprocessing.get_context("spawn"))
+                atexit.register(self.shutdown)
+                logger.info("Started %s backtest processes", self.processes)
+            return self._executor
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+
+    def sweep(
+        self,
+        series: dict[str, np.ndarray | list[float]],
+        strategy: str,
+        grid: dict[str, list],
+        fee: float = 0.0005,
+        bars_per_year: int = 252,
+        top: Optional[int] = None,
+        sort_by: str = "sharpe",
+    ) -> list[dict[str, Any]]:
+        """
+        Backtest every configuration of the *grid* over every ticker.
+
+        Args:
+            series (dict[str, array]): Closes by ticker, oldest first.
+            strategy (str): A name of `STRATEGIES`.
+            grid (dict[str, list]): Values to try for each parameter of the strategy.
+            fee (float): Cost of trading one unit of position, as a fraction of the price.
+            bars_per_year (int): To annualize the returns, 252 for daily bars.
+            top (int, optional): Only keep the best results.
+            sort_by (str): Statistic to rank the results by, descending.
+
+        Returns:
+            list[dict]: One result per ticker and configuration, best first.
+
+        Raises:
+            ValueError: On an unknown strategy or parameter, or more than `MAX_BACKTESTS` backtests.
+        """
+        configs = configurations(strategy, grid)
+        if not configs or not series:
+            return []
+        if len(configs) * len(series) > MAX_BACKTESTS:
+            raise ValueError(f"{len(configs)} configurations over {len(series)} tickers is more than {MAX_BACKTESTS} backtests")
+
+        tickers = list(series)
+        lengths = [len(series[ticker]) for ticker in tickers]
+        bounds = np.r_[0, np.cumsum(lengths)]
+        # Few tickers are split into batches of configurations, so that every process gets some work.
+        size = math.ceil(len(configs) / min(len(configs), math.ceil(self.processes * TASKS_PER_PROCESS / len(tickers))))
+        batches = [configs[start : start + size] for start in range(0, len(configs), size)]
+        if self.processes <= 1 or len(tickers) * len(batches) == 1:
+            results = [row for ticker in tickers for row in run_ticker(ticker, np.asarray(series[ticker], dtype=np.float64), strategy, configs, fee, bars_per_year)]
+        else:
+            block = shared_memory.SharedMemory(create=True, size=max(1, int(bounds[-1]) * 8))
+            try:
+                closes = np.ndarray((int(bounds[-1]),), dtype=np.float64, buffer=block.buf)
+                for index, ticker in enumerate(tickers):
+                    closes[bounds[index] : bounds[index + 1]] = series[ticker]
+                futures = [self.executor.submit(_run_shared, block.name, len(closes), ticker, int(bounds[index]), int(bounds[index + 1]), strategy, batch, fee, bars_per_year) for index, ticker in enumerate(tickers) for batch in batches]
+                results = [row for future in futures for row in future.result()]
+                del closes
+            finally:
+                block.close()
+                block.unlink()
+
+        results.sort(key=lambda row: row[sort_by], reverse=sort_by != "max_drawdown")
+        logger.info("Swept %s configurations of %s over %s tickers", len(configs), strategy, len(tickers), extra={"fields": {"strategy": strategy, "configurations": len(configs), "tickers": len(tickers)}})
+        return results[:top] if top else results
+
+
+BACKTEST_ENGINE = BacktestEngine(processes=int(os.environ.get("BACKTEST_PROCESSES", 0)) or None)
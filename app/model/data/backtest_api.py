@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+from typing import Literal, Optional
+
+from model.api.bars import Resolution
+from pydantic import BaseModel, Field, StrictInt
+
+
+class BacktestInput(BaseModel):
+    tickers: list[str] = Field(..., min_items=1, description="Tickers to backtest")
+    source: Literal["finnhub", "yahoo"] = Field("finnhub", description="Provider of the candles")
+    from_date: Optional[str] = Field(None, description="Start date of the FinnHub candles, YYYY-MM-DD")
+    end_date: Optional[str] = Field(None, description="End date of the FinnHub candles, YYYY-MM-DD")
+    period: str = Field("1y", description="How far back the Yahoo candles go, e.g. 1mo, 1y, max")
+    resolution: Resolution = Resolution.DAY
+    strategy: str = Field(..., description="sma_cross, ema_cross, rsi_reversion, bollinger_reversion or momentum")
+    grid: dict[str, list[StrictInt | float]] = Field(default_factory=dict, description='Values to try for each parameter, e.g. {"fast": [5, 10], "slow": [50, 100]}')
+    fee: float = Field(0.0005, ge=0, description="Cost of a trade as a fraction of the price")
+    top: Optional[int] = Field(50, ge=1, description="Only return the best results")
+    sort_by: Literal["total_return", "cagr", "sharpe", "max_drawdown"] = "sharpe"
+
+
+class BacktestResult(BaseModel):
+    ticker: str
+    params: dict[str, StrictInt | float]
+    total_return: float
+    cagr: float
+    sharpe: float
+    max_drawdown: float
+    trades: int
+    exposure: float
+
+
+class BacktestOutput(BaseModel):
+    configurations: int
+    tickers: list[str]
+    missing: list[str]
+    results: list[BacktestResult]
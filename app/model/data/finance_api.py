@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 import datetime
 
+from helpers.paging import Base
 from pydantic import BaseModel
 
 
@@ -11,3 +12,22 @@ class FinanceAPIOutput(BaseModel):
     low: list[int | float]
     volumn: list[int | float]
     date: list[datetime.date] | list[str]
+    indicators: dict[str, list[float | None]] | None = None
+
+
+class Candle(Base):
+    """A single daily bar, the record type of the cursor paged endpoints."""
+
+    __slots__ = ()
+
+    time: str
+    open: float
+    high: float
+    low: float
+    close: float
+    volumn: float
+
+
+class HedgedCandlesOutput(FinanceAPIOutput):
+    provider: str
+    hedged: bool
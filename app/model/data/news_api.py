@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
+import datetime
 
+from helpers.paging import Base
 from pydantic import BaseModel
 
 
@@ -8,3 +10,37 @@ class NewsArticleOutput(BaseModel):
     authors: list[str]
     # publish_date: Union[datetime.date, str]
     text: str
+
+
+class NewsArticle(Base):
+    """A scraped article, the record type of the cursor paged endpoints."""
+
+    __slots__ = ()
+
+    url: str
+    title: str
+    authors: list
+    publish_date: datetime.datetime | None = None
+    text: str
+
+
+class NewsSearchResult(BaseModel):
+    id: int
+    score: float
+    url: str
+    title: str
+    authors: list[str]
+    publish_date: datetime.datetime | None = None
+    tickers: list[str]
+
+
+class NewsSearchOutput(BaseModel):
+    total: int
+    results: list[NewsSearchResult]
+
+
+class NewsSentimentOutput(BaseModel):
+    ticker: str
+    date: list[str]
+    sentiment: list[float | None]
+    articles: list[int]
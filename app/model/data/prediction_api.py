@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+import datetime
+
+from pydantic import BaseModel
+
+
+class PredictionOutput(BaseModel):
+    ticker: str
+    date: datetime.date | str
+    close: float
+    predicted_return: float
+    predicted_close: float
+    model: str
@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+from pydantic import BaseModel, StrictStr
+
+
+class ScreenerOutput(BaseModel):
+    date: str
+    universe: int
+    matches: list[dict[str, StrictStr | float | None]]
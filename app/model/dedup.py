@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""Near-duplicate detection of news articles with MinHash signatures and an LSH banding index.
+
+The signature of a text is, for each of `PERMUTATIONS` hash functions, the smallest hash of its word `SHINGLE`-grams.
+Two signatures agree on a position with probability the Jaccard similarity of the shingle sets. The index splits the
+signatures in `BANDS` bands and buckets every band, so only the articles sharing a whole band with a new one are compared,
+whatever the size of the index. A candidate is a duplicate when its signatures agree on at least `threshold` of the
+positions.
+
+Layout of the index folder:
+    signatures.bin  uint32, one signature per canonical article
+    keys.jsonl      the URL of each signature
+    aliases.jsonl   {"url": duplicate URL, "canonical": URL of the article it duplicates}
+"""
+from __future__ import annotations
+
+import logging
+import os
+import re
+import threading
+import zlib
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import orjson
+
+from helpers.metrics import METRICS
+
+MODULE_NAME = "Dedup"
+logger = logging.getLogger(MODULE_NAME)
+
+PERMUTATIONS = 128
+BANDS = 32
+SHINGLE = 5
+SEED = 20240501
+REGEX_WORD = re.compile(r"\w+")
+
+# Multiply-shift hash functions: the high 32 bits of a * x + b with odd a, modulo 2 ** 64.
+_random = np.random.default_rng(SEED)
+_MULTIPLIERS = _random.integers(1, 2**63, PERMUTATIONS, dtype=np.uint64) | np.uint64(1)
+_INCREMENTS = _random.integers(0, 2**63, PERMUTATIONS, dtype=np.uint64)
+
+
+def shingles(text: str) -> np.ndarray:
+    """CRC32 of every word *SHINGLE*-gram of the lowercase text, or of the whole text when it is shorter."""
+    words = REGEX_WORD.findall(text.lower())
+    if len(words) < SHINGLE:
+        grams = [" ".join(words)] if words else []
+    else:
+        grams = [" ".join(words[index : index + SHINGLE]) for index in range(len(words) - SHINGLE + 1)]
+    return np.unique(np.fromiter((zlib.crc32(gram.encode()) for gram in grams), dtype=np.uint64, count=len(grams)))
+
+
+def signature(text: str) -> Optional[np.ndarray]:
+    """MinHash signature of a text, None for a text without a word."""
+    hashes = shingles(text)
+    if not len(hashes):
+        return None
+    with np.errstate(over="ignore"):
+        permuted = (_MULTIPLIERS[:, None] * hashes[None, :] + _INCREMENTS[:, None]) >> np.uint64(32)
+    return permuted.min(axis=1).astype(np.uint32)
+
+
+class DuplicateIndex:
+    """Maps the URLs of articles to the first article of their near-duplicate group."""
+
+    def __init__(self, folder: str | Path, threshold: float = 0.8, bands: int = BANDS):
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = PERMUTATIONS // bands
+        self._lock = threading.Lock()
+        self._buckets: list[dict[bytes, list[int]]] = [{} for _ in range(bands)]
+        self._keys: list[str] = []
+        self._canonical: dict[str, str] = {}
+        self._duplicates = METRICS.counter("news_duplicates", "Scraped articles collapsed into an earlier near-duplicate.")
+
+        signatures = np.fromfile(self.folder / "signatures.bin", dtype=np.uint32) if (self.folder / "signatures.bin").exists() else np.empty(0, np.uint32)
+        keys = [orjson.loads(line) for line in (self.folder / "keys.jsonl").read_bytes().splitlines()] if (self.folder / "keys.jsonl").exists() else []
+        # A signature written without its key, or the other way round, by an interrupted append is dropped.
+        count = min(len(signatures) // PERMUTATIONS, len(keys))
+        if len(signatures) > count * PERMUTATIONS:
+            with (self.folder / "signatures.bin").open("ab") as file:
+                file.truncate(count * PERMUTATIONS * 4)
+        if count < len(keys):
+            # Written aside then renamed, a crash now leaves the keys as they were, never half of them.
+            temporary = self.folder / "keys.jsonl.tmp"
+            temporary.write_bytes(b"".join(orjson.dumps(key) + b"\n" for key in keys[:count]))
+            os.replace(temporary, self.folder / "keys.jsonl")
+        self._signatures = signatures[: count * PERMUTATIONS].reshape(count, PERMUTATIONS).copy()
+        for row, key in enumerate(keys[:count]):
+            self._insert(row, key, self._signatures[row])
+        if (self.folder / "aliases.jsonl").exists():
+            for line in (self.folder / "aliases.jsonl").read_bytes().splitlines():
+                alias = orjson.loads(line)
+                self._canonical[alias["url"]] = alias["canonical"]
+        logger.info("Opened the duplicate index of %s articles, %s aliases", count, len(self._canonical) - count)
+
+    def _band_keys(self, values: np.ndarray) -> list[bytes]:
+        return [values[band * self.rows : (band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def _insert(self, row: int, key: str, values: np.ndarray) -> None:
+        self._keys.append(key)
+        self._canonical[key] = key
+        for buckets, band_key in zip(self._buckets, self._band_keys(values)):
+            buckets.setdefault(band_key, []).append(row)
+
+    def resolve(self, url: str) -> Optional[str]:
+        """The canonical URL of an already seen URL, itself when it is canonical."""
+        return self._canonical.get(url)
+
+    def find(self, values: np.ndarray) -> Optional[tuple[str, float]]:
+        """The most similar indexed article above the threshold, and its estimated Jaccard similarity."""
+        candidates = {row for buckets, band_key in zip(self._buckets, self._band_keys(values)) for row in buckets.get(band_key, ())}
+        if not candidates:
+            return None
+        rows = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        similarity = (self._signatures[rows] == values).mean(axis=1)
+        best = int(np.argmax(similarity))
+        return (self._keys[rows[best]], float(similarity[best])) if similarity[best] >= self.threshold else None
+
+    def check(self, url: str, text: str) -> tuple[Optional[str], Optional[np.ndarray]]:
+        """
+        The URL of the article an article duplicates, recorded as its alias, or the signature of a new article, to
+        `register` once the article is stored.
+
+        A URL seen before returns its canonical URL, itself when it is the canonical one, without reading *text*.
+
+        Returns:
+            tuple[str | None, np.ndarray | None]: The canonical URL or None, and the signature of a new article, None as
+            well for a text without a word.
+        """
+        with self._lock:
+            if (known := self._canonical.get(url)) is not None:
+                return known, None
+            if (values := signature(text)) is None:
+                return None, None
+
+            if (match := self.find(values)) is not None:
+                self._canonical[url] = match[0]
+                with (self.folder / "aliases.jsonl").open("ab") as file:
+                    file.write(orjson.dumps({"url": url, "canonical": match[0]}) + b"\n")
+                self._duplicates.inc()
+                logger.info("%s duplicates %s (%.2f)", url, match[0], match[1], extra={"fields": {"url": url, "canonical": match[0], "similarity": match[1]}})
+                return match[0], None
+            return None, values
+
+    def register(self, url: str, values: np.ndarray) -> None:
+        """Index a new article by the signature `check` returned, once the article is stored, so that no URL resolves to
+        an article that failed to be stored."""
+        with self._lock:
+            if url in self._canonical:
+                return
+            with (self.folder / "signatures.bin").open("ab") as file:
+                file.write(values.tobytes())
+            with (self.folder / "keys.jsonl").open("ab") as file:
+                file.write(orjson.dumps(url) + b"\n")
+            row = len(self._keys)
+            if row == len(self._signatures):
+                # Grown by doubling, so appending stays amortized constant time.
+                self._signatures = np.resize(self._signatures, (max(2 * row, 64), PERMUTATIONS))
+            self._signatures[row] = values
+            self._insert(row, url, values)
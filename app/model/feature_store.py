@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+"""Offline feature store materialized from the raw candles of the data lake.
+
+Every ticker has a folder of column files, raw little-endian arrays appended to in place, and a `manifest.json` holding
+their dtype, the number of committed rows and the lake objects already read. Readers map the committed rows with
+`np.memmap`, so training jobs and the API read the very same values without parsing anything.
+
+A row holds the features of one daily bar and `available_at`, the time its bar reached the lake. Rows are only ever
+appended, with `available_at` never decreasing, so the rows known at any past time are a prefix of the files: a point in
+time read is one binary search.
+
+Materializing only reads the lake objects not seen yet and computes the features of the dates after the last stored one,
+from the `LOOKBACK` last stored bars, so the result is the same as computing everything again.
+
+Run from the `app` folder:
+    python -m model.feature_store --tickers AAPL TSLA
+"""
+from __future__ import annotations
+
+import argparse
+import datetime
+import json
+import logging
+import os
+import re
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional
+
+import numpy as np
+import orjson
+from numpy.lib.stride_tricks import sliding_window_view
+
+from aws import bucket
+from model.indicators import sma
+
+MODULE_NAME = "Feature_Store"
+logger = logging.getLogger(MODULE_NAME)
+
+# Raw candles saved by `Utility.create_tmp_file`: {ticker}-{from date}-{to date}-{saved date}, `pull_data` JSON.
+REGEX_CANDLES_OBJECT = re.compile(r"(?P<ticker>.+)-\d{4}-\d{2}-\d{2}-\d{4}-\d{2}-\d{2}-\d{4}-\d{2}-\d{2}(?:\.json)?")
+TRADING_DAYS = 252
+DAY_SECONDS = 24 * 60 * 60
+
+
+def _shift(values: np.ndarray, bars: int) -> np.ndarray:
+    out = np.full(len(values), np.nan)
+    out[bars:] = values[:-bars]
+    return out
+
+
+def _rolling_std(values: np.ndarray, period: int) -> np.ndarray:
+    out = np.full(len(values), np.nan)
+    if len(values) >= period:
+        out[period - 1 :] = sliding_window_view(values, period).std(axis=1, ddof=1)
+    return out
+
+
+def log_return(close: np.ndarray, volume: np.ndarray, bars: int) -> np.ndarray:
+    """Log return over *bars* bars."""
+    return np.log(close / _shift(close, bars))
+
+
+def volatility(close: np.ndarray, volume: np.ndarray, period: int) -> np.ndarray:
+    """Annualized standard deviation of the daily log returns of the last *period* bars."""
+    return _rolling_std(log_return(close, volume, 1), period) * np.sqrt(TRADING_DAYS)
+
+
+def close_to_sma(close: np.ndarray, volume: np.ndarray, period: int) -> np.ndarray:
+    """Distance of the close to its SMA, as a fraction of the SMA."""
+    return close / sma(close, period) - 1.0
+
+
+def volume_zscore(close: np.ndarray, volume: np.ndarray, period: int) -> np.ndarray:
+    """Z-score of the log volume against the last *period* bars."""
+    logs = np.log(np.maximum(volume, 1.0))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (logs - sma(logs, period)) / _rolling_std(logs, period)
+
+
+# Column: (function of the close, the volume and the parameter, parameter, bars of history it needs).
+FEATURES: dict[str, tuple[Callable[[np.ndarray, np.ndarray, int], np.ndarray], int, int]] = {
+    "log_return_1": (log_return, 1, 2),
+    "log_return_5": (log_return, 5, 6),
+    "log_return_20": (log_return, 20, 21),
+    "volatility_20": (volatility, 20, 21),
+    "volatility_60": (volatility, 60, 61),
+    "close_sma_20": (close_to_sma, 20, 20),
+    "close_sma_50": (close_to_sma, 50, 50),
+    "volume_zscore_20": (volume_zscore, 20, 20),
+}
+# Bars of history needed to compute the features of a new bar.
+LOOKBACK = max(bars for _, _, bars in FEATURES.values())
+
+# Column: dtype, the bars themselves are kept at full precision to compute the features of the next ones.
+COLUMN_TYPES = {"time": "<i8", "available_at": "<i8", "close": "<f8", "volume": "<f8"} | {name: "<f4" for name in FEATURES}
+
+
+def compute_features(close: np.ndarray, volume: np.ndarray) -> dict[str, np.ndarray]:
+    """Every feature column of a series of daily bars, NaN while a feature lacks history."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return {name: function(close, volume, parameter) for name, (function, parameter, _) in FEATURES.items()}
+
+
+@dataclass
+class Manifest:
+    rows: int
+    columns: dict[str, str]
+    # Lake object name to the ETag it had when it was read.
+    sources: dict[str, str]
+
+    @classmethod
+    def load(cls, path: Path) -> Manifest:
+        if not path.exists():
+            return cls(rows=0, columns=dict(COLUMN_TYPES), sources={})
+        return cls(**orjson.loads(path.read_bytes()))
+
+    def save(self, path: Path) -> None:
+        # Written aside then renamed, readers see the previous manifest or this one, never half of it.
+        temporary = path.with_suffix(".tmp")
+        temporary.write_bytes(orjson.dumps(self.__dict__))
+        os.replace(temporary, path)
+
+
+def day_start(date: str | datetime.date) -> int:
+    """UNIX time of the start of the day of a `YYYY-MM-DD` date, the `time` of its row."""
+    return int(datetime.datetime.fromisoformat(str(date)[:10]).replace(tzinfo=datetime.timezone.utc).timestamp())
+
+
+def parse_candles(content: bytes) -> dict[int, tuple[float, float]]:
+    """Daily bars of a raw candles object as {UNIX day start: (close, volume)}."""
+    response = orjson.loads(content)
+    days = (day_start(date) for date in response["time"])
+    return {day: (float(close), float(volume)) for day, close, volume in zip(days, response["close"], response["volumn"])}
+
+
+class FeatureStore:
+    """Materializes and reads the feature columns of each ticker under *root*."""
+
+    def __init__(
+        self,
+        root: str | Path,
+        list_objects: Callable[[str], Iterable[dict]] = bucket.list_objects,
+        read_object: Callable[[str], bytes] = bucket.read_object,
+    ):
+        self.root = Path(root)
+        self.list_objects = list_objects
+        self.read_object = read_object
+        # Ticker to (manifest modification time, mapped columns).
+        self._maps: dict[str, tuple[int, dict[str, np.ndarray]]] = {}
+        self._lock = threading.Lock()
+
+    def _folder(self, ticker: str) -> Path:
+        return self.root / ticker.upper()
+
+    def tickers(self) -> list[str]:
+        """Tickers with materialized features."""
+        return sorted(path.parent.name for path in self.root.glob("*/manifest.json"))
+
+    def materialize(self, ticker: str) -> int:
+        """
+        Append the features of the bars of *ticker* found in lake objects not read yet.
+
+        Bars dated up to the last stored one are left as they are, stored rows are never rewritten.
+
+        Returns:
+            int: The number of rows appended.
+        """
+        ticker = ticker.upper()
+        folder = self._folder(ticker)
+        folder.mkdir(parents=True, exist_ok=True)
+        manifest = Manifest.load(folder / "manifest.json")
+
+        new_objects = [item for item in self.list_objects(f"{ticker}-") if (match := REGEX_CANDLES_OBJECT.fullmatch(item["Key"])) and match.group("ticker") == ticker and manifest.sources.get(item["Key"]) != item["ETag"]]
+        if not new_objects:
+            return 0
+
+        stored = self.read(ticker)
+        last_day = int(stored["time"][-1]) if manifest.rows else -1
+        last_available = int(stored["available_at"][-1]) if manifest.rows else 0
+        # Bar of each new day, from the first lake object holding it.
+        bars: dict[int, tuple[float, float, int]] = {}
+        for item in sorted(new_objects, key=lambda item: item["LastModified"]):
+            available = int(item["LastModified"].timestamp())
+            for day, (close, volume) in parse_candles(self.read_object(item["Key"])).items():
+                if day > last_day and day not in bars:
+                    bars[day] = (close, volume, available)
+            manifest.sources[item["Key"]] = item["ETag"]
+
+        days = np.array(sorted(bars), dtype=np.int64)
+        if len(days):
+            self._append(folder, manifest, stored, days, bars, last_available)
+        manifest.save(folder / "manifest.json")
+        logger.info("Materialized %s new rows of %s from %s objects", len(days), ticker, len(new_objects), extra={"fields": {"ticker": ticker, "rows": len(days), "objects": len(new_objects)}})
+        return len(days)
+
+    def _append(self, folder: Path, manifest: Manifest, stored: dict[str, np.ndarray], days: np.ndarray, bars: dict, last_available: int) -> None:
+        new_close = np.array([bars[day][0] for day in days])
+        new_volume = np.array([bars[day][1] for day in days])
+        # Never earlier than the rows before, so the rows known at a time stay a prefix.
+        available = np.maximum.accumulate(np.maximum(np.array([bars[day][2] for day in days], dtype=np.int64), last_available))
+
+        tail = min(manifest.rows, LOOKBACK)
+        close = np.r_[stored["close"][manifest.rows - tail :], new_close] if tail else new_close
+        volume = np.r_[stored["volume"][manifest.rows - tail :], new_volume] if tail else new_volume
+        columns = {"time": days, "available_at": available, "close": new_close, "volume": new_volume}
+        columns |= {name: values[tail:] for name, values in compute_features(close, volume).items()}
+
+        for name, dtype in manifest.columns.items():
+            path = folder / f"{name}.bin"
+            with path.open("ab") as file:
+                # Drop what a failed run appended after the committed rows.
+                file.truncate(manifest.rows * np.dtype(dtype).itemsize)
+                file.write(np.ascontiguousarray(columns[name], dtype=dtype).tobytes())
+        manifest.rows += len(days)
+
+    def read(self, ticker: str, as_of: Optional[datetime.datetime | int] = None) -> dict[str, np.ndarray]:
+        """
+        Read-only memory maps of the committed columns of *ticker*, `time` and `available_at` in UNIX seconds.
+
+        Args:
+            ticker (str): The ticker.
+            as_of (datetime | int, optional): Only the rows whose bar had reached the lake at that time.
+
+        Returns:
+            dict[str, np.ndarray]: Column name to values, one row per daily bar, oldest first. Empty when nothing of the
+            ticker was materialized.
+        """
+        columns = self._map(ticker.upper())
+        if as_of is None or not columns:
+            return columns
+        limit = int(as_of.timestamp()) if isinstance(as_of, datetime.datetime) else as_of
+        rows = int(np.searchsorted(columns["available_at"], limit, side="right"))
+        return {name: values[:rows] for name, values in columns.items()}
+
+    def _map(self, ticker: str) -> dict[str, np.ndarray]:
+        path = self._folder(ticker) / "manifest.json"
+        try:
+            modified = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return {}
+        with self._lock:
+            if (cached := self._maps.get(ticker)) is not None and cached[0] == modified:
+                return cached[1]
+        manifest = Manifest.load(path)
+        columns = {name: np.memmap(path.parent / f"{name}.bin", dtype=dtype, mode="r", shape=(manifest.rows,)) if manifest.rows else np.empty(0, dtype=dtype) for name, dtype in manifest.columns.items()}
+        with self._lock:
+            self._maps[ticker] = (modified, columns)
+        return columns
+
+    def latest(self, ticker: str, as_of: Optional[datetime.datetime | int] = None) -> Optional[dict[str, float]]:
+        """The last row of *ticker* known at *as_of* (now by default), None when there is none."""
+        columns = self.read(ticker, as_of)
+        if not columns or not len(columns["time"]):
+            return None
+        return {name: values[-1].item() for name, values in columns.items()}
+
+    def row(self, ticker: str, day: int) -> Optional[dict[str, float]]:
+        """The row of the bar of *day* (see `day_start`), None when it was not materialized."""
+        columns = self.read(ticker)
+        if not columns or not (index := int(np.searchsorted(columns["time"], day))) < len(columns["time"]) or columns["time"][index] != day:
+            return None
+        return {name: values[index].item() for name, values in columns.items()}
+
+
+FEATURE_STORE = FeatureStore(os.environ.get("FEATURE_STORE_PATH", "feature_store"))
+
+
+def discover_tickers(list_objects: Callable[[str], Iterable[dict]] = bucket.list_objects) -> Iterator[str]:
+    """Tickers having raw candles in the lake."""
+    seen = set()
+    for item in list_objects(""):
+        if (match := REGEX_CANDLES_OBJECT.fullmatch(item["Key"])) and (ticker := match.group("ticker").upper()) not in seen:
+            seen.add(ticker)
+            yield ticker
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Materialize the features of the raw candles of the data lake.")
+    parser.add_argument("--root", default=FEATURE_STORE.root)
+    parser.add_argument("--tickers", nargs="*", help="Tickers to materialize, every ticker found in the lake by default")
+    args = parser.parse_args()
+
+    store = FeatureStore(args.root)
+    tickers = args.tickers or list(discover_tickers())
+    rows = {ticker: store.materialize(ticker) for ticker in tickers}
+    print(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""Hedged pulls of daily candles across providers.
+
+The preferred provider is asked first. When it has not answered after the hedge delay, the 95th percentile of its recent
+latencies, the other provider is asked too and the first good answer wins, the slower call is cancelled. Only about the
+slowest 5% of the pulls are hedged, so the providers get about 5% more calls while the tail latency becomes that of the
+faster of the two. A provider failing, or answering without candles, is replaced by the next one right away.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from enum import StrEnum
+from typing import Awaitable, Callable
+
+import numpy as np
+
+from helpers.metrics import METRICS
+from helpers.resilience import UpstreamUnavailableError
+
+MODULE_NAME = "Hedging"
+logger = logging.getLogger(MODULE_NAME)
+
+# Columns every provider answers with, `time` as YYYY-MM-DD.
+CANDLE_COLUMNS = ("time", "open", "high", "low", "close", "volumn")
+
+
+class Provider(StrEnum):
+    FINNHUB = "finnhub"
+    YAHOO = "yahoo"
+
+
+class HedgedCandles:
+    """Pulls candles from the first of *providers* to answer, see the module documentation.
+
+    Args:
+        providers (dict): Provider to an async function of (ticker, from_date, to_date) to `CANDLE_COLUMNS` columns and
+            whether the provider was called, rather than a cache answering.
+        initial_delay (float): Hedge delay, in seconds, until a provider was called `min_samples` times.
+        min_delay (float): Lowest hedge delay.
+        window (int): Latest calls to a provider its hedge delay is computed from, so it follows the provider as it
+            slows down or recovers. Cached answers are not counted, they would hide its actual latency.
+    """
+
+    def __init__(
+        self,
+        providers: dict[str, Callable[[str, str, str], Awaitable[tuple[dict[str, list], bool]]]],
+        initial_delay: float = 0.5,
+        min_delay: float = 0.05,
+        min_samples: int = 20,
+        percentile: float = 95,
+        window: int = 200,
+    ):
+        self.providers = providers
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.percentile = percentile
+        self._recent: dict[str, deque[float]] = {name: deque(maxlen=window) for name in providers}
+        self._latency = {name: METRICS.histogram("hedge_latency_seconds", "Time the provider took to answer with candles, cached answers excluded.", provider=name) for name in providers}
+        self._requests = {name: METRICS.counter("hedge_requests", "Pulls by preferred provider.", provider=name) for name in providers}
+        self._fired = {(name, reason): METRICS.counter("hedge_fired", "Pulls where the next provider was asked too, because the preferred one was slow or failed.", provider=name, reason=reason) for name in providers for reason in ("slow", "failed")}
+        self._wins = {name: METRICS.counter("hedge_wins", "Pulls answered by the provider.", provider=name) for name in providers}
+        self._cancelled = {name: METRICS.counter("hedge_cancelled", "Calls to the provider cancelled because another one answered first.", provider=name) for name in providers}
+
+    def delay(self, provider: str) -> float:
+        """Seconds to wait for *provider* before asking the next one."""
+        recent = self._recent[provider]
+        if len(recent) < self.min_samples:
+            return self.initial_delay
+        return max(self.min_delay, float(np.percentile(recent, self.percentile)))
+
+    async def _pull(self, provider: str, ticker: str, from_date: str, to_date: str) -> dict[str, list]:
+        started = time.perf_counter()
+        candles, called = await self.providers[provider](ticker, from_date, to_date)
+        if not candles["time"]:
+            raise LookupError(f"{provider} has no candles of {ticker} from {from_date} to {to_date}")
+        if called:
+            elapsed = time.perf_counter() - started
+            self._recent[provider].append(elapsed)
+            self._latency[provider].record(elapsed)
+        return candles
+
+    async def pull(self, ticker: str, from_date: str, to_date: str, prefer: str) -> tuple[str, bool, dict[str, list]]:
+        """
+        Daily candles of *ticker* from the first provider to answer.
+
+        Returns:
+            tuple[str, bool, dict[str, list]]: The provider that answered, whether another one was asked too, and the
+            `CANDLE_COLUMNS` columns.
+
+        Raises:
+            LookupError: When no provider has candles of the ticker over these dates.
+            UpstreamUnavailableError: When no provider answered.
+        """
+        order = [prefer, *(name for name in self.providers if name != prefer)]
+        self._requests[prefer].inc()
+        tasks: dict[asyncio.Task, str] = {}
+        errors: dict[str, Exception] = {}
+        hedged = False
+
+        def ask(name: str) -> None:
+            tasks[asyncio.create_task(self._pull(name, ticker, from_date, to_date), name=f"hedge-{name}")] = name
+
+        ask(order.pop(0))
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=self.delay(prefer) if order else None, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if (error := task.exception()) is None:
+                        self._wins[tasks[task]].inc()
+                        return tasks[task], hedged, task.result()
+                    errors[tasks[task]] = error
+                if order:
+                    self._fired[prefer, "failed" if done else "slow"].inc()
+                    hedged = True
+                    ask(order.pop(0))
+                    pending = {task for task in tasks if not task.done()}
+        finally:
+            for task, name in tasks.items():
+                if not task.done():
+                    task.cancel()
+                    self._cancelled[name].inc()
+
+        message = f"No provider answered with candles of {ticker}: " + ", ".join(f"{name}: {error}" for name, error in errors.items())
+        if all(isinstance(error, LookupError) for error in errors.values()):
+            raise LookupError(message)
+        raise UpstreamUnavailableError(message)
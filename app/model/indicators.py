@@ -0,0 +1,471 @@
+# -*- coding: utf-8 -*-
+"""Technical indicators over the cleaned candles of the data providers, as vectorized NumPy array operations.
+
+Every indicator returns arrays as long as its input, NaN while the indicator is still warming up.
+
+Each indicator also has a state (see `IndicatorState`) computing it over appended bars only, from running sums, the last
+values of the exponential averages and the tail of the bars its window still needs. Computing over a whole series is
+extending a new state once, so both give the same values.
+"""
+from __future__ import annotations
+
+import copy
+import re
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# `_ewm` rescales its input by decay ** -k, keep that factor well inside the float range.
+MAX_EXPONENT = 500.0
+REGEX_INDICATOR = re.compile(r"([a-z]+)((?:_\d+(?:\.\d+)?)*)")
+COLUMNS = ("open", "high", "low", "close", "volumn")
+
+
+def _ewm(values: np.ndarray, alpha: float, initial: float) -> np.ndarray:
+    """`y[t] = alpha * x[t] + (1 - alpha) * y[t - 1]` with `y[-1] = initial`, without a Python loop over the values.
+
+    Unrolled, `y[t] = decay ** t * (initial + alpha * sum(x[k] * decay ** -k for k <= t))` with `decay = 1 - alpha`, a
+    cumulative sum. The values are processed in blocks short enough for `decay ** -k` not to overflow, rounding errors
+    stay relative to the recent values because they shrink with `decay ** t` as well.
+    """
+    out = np.empty(len(values))
+    decay = 1.0 - alpha
+    if decay <= 0.0:
+        out[:] = values
+        return out
+
+    block = max(1, int(MAX_EXPONENT / -np.log(decay)))
+    previous = initial
+    for start in range(0, len(values), block):
+        chunk = values[start : start + block]
+        powers = decay ** np.arange(1, len(chunk) + 1)
+        out[start : start + len(chunk)] = powers * (previous + alpha * np.cumsum(chunk / powers))
+        previous = out[start + len(chunk) - 1]
+    return out
+
+
+class _SeededEwm:
+    """Exponential average seeded with the simple average of the first *period* values, NaN before that."""
+
+    __slots__ = ("alpha", "period", "pending", "value")
+
+    def __init__(self, alpha: float, period: int):
+        self.alpha = alpha
+        self.period = period
+        self.pending: list[float] = []
+        self.value: Optional[float] = None
+
+    def extend(self, values: np.ndarray) -> np.ndarray:
+        out = np.full(len(values), np.nan)
+        start = 0
+        if self.value is None:
+            start = min(self.period - len(self.pending), len(values))
+            self.pending.extend(values[:start].tolist())
+            if len(self.pending) < self.period:
+                return out
+            self.value = float(np.mean(self.pending))
+            self.pending = []
+            out[start - 1] = self.value
+        if start < len(values):
+            out[start:] = _ewm(values[start:], self.alpha, self.value)
+            self.value = float(out[-1])
+        return out
+
+
+class _Tail:
+    """The last `size` values of some columns, to compute a windowed indicator over new values only."""
+
+    __slots__ = ("size", "columns")
+
+    def __init__(self, size: int):
+        self.size = size
+        self.columns: Optional[list[np.ndarray]] = None
+
+    def extend(self, *columns: np.ndarray) -> tuple[int, list[np.ndarray]]:
+        """Prepend the tail to the new values and keep the new tail, returns the length of the old tail and the joined columns."""
+        if self.columns is None:
+            offset, joined = 0, list(columns)
+        else:
+            offset, joined = len(self.columns[0]), [np.concatenate((old, new)) for old, new in zip(self.columns, columns)]
+        self.columns = [values[max(0, len(values) - self.size) :].copy() for values in joined]
+        return offset, joined
+
+
+def sma(close: np.ndarray, period: int = 20) -> np.ndarray:
+    """Simple moving average."""
+    out = np.full(len(close), np.nan)
+    if len(close) >= period:
+        sums = np.cumsum(np.r_[0.0, close])
+        out[period - 1 :] = (sums[period:] - sums[:-period]) / period
+    return out
+
+
+def bollinger(close: np.ndarray, period: int = 20, width: float = 2.0) -> dict[str, np.ndarray]:
+    """Bollinger bands: the SMA and `width` population standard deviations above and below it."""
+    middle = sma(close, period)
+    deviation = np.full(len(close), np.nan)
+    if len(close) >= period:
+        deviation[period - 1 :] = sliding_window_view(close, period).std(axis=1)
+    return {"upper": middle + width * deviation, "middle": middle, "lower": middle - width * deviation}
+
+
+def true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray, previous_close: Optional[float] = None) -> np.ndarray:
+    """Largest of the bar range and the gaps from the previous close, a first bar without *previous_close* only has its range."""
+    if not len(close):
+        return close
+    previous = np.r_[close[0] if previous_close is None else previous_close, close[:-1]]
+    return np.maximum(high, previous) - np.minimum(low, previous)
+
+
+def sessions(time: np.ndarray) -> Optional[np.ndarray]:
+    """Trading day of each intraday bar, from times such as `YYYY-MM-DD HH:MM:SS`, None for bars without a time of day."""
+    if not len(time) or len(str(time[0])) <= len("YYYY-MM-DD"):
+        return None
+    return np.array([str(value)[:10] for value in time])
+
+
+def _session_sums(weighted: np.ndarray, volumes: np.ndarray, new_session: np.ndarray, before: tuple[float, float] = (0.0, 0.0)) -> tuple[np.ndarray, np.ndarray]:
+    """Restart running sums, one value per bar and *before* the first one, at the bars where *new_session* is set."""
+    begin = np.maximum.accumulate(np.where(new_session, np.arange(len(new_session)), -1))
+    # Bars of a session begun before these ones keep their sums.
+    started = begin >= 0
+    return (
+        weighted - np.where(started, np.r_[before[0], weighted][begin], 0.0),
+        volumes - np.where(started, np.r_[before[1], volumes][begin], 0.0),
+    )
+
+
+def vwap(high: np.ndarray, low: np.ndarray, close: np.ndarray, volume: np.ndarray, period: Optional[int] = None, time: Optional[np.ndarray] = None) -> np.ndarray:
+    """Volume weighted average of the typical price `(high + low + close) / 3`, since the first bar or over *period* bars.
+
+    Without *period*, intraday bars given with their *time* are anchored on their session: the average restarts with the
+    first bar of every trading day.
+    """
+    weighted = np.cumsum(np.r_[0.0, (high + low + close) / 3.0 * volume])
+    volumes = np.cumsum(np.r_[0.0, volume])
+    out = np.full(len(close), np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if period is None:
+            days = sessions(time) if time is not None else None
+            if days is not None:
+                out[:] = np.divide(*_session_sums(weighted[1:], volumes[1:], np.r_[True, days[1:] != days[:-1]]))
+            else:
+                out[:] = weighted[1:] / volumes[1:]
+        elif len(close) >= period:
+            out[period - 1 :] = (weighted[period:] - weighted[:-period]) / (volumes[period:] - volumes[:-period])
+    return out
+
+
+class IndicatorState(ABC):
+    """Rolling state of an indicator, `extend` computes it over appended bars in O(appended bars)."""
+
+    # Name, input columns and default parameters, the parameters are the arguments of `__init__`.
+    name = ""
+    inputs: tuple[str, ...] = ("close",)
+    defaults: tuple = ()
+
+    @abstractmethod
+    def extend(self, *columns: np.ndarray) -> dict[str, np.ndarray]:
+        """Compute the indicator over the next bars, given the `inputs` columns of those bars.
+
+        Returns:
+            dict[str, np.ndarray]: Output suffix (empty for the main output) to the values of the new bars.
+        """
+
+
+class SmaState(IndicatorState):
+    name, defaults = "sma", (20,)
+
+    def __init__(self, period: int = 20):
+        self.period = period
+        self.tail = _Tail(period - 1)
+
+    def extend(self, close):
+        offset, (joined,) = self.tail.extend(close)
+        return {"": sma(joined, self.period)[offset:]}
+
+
+class EmaState(IndicatorState):
+    name, defaults = "ema", (20,)
+
+    def __init__(self, period: int = 20):
+        self.average = _SeededEwm(2.0 / (period + 1), period)
+
+    def extend(self, close):
+        return {"": self.average.extend(close)}
+
+
+class RsiState(IndicatorState):
+    name, defaults = "rsi", (14,)
+
+    def __init__(self, period: int = 14):
+        self.gain = _SeededEwm(1.0 / period, period)
+        self.loss = _SeededEwm(1.0 / period, period)
+        self.last: Optional[float] = None
+
+    def extend(self, close):
+        out = np.full(len(close), np.nan)
+        if not len(close):
+            return {"": out}
+
+        # The very first bar has no change.
+        first = 1 if self.last is None else 0
+        change = np.diff(close if self.last is None else np.r_[self.last, close])
+        self.last = float(close[-1])
+        gain = self.gain.extend(np.maximum(change, 0.0))
+        loss = self.loss.extend(np.maximum(-change, 0.0))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values = np.where(loss == 0.0, 100.0, 100.0 - 100.0 / (1.0 + gain / loss))
+        values[np.isnan(gain)] = np.nan
+        out[first:] = values
+        return {"": out}
+
+
+class MacdState(IndicatorState):
+    name, defaults = "macd", (12, 26, 9)
+
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
+        self.fast = EmaState(fast)
+        self.slow = EmaState(slow)
+        self.signal = _SeededEwm(2.0 / (signal + 1), signal)
+
+    def extend(self, close):
+        line = self.fast.extend(close)[""] - self.slow.extend(close)[""]
+        signal_line = np.full(len(close), np.nan)
+        # The line is only NaN before both averages are seeded, the signal starts after that.
+        valid = ~np.isnan(line)
+        signal_line[valid] = self.signal.extend(line[valid])
+        return {"": line, "signal": signal_line, "hist": line - signal_line}
+
+
+class BollingerState(IndicatorState):
+    name, defaults = "bbands", (20, 2.0)
+
+    def __init__(self, period: int = 20, width: float = 2.0):
+        self.period = period
+        self.width = width
+        self.tail = _Tail(period - 1)
+
+    def extend(self, close):
+        offset, (joined,) = self.tail.extend(close)
+        return {suffix: values[offset:] for suffix, values in bollinger(joined, self.period, self.width).items()}
+
+
+class AtrState(IndicatorState):
+    name, inputs, defaults = "atr", ("high", "low", "close"), (14,)
+
+    def __init__(self, period: int = 14):
+        self.average = _SeededEwm(1.0 / period, period)
+        self.last: Optional[float] = None
+
+    def extend(self, high, low, close):
+        ranges = true_range(high, low, close, self.last)
+        if len(close):
+            self.last = float(close[-1])
+        return {"": self.average.extend(ranges)}
+
+
+class VwapState(IndicatorState):
+    """Without a period, intraday bars restart the average at every session, see `vwap`."""
+
+    name, inputs, defaults = "vwap", ("time", "high", "low", "close", "volumn"), (None,)
+
+    def __init__(self, period: Optional[int] = None):
+        self.period = period
+        self.tail = _Tail(period - 1) if period else None
+        # Sums over the bars of the running session, or of the whole series for bars without a time of day.
+        self.session: Optional[str] = None
+        self.weighted = 0.0
+        self.volume = 0.0
+
+    def extend(self, time, high, low, close, volume):
+        if self.tail is not None:
+            offset, joined = self.tail.extend(high, low, close, volume)
+            return {"": vwap(*joined, self.period)[offset:]}
+
+        weighted = self.weighted + np.cumsum((high + low + close) / 3.0 * volume)
+        volumes = self.volume + np.cumsum(volume)
+        if (days := sessions(time)) is not None:
+            weighted, volumes = _session_sums(weighted, volumes, np.r_[days[0] != self.session, days[1:] != days[:-1]], (self.weighted, self.volume))
+            self.session = str(days[-1])
+        if len(close):
+            self.weighted, self.volume = float(weighted[-1]), float(volumes[-1])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return {"": weighted / volumes}
+
+
+INDICATORS: dict[str, type[IndicatorState]] = {state.name: state for state in (SmaState, EmaState, RsiState, MacdState, BollingerState, AtrState, VwapState)}
+
+
+def _compute(state: IndicatorState, *columns: np.ndarray) -> dict[str, np.ndarray]:
+    return state.extend(*(np.asarray(values, dtype=float) for values in columns))
+
+
+def ema(close: np.ndarray, period: int = 20) -> np.ndarray:
+    """Exponential moving average, `alpha = 2 / (period + 1)`, seeded with the SMA of the first *period* closes."""
+    return _compute(EmaState(period), close)[""]
+
+
+def rsi(close: np.ndarray, period: int = 14) -> np.ndarray:
+    """Relative strength index with Wilder's smoothing, `alpha = 1 / period`."""
+    return _compute(RsiState(period), close)[""]
+
+
+def macd(close: np.ndarray, fast: int = 12, slow: int = 26, signal: int = 9) -> dict[str, np.ndarray]:
+    """Moving average convergence divergence: the MACD line, its signal line and their difference."""
+    return _compute(MacdState(fast, slow, signal), close)
+
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = 14) -> np.ndarray:
+    """Average true range with Wilder's smoothing."""
+    return _compute(AtrState(period), high, low, close)[""]
+
+
+def parse_names(names: str | None) -> tuple[str, ...]:
+    """Split and validate a comma separated indicator list, e.g. `sma_50,ema_20,rsi,macd_12_26_9,bbands_20_2,atr,vwap`.
+
+    Raises:
+        ValueError: On an unknown indicator, too many parameters or a parameter that is not positive.
+    """
+    result = []
+    for name in filter(None, (part.strip().lower() for part in (names or "").split(","))):
+        match = REGEX_INDICATOR.fullmatch(name)
+        if not match or match.group(1) not in INDICATORS:
+            raise ValueError(f"Unknown indicator {name!r}, expected one of {', '.join(INDICATORS)}")
+        if len(match.group(2).split("_")) - 1 > len(INDICATORS[match.group(1)].defaults):
+            raise ValueError(f"Too many parameters in {name!r}")
+        if any(float(value) <= 0 for value in match.group(2).split("_")[1:]):
+            raise ValueError(f"Parameters of {name!r} must be positive")
+        result.append(name)
+    return tuple(dict.fromkeys(result))
+
+
+def create_state(name: str) -> IndicatorState:
+    """Create the state of an indicator parsed by `parse_names`."""
+    kind, parameters = REGEX_INDICATOR.fullmatch(name).groups()  # type: ignore
+    state_type = INDICATORS[kind]
+    # Periods are whole bars, only the parameters defaulting to a float may have decimals.
+    values = [float(value) if isinstance(default, float) else int(float(value)) for value, default in zip(parameters.split("_")[1:], state_type.defaults)]
+    return state_type(*values)
+
+
+def extend(name: str, state: IndicatorState, columns: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+    """Extend the state of the indicator *name* with bars given as float arrays keyed open / high / low / close / volumn,
+    and their time.
+
+    Returns:
+        dict[str, np.ndarray]: Output column name to the values of the bars, e.g. `macd`, `macd_signal` and `macd_hist`.
+    """
+    result = state.extend(*(columns[column] for column in state.inputs))
+    return {f"{name}_{suffix}" if suffix else name: values for suffix, values in result.items()}
+
+
+def compute(name: str, columns: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+    """Compute an indicator parsed by `parse_names` over a whole series, see `extend`."""
+    return extend(name, create_state(name), columns)
+
+
+def to_list(values: np.ndarray) -> list[float | None]:
+    """JSON friendly values, NaN as None."""
+    missing = np.isnan(values)
+    values = values.astype(object)
+    values[missing] = None
+    return values.tolist()
+
+
+def series_key(source: str, ticker: str, resolution: str, time: list) -> tuple:
+    """Key of a series in `IndicatorCache`, bars appended to the series keep the key."""
+    return (source, ticker, resolution, time[0] if time else None)
+
+
+class _Entry:
+    """Indicator columns computed over the first `length` bars of a series, and the state to extend them.
+
+    The state only covers the `closed` bars, all but the last one: the last bar may still change, e.g. the bar of the
+    running day, and is computed from a copy of the state, so a change only computes it again.
+    """
+
+    __slots__ = ("name", "state", "time", "close", "length", "closed", "columns", "lock")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.state = create_state(self.name)
+        self.time: list = []
+        self.close: list = []
+        self.length = 0
+        self.closed = 0
+        self.columns: dict[str, list] = {}
+
+    def matches(self, time: list, close: list, length: int) -> bool:
+        """Whether the cached bars and the given ones agree on the first *length* bars."""
+        return not length or (self.time[length - 1] == time[length - 1] and self.close[length - 1] == close[length - 1])
+
+    def _extend(self, series: dict[str, list]) -> None:
+        """Compute the bars after the closed ones, the last bar from a copy of the state."""
+        columns = {column: np.asarray(series[column][self.closed :], dtype=float) for column in COLUMNS}
+        columns["time"] = np.asarray(series["time"][self.closed :], dtype=object)
+        outputs = [extend(self.name, self.state, {column: values[:-1] for column, values in columns.items()})] if len(columns["time"]) > 1 else []
+        outputs.append(extend(self.name, copy.deepcopy(self.state), {column: values[-1:] for column, values in columns.items()}))
+
+        for column in outputs[-1]:
+            # Extended in place, only the copies returned by `get` leave the lock.
+            values = self.columns.setdefault(column, [])
+            del values[self.closed :]
+            for output in outputs:
+                values.extend(to_list(output[column]))
+        self.time, self.close = series["time"], series["close"]
+        self.length = len(self.time)
+        self.closed = self.length - 1
+
+    def get(self, series: dict[str, list]) -> dict[str, list]:
+        time, close = series["time"], series["close"]
+        with self.lock:
+            if not self.matches(time, close, min(self.length, len(time))):
+                # Only a change of the last bar keeps the closed ones.
+                if len(time) < self.length or not self.matches(time, close, self.closed):
+                    self.reset()
+                self.length = self.closed
+            if self.length < len(time):
+                self._extend(series)
+            # Indicators only depend on past bars, those of a shorter range are a prefix.
+            return {column: values[: len(time)] for column, values in self.columns.items()}
+
+
+class IndicatorCache:
+    """LRU cache of the indicator columns of recently used series, ready to be serialized.
+
+    Entries are keyed by the key of the series and the indicator name, and keep the state of the indicator. When the
+    series grew since, only the appended bars are computed. When its last known bar changed, e.g. the bar of the running
+    day, only that bar is computed again.
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[tuple, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, series_key: Hashable, series: dict[str, list], names: tuple[str, ...]) -> dict[str, list]:
+        """Get the columns of the indicators *names* of a series, lists keyed time / open / high / low / close / volumn."""
+        result: dict[str, list] = {}
+        for name in names:
+            key = (series_key, name)
+            with self._lock:
+                if (entry := self._entries.get(key)) is None:
+                    entry = self._entries[key] = _Entry(name)
+                    while len(self._entries) > self.maxsize:
+                        self._entries.popitem(last=False)
+                else:
+                    self._entries.move_to_end(key)
+            result.update(entry.get(series))
+        return result
+
+
+INDICATOR_CACHE = IndicatorCache()
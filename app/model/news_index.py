@@ -0,0 +1,392 @@
+# -*- coding: utf-8 -*-
+"""Article store of the scraped news, with an on-disk inverted index ranked by BM25.
+
+Layout of the store folder:
+    articles.jsonl        one article per line, appended to
+    ends.bin              int64, end offset of each article in articles.jsonl
+    published.bin         int64, publish time of each article in UNIX seconds, -1 when unknown
+    lengths.bin           uint32, tokens of each article, title tokens counted `TITLE_WEIGHT` times
+    segment-<n>.terms     JSON dictionary of a segment: term to [offset, postings, doc id type, frequency type]
+    segment-<n>.postings  postings of every term of the segment, back to back
+    manifest.json         the segments and the articles each covers
+
+Terms are `body:<token>` for the words of the title and text, and `ticker:<symbol>` for the tickers they mention. The
+postings of a term are its ascending document ids, delta encoded, then its term frequencies, each array stored in the
+narrowest unsigned type holding its largest value. Decoding a list is one `np.cumsum`.
+
+New articles are indexed in memory and written as a new immutable segment every `FLUSH_DOCUMENTS` articles. Once there
+are more than `MAX_SEGMENTS` segments they are merged into one. Articles not in a segment yet are indexed again from
+articles.jsonl when the store is opened.
+"""
+from __future__ import annotations
+
+import datetime
+import logging
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+import orjson
+
+MODULE_NAME = "News_Index"
+logger = logging.getLogger(MODULE_NAME)
+
+REGEX_TOKEN = re.compile(r"[a-z0-9]+(?:[.'][a-z0-9]+)*")
+REGEX_CASHTAG = re.compile(r"\$([A-Z]{1,5}(?:\.[A-Z])?)\b")
+REGEX_EXCHANGE_TICKER = re.compile(r"\((?:NASDAQ|NYSE|NYSEARCA|NYSE American|AMEX|OTC)\s*:\s*([A-Z]{1,5}(?:\.[A-Z])?)\)")
+REGEX_UPPERCASE_WORD = re.compile(r"\b[A-Z]{2,5}\b")
+STOPWORDS = frozenset("a an and are as at be been but by for from had has have he her his i in is it its of on or our she that the their them " "they this to was we were which will with you".split())
+
+# BM25 parameters.
+K1 = 1.2
+B = 0.75
+# Title tokens count as many times as this in the term frequencies, a light BM25F.
+TITLE_WEIGHT = 2
+FLUSH_DOCUMENTS = 1000
+MAX_SEGMENTS = 8
+# Codes of the postings types, by increasing size.
+TYPES = ("<u1", "<u2", "<u4")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase words of *text*, stopwords removed."""
+    return [token for token in REGEX_TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def ticker_mentions(text: str, known: Iterable[str] = ()) -> Counter:
+    """Mentions of each ticker in *text*: cashtags ($TSLA), exchange notes ((NASDAQ: TSLA)) and uppercase *known* symbols."""
+    mentions = Counter(REGEX_CASHTAG.findall(text)) + Counter(REGEX_EXCHANGE_TICKER.findall(text))
+    if known := set(known):
+        # Without the cashtags and exchange notes already counted.
+        rest = REGEX_EXCHANGE_TICKER.sub(" ", REGEX_CASHTAG.sub(" ", text))
+        mentions.update(word for word in REGEX_UPPERCASE_WORD.findall(rest) if word in known)
+    return mentions
+
+
+def extract_tickers(text: str, known: Iterable[str] = ()) -> set[str]:
+    """Tickers mentioned in *text*, see `ticker_mentions`."""
+    return set(ticker_mentions(text, known))
+
+
+def _utc(moment: Optional[datetime.datetime]) -> Optional[datetime.datetime]:
+    """Times without a timezone are taken as UTC."""
+    return moment.replace(tzinfo=datetime.timezone.utc) if moment is not None and moment.tzinfo is None else moment
+
+
+def _narrowest(values: np.ndarray) -> int:
+    largest = int(values.max()) if len(values) else 0
+    return 0 if largest < 1 << 8 else 1 if largest < 1 << 16 else 2
+
+
+def encode_postings(ids: np.ndarray, frequencies: np.ndarray) -> tuple[bytes, int, int]:
+    """Delta encode ascending document ids, returns the bytes of the ids then the frequencies and both type codes."""
+    deltas = np.diff(ids, prepend=0)
+    id_code, frequency_code = _narrowest(deltas), _narrowest(frequencies)
+    return deltas.astype(TYPES[id_code]).tobytes() + frequencies.astype(TYPES[frequency_code]).tobytes(), id_code, frequency_code
+
+
+def decode_postings(buffer, offset: int, count: int, id_code: int, frequency_code: int) -> tuple[np.ndarray, np.ndarray]:
+    id_type, frequency_type = np.dtype(TYPES[id_code]), np.dtype(TYPES[frequency_code])
+    ids = np.cumsum(np.frombuffer(buffer, dtype=id_type, count=count, offset=offset), dtype=np.int64)
+    frequencies = np.frombuffer(buffer, dtype=frequency_type, count=count, offset=offset + count * id_type.itemsize)
+    return ids, frequencies
+
+
+class _Column:
+    """A growing array, views taken before an append stay valid."""
+
+    def __init__(self, dtype: str, values: Optional[np.ndarray] = None):
+        self._values = np.array(values if values is not None else [], dtype=dtype)
+        self.size = len(self._values)
+
+    def append(self, value) -> None:
+        if self.size == len(self._values):
+            grown = np.empty(max(16, 2 * self.size), dtype=self._values.dtype)
+            grown[: self.size] = self._values[: self.size]
+            self._values = grown
+        self._values[self.size] = value
+        self.size += 1
+
+    def view(self) -> np.ndarray:
+        return self._values[: self.size]
+
+
+class Segment:
+    """An immutable part of the index covering the articles [start, end)."""
+
+    def __init__(self, folder: Path, name: str, start: int, end: int):
+        self.name, self.start, self.end = name, start, end
+        self.terms: dict[str, list[int]] = orjson.loads((folder / f"{name}.terms").read_bytes())
+        size = (folder / f"{name}.postings").stat().st_size
+        self.postings = np.memmap(folder / f"{name}.postings", dtype=np.uint8, mode="r") if size else np.empty(0, dtype=np.uint8)
+
+    def get(self, term: str) -> Optional[tuple[np.ndarray, np.ndarray]]:
+        if (entry := self.terms.get(term)) is None:
+            return None
+        return decode_postings(self.postings, *entry)
+
+    @staticmethod
+    def write(folder: Path, name: str, postings: dict[str, tuple[np.ndarray, np.ndarray]]) -> None:
+        terms, offset = {}, 0
+        with (folder / f"{name}.postings").open("wb") as file:
+            for term in sorted(postings):
+                data, id_code, frequency_code = encode_postings(*postings[term])
+                file.write(data)
+                terms[term] = [offset, len(postings[term][0]), id_code, frequency_code]
+                offset += len(data)
+        (folder / f"{name}.terms").write_bytes(orjson.dumps(terms))
+
+
+class NewsIndex:
+    """Stores scraped articles and searches them by words, tickers and publish dates."""
+
+    def __init__(self, folder: str | Path, known_tickers: Iterable[str] = ()):
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self.known_tickers = frozenset(known_tickers)
+        self._lock = threading.RLock()
+        self._open()
+
+    # Storage
+
+    def _open(self) -> None:
+        manifest = self.folder / "manifest.json"
+        segments = orjson.loads(manifest.read_bytes())["segments"] if manifest.exists() else []
+        self.segments = [Segment(self.folder, item["name"], item["start"], item["end"]) for item in segments]
+        self._next_segment = max((int(item["name"].rsplit("-", 1)[1]) for item in segments), default=-1) + 1
+
+        columns = {"ends": "<i8", "published": "<i8", "lengths": "<u4"}
+        stored = {name: np.fromfile(self.folder / f"{name}.bin", dtype=dtype) if (self.folder / f"{name}.bin").exists() else np.empty(0, dtype) for name, dtype in columns.items()}
+        # An interrupted append may have written some files of its article only, drop it.
+        count = min(len(values) for values in stored.values())
+        for name, dtype in columns.items():
+            with (self.folder / f"{name}.bin").open("ab") as file:
+                file.truncate(count * np.dtype(dtype).itemsize)
+        with (self.folder / "articles.jsonl").open("ab") as file:
+            file.truncate(int(stored["ends"][count - 1]) if count else 0)
+
+        self._ends = _Column("<i8", stored["ends"][:count])
+        self._published = _Column("<i8", stored["published"][:count])
+        self._lengths = _Column("<u4", stored["lengths"][:count])
+        self._urls = {}
+        self._buffer: dict[str, list[tuple[int, int]]] = defaultdict(list)
+        self._buffer_start = self.segments[-1].end if self.segments else 0
+        for doc_id, article in enumerate(self._read_all()):
+            self._urls[article["url"]] = doc_id
+            if doc_id >= self._buffer_start:
+                self._index(doc_id, article)
+        logger.info("Opened the news index of %s articles, %s segments", count, len(self.segments))
+
+    def _read_all(self) -> Iterable[dict]:
+        with (self.folder / "articles.jsonl").open("rb") as file:
+            for line in file:
+                yield orjson.loads(line)
+
+    def __len__(self) -> int:
+        return self._ends.size
+
+    def add(self, url: str, title: str, text: str, authors: Iterable[str] = (), publish_date: Optional[datetime.datetime | str] = None, tickers: Iterable[str] = ()) -> int:
+        """
+        Store and index an article, unless its URL already is.
+
+        Args:
+            tickers (Iterable[str]): Tickers the article is about, on top of those found in its title and text.
+
+        Returns:
+            int: The id of the article.
+        """
+        with self._lock:
+            if (doc_id := self._urls.get(url)) is not None:
+                return doc_id
+
+            publish_date = _utc(datetime.datetime.fromisoformat(publish_date) if isinstance(publish_date, str) else publish_date)
+            mentioned = sorted(extract_tickers(f"{title}\n{text}", self.known_tickers) | {ticker.upper() for ticker in tickers})
+            article = {
+                "url": url,
+                "title": title,
+                "authors": list(authors),
+                "publish_date": publish_date.isoformat() if publish_date else None,
+                "tickers": mentioned,
+                "text": text,
+            }
+
+            doc_id = len(self)
+            line = orjson.dumps(article) + b"\n"
+            with (self.folder / "articles.jsonl").open("ab") as file:
+                file.write(line)
+            length = self._index(doc_id, article)
+            end = (int(self._ends.view()[-1]) if doc_id else 0) + len(line)
+            published = int(publish_date.timestamp()) if publish_date else -1
+            for name, column, value in (("lengths", self._lengths, length), ("published", self._published, published), ("ends", self._ends, end)):
+                with (self.folder / f"{name}.bin").open("ab") as file:
+                    file.write(np.array([value], dtype=column.view().dtype).tobytes())
+                column.append(value)
+            self._urls[url] = doc_id
+
+            if doc_id + 1 - self._buffer_start >= FLUSH_DOCUMENTS:
+                self.flush()
+            return doc_id
+
+    def _index(self, doc_id: int, article: dict) -> int:
+        """Add an article to the in-memory postings, returns its length."""
+        counts = Counter(tokenize(article["title"] or ""))
+        for token in counts:
+            counts[token] *= TITLE_WEIGHT
+        counts.update(tokenize(article["text"] or ""))
+        for token, frequency in counts.items():
+            self._buffer[f"body:{token}"].append((doc_id, frequency))
+        for ticker in article["tickers"]:
+            self._buffer[f"ticker:{ticker}"].append((doc_id, 1))
+        return sum(counts.values())
+
+    def flush(self) -> None:
+        """Write the articles indexed in memory as a new segment, merging the segments when there are too many."""
+        with self._lock:
+            end = len(self)
+            if end == self._buffer_start:
+                return
+            postings = {term: (np.array([doc for doc, _ in items], dtype=np.int64), np.array([frequency for _, frequency in items], dtype=np.int64)) for term, items in self._buffer.items()}
+            segment = self._write_segment(postings, self._buffer_start, end)
+            self.segments = self.segments + [segment]
+            self._buffer, self._buffer_start = defaultdict(list), end
+            if len(self.segments) > MAX_SEGMENTS:
+                self._merge()
+            self._save_manifest()
+
+    def _write_segment(self, postings: dict[str, tuple[np.ndarray, np.ndarray]], start: int, end: int) -> Segment:
+        name = f"segment-{self._next_segment}"
+        self._next_segment += 1
+        Segment.write(self.folder, name, postings)
+        return Segment(self.folder, name, start, end)
+
+    def _merge(self) -> None:
+        old = self.segments
+        terms = set().union(*(segment.terms for segment in old))
+        postings = {}
+        for term in terms:
+            parts = [part for segment in old if (part := segment.get(term)) is not None]
+            # Segments cover consecutive id ranges, concatenating keeps the ids ascending.
+            postings[term] = (np.concatenate([ids for ids, _ in parts]), np.concatenate([frequencies for _, frequencies in parts]))
+        self.segments = [self._write_segment(postings, old[0].start, old[-1].end)]
+        self._save_manifest()
+        for segment in old:
+            for suffix in ("terms", "postings"):
+                (self.folder / f"{segment.name}.{suffix}").unlink(missing_ok=True)
+        logger.info("Merged %s segments of %s terms", len(old), len(terms))
+
+    def _save_manifest(self) -> None:
+        temporary = self.folder / "manifest.tmp"
+        temporary.write_bytes(orjson.dumps({"segments": [{"name": segment.name, "start": segment.start, "end": segment.end} for segment in self.segments]}))
+        os.replace(temporary, self.folder / "manifest.json")
+
+    # Search
+
+    def _postings(self, term: str, segments: list[Segment], buffer: dict[str, list[tuple[int, int]]]) -> tuple[np.ndarray, np.ndarray]:
+        parts = [part for segment in segments if (part := segment.get(term)) is not None]
+        if items := buffer.get(term):
+            parts.append((np.array([doc for doc, _ in items], dtype=np.int64), np.array([frequency for _, frequency in items], dtype=np.int64)))
+        if not parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return np.concatenate([ids for ids, _ in parts]), np.concatenate([frequencies for _, frequencies in parts]).astype(np.float64)
+
+    def search(
+        self,
+        query: str = "",
+        tickers: Iterable[str] = (),
+        since: Optional[datetime.datetime] = None,
+        until: Optional[datetime.datetime] = None,
+        limit: int = 20,
+    ) -> list[dict]:
+        """
+        Articles matching any word of *query*, best BM25 score first, or the most recent first without a query.
+
+        Args:
+            query (str): Words to look for in the titles and texts.
+            tickers (Iterable[str]): Only the articles mentioning one of them.
+            since, until (datetime, optional): Only the articles published in that range, UTC without a timezone.
+                Articles without a publish date are then left out.
+            limit (int): Most articles to return.
+
+        Returns:
+            list[dict]: The articles without their text, with their `id` and `score`.
+        """
+        with self._lock:
+            segments, count = self.segments, len(self)
+            buffer = {term: list(items) for term, items in self._buffer.items()}
+            lengths, published = self._lengths.view(), self._published.view()
+
+        terms = list(dict.fromkeys(f"body:{token}" for token in tokenize(query)))
+        tickers = [ticker.upper() for ticker in tickers]
+        if not count or (query.strip() and not terms):
+            return []
+
+        allowed = None
+        if tickers:
+            allowed = np.unique(np.concatenate([self._postings(f"ticker:{ticker}", segments, buffer)[0] for ticker in tickers]))
+        since, until = _utc(since), _utc(until)
+        if since is not None or until is not None:
+            low = int(since.timestamp()) if since else np.iinfo(np.int64).min
+            high = int(until.timestamp()) if until else np.iinfo(np.int64).max
+            in_range = np.flatnonzero((published >= low) & (published <= high) & (published >= 0))
+            allowed = in_range if allowed is None else np.intersect1d(allowed, in_range, assume_unique=True)
+
+        if not terms:
+            ids = allowed if allowed is not None else np.arange(count)
+            # Most recent first, the latest stored first among the same dates.
+            order = np.lexsort((-ids, -published[ids]))[:limit]
+            return self._fetch(ids[order], np.zeros(len(order)))
+
+        average = float(lengths.mean()) or 1.0
+        all_ids, all_scores = [], []
+        for term in terms:
+            ids, frequencies = self._postings(term, segments, buffer)
+            if not len(ids):
+                continue
+            idf = math.log(1.0 + (count - len(ids) + 0.5) / (len(ids) + 0.5))
+            norm = K1 * (1.0 - B + B * lengths[ids] / average)
+            all_ids.append(ids)
+            all_scores.append(idf * frequencies * (K1 + 1.0) / (frequencies + norm))
+        if not all_ids:
+            return []
+
+        ids, inverse = np.unique(np.concatenate(all_ids), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(all_scores))
+        if allowed is not None:
+            keep = np.isin(ids, allowed, assume_unique=True)
+            ids, scores = ids[keep], scores[keep]
+        if len(ids) > limit:
+            # Past the scores above the last one kept, the ties go to the oldest articles, as in a full sort.
+            last = np.partition(scores, len(scores) - limit)[len(scores) - limit]
+            keep = scores > last
+            keep[np.flatnonzero(scores == last)[: limit - int(keep.sum())]] = True
+            ids, scores = ids[keep], scores[keep]
+        order = np.lexsort((ids, -scores))
+        return self._fetch(ids[order], scores[order])
+
+    def get(self, url: str) -> Optional[dict]:
+        """The stored article of a URL, text included, None when it was never stored."""
+        with self._lock:
+            if (doc_id := self._urls.get(url)) is None:
+                return None
+            ends = self._ends.view()
+            start = int(ends[doc_id - 1]) if doc_id else 0
+            with (self.folder / "articles.jsonl").open("rb") as file:
+                file.seek(start)
+                return {"id": doc_id} | orjson.loads(file.read(int(ends[doc_id]) - start))
+
+    def _fetch(self, ids: np.ndarray, scores: np.ndarray) -> list[dict]:
+        ends = self._ends.view()
+        results = []
+        with (self.folder / "articles.jsonl").open("rb") as file:
+            for doc_id, score in zip(ids.tolist(), scores.tolist()):
+                start = int(ends[doc_id - 1]) if doc_id else 0
+                file.seek(start)
+                article = orjson.loads(file.read(int(ends[doc_id]) - start))
+                del article["text"]
+                results.append({"id": doc_id, "score": score} | article)
+        return results
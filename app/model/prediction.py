@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""Next-bar return prediction, with requests micro-batched into one model call.
+
+The features of a request are the feature store columns of its last daily bar (see `model.feature_store.FEATURES`), the
+very values the models are trained on: read from the store when it materialized the bar, computed by the same
+`compute_features` otherwise, e.g. for the bar of today that has not reached the data lake yet.
+
+`MicroBatcher` queues the feature rows of concurrent requests for at most `max_wait` seconds, runs them through the model
+as one (batch x features) array in its own worker thread and hands every request its row of the output.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from helpers.metrics import METRICS
+from model.feature_store import FEATURES, LOOKBACK, FeatureStore, compute_features, day_start
+
+MODULE_NAME = "Prediction"
+logger = logging.getLogger(MODULE_NAME)
+
+# Columns of the feature rows, in the order of the model inputs.
+FEATURE_COLUMNS = tuple(FEATURES)
+
+
+def features(store: FeatureStore, ticker: str, candles: dict[str, list]) -> np.ndarray:
+    """
+    Feature row of the last bar of a daily series.
+
+    Args:
+        store (FeatureStore): The store to read the row from.
+        ticker (str): The ticker of the candles.
+        candles (dict[str, list]): Daily candles as returned by `FinnHubAPI.pull_data`, oldest first.
+
+    Returns:
+        np.ndarray: The `FEATURE_COLUMNS` of the last bar as float32, like the store keeps them, 0 for a feature lacking
+        history.
+
+    Raises:
+        ValueError: When there is no candle.
+    """
+    if not candles["time"]:
+        raise ValueError("At least 1 candle is needed")
+    if (stored := store.row(ticker, day_start(candles["time"][-1]))) is not None:
+        row = np.array([stored[name] for name in FEATURE_COLUMNS], dtype=np.float32)
+    else:
+        close = np.asarray(candles["close"][-LOOKBACK:], dtype=float)
+        volume = np.asarray(candles["volumn"][-LOOKBACK:], dtype=float)
+        row = np.array([values[-1] for values in compute_features(close, volume).values()], dtype=np.float32)
+    return np.nan_to_num(row, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+class Predictor(ABC):
+    """A model of (batch x features) float32 arrays to one predicted next-bar log return per row."""
+
+    name = ""
+
+    @abstractmethod
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        pass
+
+
+class LinearPredictor(Predictor):
+    """`batch @ weights + bias`, loaded from a `.npz` file holding `weights` (features,) and `bias`."""
+
+    def __init__(self, weights: np.ndarray, bias: float = 0.0, name: str = "linear"):
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = np.float32(bias)
+        self.name = name
+
+    @classmethod
+    def load(cls, path: str | Path) -> LinearPredictor:
+        with np.load(path) as archive:
+            return cls(archive["weights"], float(archive["bias"]) if "bias" in archive else 0.0, name=Path(path).stem)
+
+    @classmethod
+    def baseline(cls) -> LinearPredictor:
+        """The average daily log return of the last 20 bars, a momentum baseline to serve until a trained model is deployed."""
+        weights = np.zeros(len(FEATURE_COLUMNS))
+        weights[FEATURE_COLUMNS.index("log_return_20")] = 1.0 / 20
+        return cls(weights, name="momentum-baseline")
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return batch @ self.weights + self.bias
+
+
+class OnnxPredictor(Predictor):
+    """An ONNX model run by onnxruntime on the CPU, with one (batch x features) float32 input and one output per row."""
+
+    def __init__(self, path: str | Path, threads: int = 1):
+        import onnxruntime  # pylint: disable=import-outside-toplevel
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.name = Path(path).stem
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: batch})[0].reshape(len(batch))
+
+
+def load_predictor(path: Optional[str]) -> Predictor:
+    """The model at *path*, `.onnx` or `.npz`, or the momentum baseline when there is none."""
+    if not path:
+        return LinearPredictor.baseline()
+    if path.endswith(".onnx"):
+        return OnnxPredictor(path)
+    return LinearPredictor.load(path)
+
+
+class MicroBatcher:
+    """Groups the predictions of concurrent requests into batched model calls on a dedicated thread.
+
+    A batch is sent once it has `max_batch` rows or its first row waited `max_wait` seconds. Requests arriving while the
+    model runs queue up for the next batch, so the batches grow with the load.
+    """
+
+    def __init__(self, predictor: Predictor, max_batch: int = 64, max_wait: float = 0.005):
+        self.predictor = predictor
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._batches = METRICS.counter("inference_batches", "Batched model calls.", model=predictor.name)
+        self._rows = METRICS.counter("inference_rows", "Rows predicted, divided by the batches it is the mean batch size.", model=predictor.name)
+        self._wait_time = METRICS.histogram("inference_wait_seconds", "Time a row waited for its batch to start.", model=predictor.name)
+        self._run_time = METRICS.histogram("inference_run_seconds", "Duration of a batched model call.", model=predictor.name)
+
+    async def predict(self, row: np.ndarray) -> float:
+        """Predict a feature row along with the rows of the other requests."""
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run(), name="micro-batcher")
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((row, future, time.perf_counter()))  # type: ignore
+        return await future
+
+    async def _collect(self) -> list[tuple]:
+        queue: asyncio.Queue = self._queue  # type: ignore
+        batch = [await queue.get()]
+        deadline = batch[0][2] + self.max_wait
+        while len(batch) < self.max_batch:
+            if not queue.empty():
+                batch.append(queue.get_nowait())
+                continue
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [item for item in await self._collect() if not item[1].cancelled()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            for _, _, queued in batch:
+                self._wait_time.record(started - queued)
+            try:
+                rows = np.stack([row for row, _, _ in batch]).astype(np.float32)
+                outputs = await loop.run_in_executor(self._executor, self.predictor.predict, rows)
+            except Exception as error:  # pylint: disable=broad-except
+                logger.error("Batch of %s rows failed: %s", len(batch), error)
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+
+            self._run_time.record(time.perf_counter() - started)
+            self._batches.inc()
+            self._rows.inc(len(batch))
+            for (_, future, _), output in zip(batch, outputs):
+                if not future.done():
+                    future.set_result(float(output))
@@ -0,0 +1,414 @@
+# -*- coding: utf-8 -*-
+"""Cross-sectional screening of a ticker universe over an in-memory panel of daily candles.
+
+The panel holds every column as one (tickers x dates) float array, NaN where a ticker has no bar, so a filter is
+evaluated for every ticker at once with array operations. Indicators are computed per ticker over its own bars the first
+time a filter uses them, then kept with the panel until it is rebuilt.
+
+Filters are Python-like expressions over the column and indicator names, parsed with `ast` and never evaluated as code:
+    close > sma_50 and volumn > 2 * sma_20_volumn
+    cross_above(close, sma_50) and rsi_14 < 70
+    pct_change(close, 5) > 0.1 or close[1] < bbands_20_2_lower[1]
+
+`name[n]` is the value *n* bars before the screened date. Every node of an expression is evaluated once, over all the
+bars its parents need at once, so nested windows cost their sizes added up rather than multiplied.
+"""
+from __future__ import annotations
+
+import ast
+import bisect
+import datetime
+import functools
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+import numpy as np
+
+from helpers.resilience import UpstreamUnavailableError
+from model.indicators import COLUMNS, compute, parse_names
+
+MODULE_NAME = "Screener"
+logger = logging.getLogger(MODULE_NAME)
+
+DEFAULT_UNIVERSE = ("AAPL", "MSFT", "AMZN", "GOOGL", "META", "NVDA", "TSLA", "JPM", "V", "JNJ", "WMT", "XOM", "PG", "MA", "HD")
+# Output suffixes of the indicators with several columns, see `model.indicators.extend`.
+OUTPUT_SUFFIXES = ("signal", "hist", "upper", "middle", "lower")
+# An indicator over another column than close, e.g. sma_20_volumn.
+REGEX_COLUMN_SUFFIX = re.compile(rf"(.+)_({'|'.join(column for column in COLUMNS if column != 'close')})")
+MAX_EXPRESSION_LENGTH = 1000
+MAX_LAG = 1000
+# Values read per ticker to evaluate an expression once, see `Expression._validate`.
+MAX_EXPRESSION_COST = 100_000
+
+# An evaluator maps (lag, bars) to the (tickers x bars) values of a node, column j being *lag* + j bars back.
+Evaluator = Callable[[int, int], np.ndarray]
+
+
+def _cross_above(left: Evaluator, right: Evaluator, lag: int, bars: int) -> np.ndarray:
+    left_values, right_values = left(lag, bars + 1), right(lag, bars + 1)
+    return (left_values[:, :-1] > right_values[:, :-1]) & (left_values[:, 1:] <= right_values[:, 1:])
+
+
+def _cross_below(left: Evaluator, right: Evaluator, lag: int, bars: int) -> np.ndarray:
+    left_values, right_values = left(lag, bars + 1), right(lag, bars + 1)
+    return (left_values[:, :-1] < right_values[:, :-1]) & (left_values[:, 1:] >= right_values[:, 1:])
+
+
+def _pct_change(values: Evaluator, window: int, lag: int, bars: int) -> np.ndarray:
+    prices = values(lag, bars + window)
+    return prices[:, :bars] / prices[:, window:] - 1.0
+
+
+def _highest(values: Evaluator, window: int, lag: int, bars: int) -> np.ndarray:
+    return np.lib.stride_tricks.sliding_window_view(values(lag, bars + window - 1), window, axis=1).max(axis=-1)
+
+
+def _lowest(values: Evaluator, window: int, lag: int, bars: int) -> np.ndarray:
+    return np.lib.stride_tricks.sliding_window_view(values(lag, bars + window - 1), window, axis=1).min(axis=-1)
+
+
+# Name: (function of the argument evaluators, the lag and the bars, arguments that must be a positive whole number of
+# bars, passed as such, and the extra bars each argument is evaluated over).
+FUNCTIONS: dict[str, tuple[Callable[..., np.ndarray], tuple[int, ...], Callable[[tuple[int, ...]], int]]] = {
+    "cross_above": (_cross_above, (), lambda windows: 1),
+    "cross_below": (_cross_below, (), lambda windows: 1),
+    "pct_change": (_pct_change, (1,), lambda windows: windows[0]),
+    "highest": (_highest, (1,), lambda windows: windows[0] - 1),
+    "lowest": (_lowest, (1,), lambda windows: windows[0] - 1),
+    "abs": (lambda values, lag, bars: np.abs(values(lag, bars)), (), lambda windows: 0),
+}
+
+_COMPARE = {ast.Gt: np.greater, ast.GtE: np.greater_equal, ast.Lt: np.less, ast.LtE: np.less_equal, ast.Eq: np.equal, ast.NotEq: np.not_equal}
+_ARITHMETIC = {ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.divide}
+
+
+class Panel:
+    """Daily candles of a universe as (tickers x dates) arrays, and the indicator columns computed over them."""
+
+    def __init__(self, series: dict[str, dict[str, list]]):
+        """
+        Args:
+            series (dict[str, dict[str, list]]): Candles by ticker, lists keyed time / open / high / low / close / volumn
+                as returned by `FinnHubAPI.pull_data`, oldest first.
+        """
+        self.tickers = list(series)
+        self._rows = {ticker: row for row, ticker in enumerate(self.tickers)}
+        self.dates: list = sorted(set().union(*(candles["time"] for candles in series.values())))
+        position = {date: index for index, date in enumerate(self.dates)}
+        # Column of each bar of each ticker, indicators are computed over the bars a ticker has, then spread.
+        self._positions = [np.fromiter((position[date] for date in series[ticker]["time"]), dtype=np.intp) for ticker in self.tickers]
+        self._columns: dict[str, np.ndarray] = {}
+        for column in COLUMNS:
+            values = np.full((len(self.tickers), len(self.dates)), np.nan)
+            for row, ticker in enumerate(self.tickers):
+                values[row, self._positions[row]] = series[ticker][column]
+            self._columns[column] = values
+        self._lock = threading.Lock()
+        self.built = time.time()
+
+    def __contains__(self, ticker: str) -> bool:
+        return ticker in self._rows
+
+    def series(self, ticker: str) -> dict[str, list]:
+        """The candles of *ticker* the panel was built from."""
+        row = self._rows[ticker]
+        positions = self._positions[row]
+        return {"time": [self.dates[position] for position in positions]} | {column: self._columns[column][row, positions].tolist() for column in COLUMNS}
+
+    def column(self, name: str) -> np.ndarray:
+        """A (tickers x dates) column: open / high / low / close / volumn, or an indicator output such as `sma_50`,
+        `macd_12_26_9_signal` or `sma_20_volumn` (an indicator of another column than close).
+
+        Raises:
+            ValueError: On an unknown column.
+        """
+        if (values := self._columns.get(name)) is not None:
+            return values
+        with self._lock:
+            if name not in self._columns:
+                self._columns.update(self._compute(name))
+            return self._columns[name]
+
+    def _compute(self, name: str) -> dict[str, np.ndarray]:
+        source = "close"
+        if match := REGEX_COLUMN_SUFFIX.fullmatch(name):
+            name, source = match.groups()
+        base = name.rsplit("_", 1)[0] if name.rsplit("_", 1)[-1] in OUTPUT_SUFFIXES else name
+        (indicator,) = parse_names(base)
+
+        outputs: dict[str, np.ndarray] = {}
+        for row, positions in enumerate(self._positions):
+            bars = {column: self._columns[column][row, positions] for column in COLUMNS}
+            bars["time"] = np.asarray(self.dates, dtype=object)[positions]
+            # Indicators of volume or open take that column as their close.
+            bars["close"] = self._columns[source][row, positions]
+            for output, values in compute(indicator, bars).items():
+                if output not in outputs:
+                    outputs[output] = np.full((len(self.tickers), len(self.dates)), np.nan)
+                outputs[output][row, positions] = values
+
+        if source != "close":
+            outputs = {f"{output}_{source}": values for output, values in outputs.items()}
+        requested = f"{name}_{source}" if source != "close" else name
+        if requested not in outputs:
+            raise ValueError(f"Unknown column {requested!r}")
+        return outputs
+
+    def index_of(self, date: Optional[str] = None) -> int:
+        """Column index of the last date up to *date*, the last date by default.
+
+        Raises:
+            ValueError: When the panel has no date up to *date*.
+        """
+        if not self.dates:
+            raise ValueError("The universe has no candles")
+        if date is None:
+            return len(self.dates) - 1
+        index = bisect.bisect_right(self.dates, date) - 1
+        if index < 0:
+            raise ValueError(f"No candle up to {date}")
+        return index
+
+
+class Expression:
+    """A filter expression compiled into a mask function over a `Panel`, see the module documentation.
+
+    Raises:
+        ValueError: On a syntax error, anything else than names, numbers, comparisons, boolean and arithmetic
+            operators, `name[bars]` and the `FUNCTIONS`, or windows reading more than `MAX_EXPRESSION_COST` values.
+    """
+
+    def __init__(self, source: str):
+        if len(source) > MAX_EXPRESSION_LENGTH:
+            raise ValueError(f"Expression longer than {MAX_EXPRESSION_LENGTH} characters")
+        try:
+            tree = ast.parse(source.strip(), mode="eval")
+        except SyntaxError as error:
+            raise ValueError(f"Invalid expression: {error.msg}") from error
+        self.source = source
+        self.names: set[str] = set()
+        self._node = tree.body
+        if (cost := self._validate(tree.body, 1)) > MAX_EXPRESSION_COST:
+            raise ValueError(f"Expression reads {cost} values per ticker, more than {MAX_EXPRESSION_COST}: use smaller or fewer nested windows")
+
+    def _validate(self, node: ast.AST, bars: int) -> int:
+        """Checks *node*, evaluated over *bars* bars, and returns how many values it reads per ticker."""
+        if isinstance(node, ast.BoolOp):
+            return sum(self._validate(value, bars) for value in node.values)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Not, ast.USub)):
+            return self._validate(node.operand, bars)
+        if isinstance(node, ast.Compare) and all(type(op) in _COMPARE for op in node.ops):
+            return sum(self._validate(value, bars) for value in (node.left, *node.comparators))
+        if isinstance(node, ast.BinOp) and type(node.op) in _ARITHMETIC:
+            return self._validate(node.left, bars) + self._validate(node.right, bars)
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+            return 0
+        if isinstance(node, ast.Name):
+            self.names.add(node.id.lower())
+            return bars
+        if isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name) and self._bars(node.slice) is not None:
+            self.names.add(node.value.id.lower())
+            return bars
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS and not node.keywords:
+            function, whole, extra = FUNCTIONS[node.func.id]
+            if len(node.args) != function.__code__.co_argcount - 2:
+                raise ValueError(f"{node.func.id} takes {function.__code__.co_argcount - 2} arguments")
+            for index in whole:
+                if not self._bars(node.args[index]):
+                    raise ValueError(f"Argument {index + 1} of {node.func.id} must be a whole number of bars from 1 to {MAX_LAG}")
+            windows = tuple(node.args[index].value for index in whole)  # type: ignore
+            # A window reads its size for each bar, its arguments are evaluated over the bars of all the windows.
+            cost = bars * sum(windows)
+            for index, argument in enumerate(node.args):
+                if index not in whole:
+                    cost += self._validate(argument, bars + extra(windows))
+            return cost
+        raise ValueError(f"Unsupported expression {ast.unparse(node)!r}")
+
+    @staticmethod
+    def _bars(node: ast.AST) -> Optional[int]:
+        if isinstance(node, ast.Constant) and type(node.value) is int and 0 <= node.value <= MAX_LAG:
+            return node.value
+        return None
+
+    def evaluate(self, panel: Panel, index: int) -> np.ndarray:
+        """Boolean mask of the tickers of *panel* matching at date column *index*, False where a value is missing."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            values = np.asarray(self._compile(self._node, panel, index)(0, 1))[:, 0]
+        if values.dtype != bool:
+            raise ValueError(f"{self.source!r} is a value, not a condition")
+        return np.broadcast_to(values, (len(panel.tickers),))
+
+    def _compile(self, node: ast.AST, panel: Panel, index: int) -> Evaluator:
+        """The `Evaluator` of *node* across the tickers."""
+        if isinstance(node, ast.BoolOp):
+            parts = [self._compile(value, panel, index) for value in node.values]
+            combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+            return lambda lag, bars: functools.reduce(combine, [part(lag, bars) for part in parts])
+        if isinstance(node, ast.UnaryOp):
+            operand = self._compile(node.operand, panel, index)
+            return (lambda lag, bars: ~operand(lag, bars).astype(bool)) if isinstance(node.op, ast.Not) else (lambda lag, bars: -operand(lag, bars))
+        if isinstance(node, ast.Compare):
+            values = [self._compile(value, panel, index) for value in (node.left, *node.comparators)]
+            ops = [_COMPARE[type(op)] for op in node.ops]
+
+            def compare(lag: int, bars: int) -> np.ndarray:
+                # Each operand once, chained comparisons share theirs. NaN compares False, a ticker without the bar or a
+                # warmed up indicator never matches.
+                operands = [value(lag, bars) for value in values]
+                return functools.reduce(np.logical_and, [op(operands[i], operands[i + 1]) for i, op in enumerate(ops)])
+
+            return compare
+        if isinstance(node, ast.BinOp):
+            left, right, op = self._compile(node.left, panel, index), self._compile(node.right, panel, index), _ARITHMETIC[type(node.op)]
+            return lambda lag, bars: op(left(lag, bars), right(lag, bars))
+        if isinstance(node, ast.Constant):
+            return lambda lag, bars: np.full((1, bars), np.float64(node.value))
+        if isinstance(node, ast.Call):
+            function, whole, _ = FUNCTIONS[node.func.id]  # type: ignore
+            arguments = [argument.value if position in whole else self._compile(argument, panel, index) for position, argument in enumerate(node.args)]  # type: ignore
+            return lambda lag, bars: function(*arguments, lag, bars)
+
+        name, offset = (node.value.id, node.slice.value) if isinstance(node, ast.Subscript) else (node.id, 0)  # type: ignore
+        column = panel.column(name.lower())
+
+        def read(lag: int, bars: int) -> np.ndarray:
+            # Date column of each bar, newest first, NaN before the first date.
+            positions = index - lag - offset - np.arange(bars)
+            selected = column[:, np.maximum(positions, 0)]
+            selected[:, positions < 0] = np.nan
+            return selected
+
+        return read
+
+
+class Screener:
+    """Keeps the panel of a universe warm: built on the first screen, then rebuilt in the background once older than
+    *refresh* seconds while the previous one keeps serving.
+
+    A ticker that could not be pulled, e.g. beyond the rate budget of the provider, keeps its candles of the previous
+    panel, and the least recently pulled tickers are pulled first: a universe larger than the budget fills in over
+    successive builds instead of the same tickers spending it every time.
+    """
+
+    def __init__(
+        self,
+        pull: Callable[[str, str, str], Optional[dict]],
+        universe: tuple[str, ...],
+        lookback_days: int = 400,
+        refresh: float = 900.0,
+        workers: int = 8,
+        warm: tuple[str, ...] = (),
+    ):
+        """
+        Args:
+            pull (Callable): `FinnHubAPI.pull_data` like function of (ticker, from_date, to_date) to daily candles.
+            universe (tuple[str, ...]): Tickers to screen.
+            lookback_days (int): Calendar days of candles to keep, enough for the longest indicator window.
+            refresh (float): Age in seconds of the panel before it is rebuilt.
+            workers (int): Tickers pulled concurrently during a build.
+            warm (tuple[str, ...]): Indicator columns computed with each build, so the filters using them never wait.
+        """
+        self.pull = pull
+        self.universe = universe
+        self.lookback_days = lookback_days
+        self.refresh = refresh
+        self.workers = workers
+        self.warm = warm
+        self._panel: Optional[Panel] = None
+        self._lock = threading.Lock()
+        self._building = False
+        # Ticker to the time it was last pulled.
+        self._pulled: dict[str, float] = {}
+
+    def build(self, previous: Optional[Panel] = None) -> Panel:
+        """A new panel of the universe, with the candles of *previous* for the tickers that could not be pulled."""
+        today = datetime.date.today()
+        from_date, to_date = str(today - datetime.timedelta(days=self.lookback_days)), str(today)
+        started = time.perf_counter()
+        order = sorted(self.universe, key=lambda ticker: self._pulled.get(ticker, 0.0))
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="screener") as executor:
+            responses = dict(zip(order, executor.map(lambda ticker: self._pull(ticker, from_date, to_date), order)))
+
+        series, kept = {}, 0
+        for ticker in self.universe:
+            if (response := responses[ticker]) is None:
+                if previous is not None and ticker in previous:
+                    series[ticker] = previous.series(ticker)
+                    kept += 1
+                continue
+            self._pulled[ticker] = time.time()
+            if response.get("time"):
+                series[ticker] = response
+        panel = Panel(series)
+        for column in self.warm:
+            panel.column(column)
+        missing = len(self.universe) - len(series)
+        logger.info("Built the panel of %s tickers in %.2fs, %s kept from the previous one, %s without candles", len(series), time.perf_counter() - started, kept, missing, extra={"fields": {"tickers": len(series), "kept": kept, "missing": missing}})
+        return panel
+
+    def _pull(self, ticker: str, from_date: str, to_date: str) -> Optional[dict]:
+        try:
+            return self.pull(ticker, from_date, to_date)
+        except UpstreamUnavailableError as error:
+            # Expected beyond the rate budget, tried again with the next build.
+            logger.debug("Pulling %s for the screener failed: %s", ticker, error)
+            return None
+        except Exception as error:  # pylint: disable=broad-except
+            logger.warning("Pulling %s for the screener failed: %s", ticker, error)
+            return None
+
+    def _rebuild(self) -> None:
+        try:
+            self._panel = self.build(self._panel)
+        except Exception as error:  # pylint: disable=broad-except
+            logger.error("Rebuilding the screener panel failed: %s", error)
+        finally:
+            self._building = False
+
+    def panel(self) -> Panel:
+        """The current panel, built now when there is none yet."""
+        with self._lock:
+            if self._panel is None:
+                self._panel = self.build()
+            elif not self._building and time.time() - self._panel.built > self.refresh:
+                self._building = True
+                threading.Thread(target=self._rebuild, name="screener-refresh", daemon=True).start()
+            return self._panel
+
+    def screen(self, expression: str, date: Optional[str] = None, columns: tuple[str, ...] = ("close",)) -> dict:
+        """
+        Tickers matching a filter expression.
+
+        Args:
+            expression (str): The filter, see the module documentation.
+            date (str, optional): Screen as of this date instead of the last one.
+            columns (tuple[str, ...]): Columns to return the values of for each match, e.g. close, sma_50.
+
+        Returns:
+            dict: date, the universe size and the matches as {"ticker": ..., column: value, ...}.
+
+        Raises:
+            ValueError: On an invalid expression, an unknown column or a date before the panel.
+        """
+        compiled = Expression(expression)
+        panel = self.panel()
+        index = panel.index_of(date)
+        mask = compiled.evaluate(panel, index)
+        rows = np.flatnonzero(mask)
+        values = {column: panel.column(column)[rows, index] for column in columns}
+        matches = [{"ticker": panel.tickers[row]} | {column: None if np.isnan(values[column][i]) else float(values[column][i]) for column in columns} for i, row in enumerate(rows)]
+        return {"date": panel.dates[index], "universe": len(panel.tickers), "matches": matches}
+
+
+def load_universe(value: Optional[str] = None) -> tuple[str, ...]:
+    """Tickers from a comma separated list or a file of one ticker per line, `DEFAULT_UNIVERSE` when empty."""
+    if not value:
+        return DEFAULT_UNIVERSE
+    text = open(value, encoding="utf-8").read() if os.path.isfile(value) else value
+    return tuple(dict.fromkeys(ticker.strip().upper() for ticker in re.split(r"[,\s]+", text) if ticker.strip()))
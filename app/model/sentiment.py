@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""Lexicon sentiment and ticker relevance of news articles, scored in batches and kept by content hash.
+
+A batch is scored at once: the tokens of every article are mapped to lexicon ids and the per-article sums are a single
+`np.bincount` over the concatenated tokens, the product of the sparse (articles x words) count matrix with the lexicon
+weights. A word within `NEGATION_WINDOW` tokens after a negation counts with the opposite sign.
+
+Scores are appended to a JSON lines file keyed by the hash of the title and text, an article already scored, whatever
+its URL, is never scored again. Per ticker daily aggregates, the average sentiment weighted by relevance, are kept up to
+date as articles are scored and read aligned to the dates of a candle series.
+"""
+from __future__ import annotations
+
+import datetime
+import hashlib
+import logging
+import math
+import threading
+from collections import defaultdict
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+import orjson
+
+from model.news_index import ticker_mentions, tokenize
+
+MODULE_NAME = "Sentiment"
+logger = logging.getLogger(MODULE_NAME)
+
+# Finance sentiment words, in the spirit of the Loughran-McDonald lists.
+POSITIVE_WORDS = """
+    achieve achieved accelerate advance advanced advantage beat beats benefit bolster boom boost breakthrough bullish
+    buyback climb climbed confident exceed exceeded exceeds expand expansion gain gained gains growth improve improved
+    improvement innovative jump jumped lead leading optimistic outperform outperformed profit profitable profitability
+    rally rallied rebound record recover recovery rise rising robust soar soared solid strong stronger strength surge
+    surged tailwind top upbeat upgrade upgraded upside win winning
+"""
+NEGATIVE_WORDS = """
+    bankruptcy bearish concern concerns crash crashed cut cuts decline declined declines default deficit delay delayed
+    disappoint disappointed disappointing downgrade downgraded downside drop dropped fail failed failure fall fell fraud
+    headwind investigation lawsuit layoff layoffs lose loss losses miss missed plunge plunged probe recall recession
+    risk risks selloff shortfall slowdown slump slumped tumble tumbled underperform volatile warning weak weaker weakness
+    worse worst writedown
+"""
+NEGATIONS = frozenset(("not", "no", "never", "without", "neither", "nor", "cannot", "isn't", "wasn't", "didn't", "doesn't", "won't"))
+NEGATION_WINDOW = 3
+# Mentions in the title weigh as many mentions in the text.
+TITLE_MENTION_WEIGHT = 3
+# Weighted mentions making the relevance of a ticker 1 - 1/e.
+RELEVANCE_SCALE = 3.0
+
+
+def content_hash(title: str, text: str) -> str:
+    """Key of an article in the score store, the same text found at two URLs is one article."""
+    return hashlib.sha256(f"{' '.join(title.split())}\n{' '.join(text.split())}".encode()).hexdigest()[:32]
+
+
+class Lexicon:
+    """Word weights as an array, with the id of every word, the last id being the weight 0 of unknown words."""
+
+    def __init__(self, weights: dict[str, float]):
+        self.ids = {word: index for index, word in enumerate(weights)}
+        self.weights = np.array([*weights.values(), 0.0])
+        self.unknown = len(weights)
+
+    @classmethod
+    def default(cls) -> Lexicon:
+        return cls({word: 1.0 for word in POSITIVE_WORDS.split()} | {word: -1.0 for word in NEGATIVE_WORDS.split()})
+
+    @classmethod
+    def load(cls, path: str | Path) -> Lexicon:
+        """A lexicon file of `word,weight` lines, negative weights for negative words."""
+        weights = {}
+        for line in Path(path).read_text(encoding="utf-8").splitlines():
+            if line.strip() and not line.startswith("#"):
+                word, weight = line.rsplit(",", 1)
+                weights[word.strip().lower()] = float(weight)
+        return cls(weights)
+
+
+def score_texts(texts: list[str], lexicon: Lexicon) -> tuple[np.ndarray, np.ndarray]:
+    """Positive and negative lexicon weight of each text, negated words counting with the opposite sign."""
+    tokens = [tokenize(text) for text in texts]
+    lengths = np.fromiter((len(item) for item in tokens), dtype=np.int64, count=len(tokens))
+    flat = [token for item in tokens for token in item]
+    if not flat:
+        return np.zeros(len(texts)), np.zeros(len(texts))
+
+    ids = np.fromiter((lexicon.ids.get(token, lexicon.unknown) for token in flat), dtype=np.int64, count=len(flat))
+    negation = np.fromiter((token in NEGATIONS for token in flat), dtype=bool, count=len(flat))
+    documents = np.repeat(np.arange(len(texts)), lengths)
+    starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+    # Position of the last negation at or before each token, only counting those of the same text.
+    positions = np.arange(len(flat))
+    last_negation = np.maximum.accumulate(np.where(negation, positions, -1))
+    negated = ~negation & (last_negation >= starts) & (positions - last_negation <= NEGATION_WINDOW)
+
+    weights = lexicon.weights[ids] * np.where(negated, -1.0, 1.0)
+    positive = np.bincount(documents, weights=np.maximum(weights, 0.0), minlength=len(texts))
+    negative = np.bincount(documents, weights=np.maximum(-weights, 0.0), minlength=len(texts))
+    return positive, negative
+
+
+def relevance(title: str, text: str, known: Iterable[str] = ()) -> dict[str, float]:
+    """Relevance in (0, 1) of each ticker the article mentions, growing with its mentions, those in the title first."""
+    in_title, in_text = ticker_mentions(title, known), ticker_mentions(text, known)
+    return {ticker: round(1.0 - math.exp(-(TITLE_MENTION_WEIGHT * in_title[ticker] + in_text[ticker]) / RELEVANCE_SCALE), 4) for ticker in sorted(set(in_title) | set(in_text))}
+
+
+class SentimentStore:
+    """Scores batches of articles once each, and keeps the per ticker daily sentiment."""
+
+    def __init__(self, path: str | Path, lexicon: Optional[Lexicon] = None, known_tickers: Iterable[str] = ()):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lexicon = lexicon or Lexicon.default()
+        self.known_tickers = frozenset(known_tickers)
+        self.scores: dict[str, dict] = {}
+        # Ticker to day to [relevance weighted sentiment, relevance, articles].
+        self._daily: dict[str, dict[str, list[float]]] = defaultdict(dict)
+        self._lock = threading.Lock()
+        if self.path.exists():
+            with self.path.open("rb") as file:
+                for line in file:
+                    if line.strip():
+                        self._keep(orjson.loads(line))
+        logger.info("Loaded %s article scores", len(self.scores))
+
+    def _keep(self, score: dict) -> None:
+        self.scores[score["hash"]] = score
+        for ticker, weight in score["tickers"].items():
+            day = self._daily[ticker].setdefault(score["day"], [0.0, 0.0, 0])
+            day[0] += weight * score["sentiment"]
+            day[1] += weight
+            day[2] += 1
+
+    def score_batch(self, articles: list[dict]) -> list[dict]:
+        """
+        Score articles shaped as `NewsAPI.get_article_data`, plus their `url`, only those never scored before.
+
+        Returns:
+            list[dict]: The score of each article, in order: hash, url, day, sentiment in [-1, 1], positive and negative
+            lexicon weights, and the relevance of each mentioned ticker.
+        """
+        hashes = [content_hash(article["title"] or "", article["text"] or "") for article in articles]
+        new: dict[str, dict] = {}
+        with self._lock:
+            for key, article in zip(hashes, articles):
+                if key not in self.scores:
+                    new.setdefault(key, article)
+        if new:
+            texts = [f"{article['title'] or ''}\n{article['text'] or ''}" for article in new.values()]
+            positive, negative = score_texts(texts, self.lexicon)
+            today = datetime.date.today().isoformat()
+            scored = []
+            for index, (key, article) in enumerate(new.items()):
+                published = article.get("publish_date")
+                total = positive[index] + negative[index]
+                scored.append(
+                    {
+                        "hash": key,
+                        "url": article.get("url"),
+                        # Articles without a publish date count on the day they were scored.
+                        "day": str(published)[:10] if published else today,
+                        "sentiment": round(float((positive[index] - negative[index]) / total), 4) if total else 0.0,
+                        "positive": float(positive[index]),
+                        "negative": float(negative[index]),
+                        "tickers": relevance(article["title"] or "", article["text"] or "", self.known_tickers),
+                    }
+                )
+            with self._lock:
+                scored = [score for score in scored if score["hash"] not in self.scores]
+                with self.path.open("ab") as file:
+                    file.write(b"".join(orjson.dumps(score) + b"\n" for score in scored))
+                for score in scored:
+                    self._keep(score)
+            logger.info("Scored %s new articles of a batch of %s", len(scored), len(articles), extra={"fields": {"scored": len(scored), "batch": len(articles)}})
+
+        with self._lock:
+            return [self.scores[key] for key in hashes]
+
+    def daily(self, ticker: str, dates: Optional[list[str]] = None) -> dict[str, list]:
+        """
+        Daily sentiment of a ticker: the average sentiment of its articles weighted by their relevance, and their count.
+
+        Args:
+            ticker (str): The ticker.
+            dates (list[str], optional): Dates (YYYY-MM-DD) to align to, e.g. the `time` of a candle series, None
+                sentiment and 0 articles on the days without news. Every day with news by default.
+
+        Returns:
+            dict[str, list]: `date`, `sentiment` and `articles`, one value per date.
+        """
+        with self._lock:
+            days = dict(self._daily.get(ticker.upper(), {}))
+        dates = [str(date)[:10] for date in dates] if dates is not None else sorted(days)
+        sentiment, count = [], []
+        for date in dates:
+            weighted, weight, articles = days.get(date, (0.0, 0.0, 0))
+            sentiment.append(round(weighted / weight, 4) if weight else None)
+            count.append(articles)
+        return {"date": dates, "sentiment": sentiment, "articles": count}
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import asyncio
+import datetime
+import logging
+
+from constant import Message
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from helpers.resilience import UpstreamUnavailableError
+from helpers.utility import PoolSaturatedError, Utility
+from model.api.finnhub import FinnHubAPI
+from model.api.yahoo import YahooFinanceAPI
+from model.backtest import BACKTEST_ENGINE, BARS_PER_YEAR, configurations
+from model.data.backtest_api import BacktestInput, BacktestOutput
+
+MODULE_NAME = "Backtest"
+
+unblock = Utility.unblock_custom(MODULE_NAME, max_workers=7)
+
+router = APIRouter(prefix="/api/shelby-backend", tags=["Backtest"])
+logger = logging.getLogger(MODULE_NAME)
+
+finnhub = FinnHubAPI()
+yahoo = YahooFinanceAPI()
+
+
+def pull_closes(request: BacktestInput, ticker: str) -> list[float] | None:
+    """Closes of a ticker, oldest first, None when the provider has none.
+
+    Raises:
+        UpstreamUnavailableError: When the provider could not be pulled, the ticker may well have candles.
+    """
+    if request.source == "yahoo":
+        try:
+            closes = yahoo.pull_data(ticker, request.period, request.resolution)["Close"]
+        except LookupError as error:
+            logger.warning("No candles of %s: %s", ticker, error)
+            return None
+    else:
+        closes = finnhub.pull_columns(ticker, request.from_date, request.end_date, request.resolution)["close"]
+    return closes or None
+
+
+@router.post(
+    "/backtest/sweep",
+    response_model=BacktestOutput,
+    responses={
+        400: {"model": Message},
+        401: {"model": Message},
+        500: {"model": Message},
+        503: {"model": Message},
+    },
+)
+async def sweeping(request: BacktestInput):
+    """Backtest every configuration of the grid over the candles of every ticker, best results first."""
+    if request.source == "finnhub" and not (request.from_date and request.end_date):
+        return JSONResponse(status_code=400, content={"message": "from_date and end_date are required for FinnHub"})
+    try:
+        if request.source == "finnhub":
+            datetime.date.fromisoformat(request.from_date)
+            datetime.date.fromisoformat(request.end_date)
+        configs = configurations(request.strategy, request.grid)
+    except ValueError as error:
+        return JSONResponse(status_code=400, content={"message": str(error)})
+
+    try:
+        tickers = list(dict.fromkeys(ticker.upper() for ticker in request.tickers))
+        closes = await asyncio.gather(*(unblock(pull_closes, request, ticker) for ticker in tickers))
+        series = {ticker: values for ticker, values in zip(tickers, closes) if values}
+        results = await unblock(BACKTEST_ENGINE.sweep, series, request.strategy, request.grid, request.fee, BARS_PER_YEAR[request.resolution], request.top, request.sort_by)
+
+        return BacktestOutput(configurations=len(configs), tickers=list(series), missing=[ticker for ticker in tickers if ticker not in series], results=results)
+
+    except ValueError as error:
+        return JSONResponse(status_code=400, content={"message": str(error)})
+
+    except (PoolSaturatedError, UpstreamUnavailableError) as error:
+        logger.warning(str(error))
+        return JSONResponse(status_code=503, content={"message": str(error)})
+
+    except Exception as error:
+        logger.error(Utility.format_exception(error))
+        return JSONResponse(status_code=500, content={"message": str(error)})
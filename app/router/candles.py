@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import datetime
+import logging
+import os
+
+from constant import Message
+from fastapi import APIRouter, Form
+from fastapi.responses import JSONResponse
+from helpers.resilience import UpstreamUnavailableError, pulled_upstream
+from helpers.utility import PoolSaturatedError, Utility
+from model.api.finnhub import FinnHubAPI
+from model.api.yahoo import YahooFinanceAPI
+from model.data.finance_api import HedgedCandlesOutput
+from model.hedging import CANDLE_COLUMNS, HedgedCandles, Provider
+from model.indicators import INDICATOR_CACHE, parse_names, series_key
+
+MODULE_NAME = "Candles"
+
+unblock = Utility.unblock_custom(MODULE_NAME, max_workers=7)
+
+router = APIRouter(prefix="/api/shelby-backend", tags=["Candles"])
+logger = logging.getLogger(MODULE_NAME)
+
+finnhub = FinnHubAPI()
+yahoo = YahooFinanceAPI()
+
+
+def pull_finnhub(ticker: str, from_date: str, to_date: str) -> tuple[dict[str, list], bool]:
+    response = finnhub.pull_columns(ticker, from_date, to_date, "D")
+    return {column: response[column] for column in CANDLE_COLUMNS}, pulled_upstream()
+
+
+def pull_yahoo(ticker: str, from_date: str, to_date: str) -> tuple[dict[str, list], bool]:
+    # Yahoo histories reach back from today, long enough to cover the first date.
+    days = (datetime.date.today() - datetime.date.fromisoformat(from_date)).days + 1
+    response = yahoo.pull_data(ticker, f"{max(days, 1)}d", "D")
+    called = pulled_upstream()
+    dates = [str(day) for day in response["Date"]]
+    keep = [index for index, day in enumerate(dates) if from_date <= day <= to_date]
+    columns = {"time": dates, "open": response["Open"], "high": response["High"], "low": response["Low"], "close": response["Close"], "volumn": response["Volume"]}
+    return {column: [values[index] for index in keep] for column, values in columns.items()}, called
+
+
+hedged_candles = HedgedCandles(
+    {
+        Provider.FINNHUB: lambda ticker, from_date, to_date: unblock(pull_finnhub, ticker, from_date, to_date),
+        Provider.YAHOO: lambda ticker, from_date, to_date: unblock(pull_yahoo, ticker, from_date, to_date),
+    },
+    initial_delay=float(os.environ.get("HEDGE_INITIAL_DELAY_MS", 500)) / 1000,
+    min_delay=float(os.environ.get("HEDGE_MIN_DELAY_MS", 50)) / 1000,
+)
+
+
+@router.post(
+    "/candles/pull-data",
+    response_model=HedgedCandlesOutput,
+    response_model_exclude_none=True,
+    responses={
+        400: {"model": Message},
+        404: {"model": Message},
+        500: {"model": Message},
+        503: {"model": Message},
+    },
+)
+async def pulling_candles(
+    ticker: str = Form(..., description="Name of the ticker to pull data"),
+    from_date: str = Form(..., description="Start date to pull (YYYY-MM-DD)"),
+    end_date: str = Form(..., description="End date to pull (YYYY-MM-DD), included"),
+    prefer: Provider = Form(Provider.FINNHUB, description="Provider asked first, the other one is only asked when it is slow or fails"),
+    indicators: str = Form("", description="Comma separated indicators to add, e.g. sma_50,ema_20,rsi_14,macd_12_26_9,bbands_20_2,atr_14,vwap"),
+):
+    """Daily candles from FinnHub or Yahoo, whichever answers first, in the same schema."""
+    try:
+        names = parse_names(indicators)
+        datetime.date.fromisoformat(from_date)
+        datetime.date.fromisoformat(end_date)
+    except ValueError as error:
+        return JSONResponse(status_code=400, content={"message": str(error)})
+
+    try:
+        provider, hedged, candles = await hedged_candles.pull(ticker, from_date, end_date, prefer)
+        columns = await unblock(INDICATOR_CACHE.get, series_key(provider, ticker, "D", candles["time"]), candles, names) if names else None
+
+        return HedgedCandlesOutput(
+            close=candles["close"],
+            open=candles["open"],
+            high=candles["high"],
+            low=candles["low"],
+            volumn=candles["volumn"],
+            date=candles["time"],
+            indicators=columns,
+            provider=provider,
+            hedged=hedged,
+        )
+
+    except LookupError as error:
+        return JSONResponse(status_code=404, content={"message": str(error)})
+
+    except (PoolSaturatedError, UpstreamUnavailableError) as error:
+        logger.warning(str(error))
+        return JSONResponse(status_code=503, content={"message": str(error)})
+
+    except Exception as error:
+        logger.error(Utility.format_exception(error))
+        return JSONResponse(status_code=500, content={"message": str(error)})
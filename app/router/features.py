@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import logging
+import math
+
+from constant import Message
+from fastapi import APIRouter, Query
+from fastapi.responses import JSONResponse
+from model.feature_store import FEATURE_STORE
+
+MODULE_NAME = "Features"
+
+router = APIRouter(prefix="/api/shelby-backend", tags=["Features"])
+logger = logging.getLogger(MODULE_NAME)
+
+
+@router.get("/features/{ticker}", responses={404: {"model": Message}})
+async def latest_features(
+    ticker: str,
+    as_of: int | None = Query(None, description="UNIX seconds, only the bars that had reached the data lake at that time"),
+    limit: int = Query(1, ge=1, le=1000, description="Rows to return, most recent last"),
+):
+    """The materialized feature rows of a ticker, the same values the training jobs read from the store."""
+    columns = FEATURE_STORE.read(ticker, as_of)
+    if not columns or not len(columns["time"]):
+        return JSONResponse(status_code=404, content={"message": f"No features of {ticker}"})
+
+    rows = len(columns["time"])
+    return {
+        "ticker": ticker.upper(),
+        "rows": [{name: None if isinstance(value := values[row].item(), float) and math.isnan(value) else value for name, values in columns.items()} for row in range(max(0, rows - limit), rows)],
+    }
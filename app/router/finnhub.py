@@ -1,14 +1,18 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
+import datetime
 import logging
 
 from constant import Message
 from fastapi import APIRouter, Form
 from fastapi.responses import JSONResponse
-from helpers.utility import Utility
+from helpers.resilience import UpstreamUnavailableError
+from helpers.utility import PoolSaturatedError, Utility
+from model.api.bars import Resolution
 from model.api.finnhub import FinnHubAPI
 from model.data.finance_api import FinanceAPIOutput
+from model.indicators import parse_names
 
 MODULE_NAME = "FinnHub"
 
@@ -23,17 +27,58 @@ finnhub = FinnHubAPI()
 @router.post(
     "/finnhub/pull-data",
     response_model=FinanceAPIOutput,
+    response_model_exclude_none=True,
     responses={
+        400: {"model": Message},
         401: {"model": Message},
         500: {"model": Message},
+        503: {"model": Message},
     },
 )
-async def pulling_data(ticker: str = Form(..., description="Name of the ticker to pull data"), from_date: str = Form(..., description="Start date to pull"), end_date: str = Form(..., description="End date to pull")):
+async def pulling_data(
+    ticker: str = Form(..., description="Name of the ticker to pull data"),
+    from_date: str = Form(..., description="Start date to pull"),
+    end_date: str = Form(..., description="End date to pull"),
+    resolution: Resolution = Form(Resolution.DAY, description="Bar size, switching it reuses the already pulled series"),
+    indicators: str = Form("", description="Comma separated indicators to add, e.g. sma_50,ema_20,rsi_14,macd_12_26_9,bbands_20_2,atr_14,vwap"),
+):
     try:
-        response = await unblock(finnhub.pull_data, ticker, from_date, end_date)
+        names = parse_names(indicators)
+        datetime.date.fromisoformat(from_date)
+        datetime.date.fromisoformat(end_date)
+    except ValueError as error:
+        return JSONResponse(status_code=400, content={"message": str(error)})
 
-        return FinanceAPIOutput(close=response["close"], open=response["open"], high=response["high"], low=response["low"], volumn=response["volumn"], date=response["time"])
+    try:
+        response = await unblock(finnhub.pull_columns, ticker, from_date, end_date, resolution)
+        columns = await unblock(finnhub.compute_indicators, ticker, resolution, response, names) if names else None
+
+        return FinanceAPIOutput(close=response["close"], open=response["open"], high=response["high"], low=response["low"], volumn=response["volumn"], date=response["time"], indicators=columns)
+
+    except (PoolSaturatedError, UpstreamUnavailableError) as error:
+        logger.warning(str(error))
+        return JSONResponse(status_code=503, content={"message": str(error)})
 
     except Exception as error:
         logger.error(Utility.format_exception(error))
         return JSONResponse(status_code=500, content={"message": str(error)})
+
+
+@router.post(
+    "/finnhub/pull-data/page",
+    responses={
+        400: {"model": Message},
+        401: {"model": Message},
+        500: {"model": Message},
+        503: {"model": Message},
+    },
+)
+@Utility.exception_guard
+async def pulling_data_page(
+    ticker: str = Form(..., description="Name of the ticker to pull data"),
+    from_date: str = Form(..., description="Start date to pull"),
+    end_date: str = Form(..., description="End date to pull"),
+    cursor: str | None = Form(None, description="`nextCursor` of the previous page, empty for the first page"),
+    page_size: int = Form(100, ge=1, le=1000, description="Maximum number of candles in the page"),
+):
+    return await unblock(finnhub.pull_data_page, ticker, from_date, end_date, cursor, page_size)
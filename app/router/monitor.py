@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import logging
+import os
+
+from constant import Message
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
+from helpers.metrics import METRICS
+from helpers.profiler import PROFILER
+from helpers.utility import Utility
+
+MODULE_NAME = "Monitor"
+
+router = APIRouter(prefix="/api/shelby-backend", tags=["Monitor"])
+# Scrapers expect the metrics at the root of the app.
+metrics_router = APIRouter(tags=["Monitor"])
+logger = logging.getLogger(MODULE_NAME)
+
+
+async def require_admin(x_admin_token: str | None = Header(None)):
+    """When ADMIN_TOKEN is set, only requests carrying it in the X-Admin-Token header are let through."""
+    if (token := os.environ.get("ADMIN_TOKEN")) and x_admin_token != token:
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+@router.get("/monitor/pools")
+async def pool_stats():
+    """Workers, active / queued / completed / rejected counters and wait / run time percentiles of every pool."""
+    return Utility.pool.snapshot()
+
+
+@metrics_router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Latency histograms, error counters and in-flight gauges of the routes, upstream providers and pools, in the Prometheus text format."""
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/monitor/profiles", dependencies=[Depends(require_admin)], responses={401: {"model": Message}})
+async def profiles():
+    """Slow calls caught by the sampling profiler (PROFILING=1), most recent last."""
+    return {"enabled": PROFILER.enabled, "threshold": PROFILER.threshold, "profiles": [session.summary() for session in PROFILER.profiles]}
+
+
+@router.get("/monitor/profiles/{profile_id}", dependencies=[Depends(require_admin)], responses={401: {"model": Message}, 404: {"model": Message}})
+async def profile(profile_id: int):
+    """Download the collapsed stacks of a profile, to feed to flamegraph.pl or speedscope."""
+    if not (session := PROFILER.get(profile_id)):
+        return JSONResponse(status_code=404, content={"message": "Profile not found"})
+
+    return PlainTextResponse(session.collapsed(), headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.folded"'})
@@ -1,14 +1,20 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
+import datetime
 import logging
+import os
 
 from constant import Message
-from fastapi import APIRouter, Form
+from fastapi import APIRouter, Form, Query
 from fastapi.responses import JSONResponse
-from helpers.utility import Utility
+from helpers.utility import PoolSaturatedError, Utility
 from model.api.news import NewsAPI
-from model.data.news_api import NewsArticleOutput
+from model.dedup import DuplicateIndex
+from model.data.news_api import NewsArticleOutput, NewsSearchOutput, NewsSentimentOutput
+from model.news_index import NewsIndex
+from model.screener import load_universe
+from model.sentiment import Lexicon, SentimentStore
 
 MODULE_NAME = "News"
 
@@ -17,6 +23,43 @@ unblock = Utility.unblock_custom(MODULE_NAME, max_workers=7)
 router = APIRouter(prefix="/api/shelby-backend", tags=["News"])
 logger = logging.getLogger(MODULE_NAME)
 
+# Scraped articles are kept, indexed and scored, tickers of the screener universe are recognized without a cashtag.
+NEWS_INDEX_PATH = os.environ.get("NEWS_INDEX_PATH", "news_index")
+known_tickers = load_universe(os.environ.get("SCREENER_UNIVERSE"))
+news_index = NewsIndex(NEWS_INDEX_PATH, known_tickers=known_tickers)
+sentiment = SentimentStore(
+    os.path.join(NEWS_INDEX_PATH, "sentiment.jsonl"),
+    lexicon=Lexicon.load(lexicon_path) if (lexicon_path := os.environ.get("NEWS_LEXICON")) else None,
+    known_tickers=known_tickers,
+)
+duplicates = DuplicateIndex(os.path.join(NEWS_INDEX_PATH, "duplicates"), threshold=float(os.environ.get("NEWS_DUPLICATE_THRESHOLD", 0.8)))
+
+
+def store_articles(articles: list[dict]) -> None:
+    """
+    Keep a batch of scraped articles, shaped as `NewsAPI.get_article_data` plus their `url`, and score them.
+
+    Articles already kept, or near-duplicates of one, e.g. the same wire story syndicated by another site, are only
+    recorded as aliases of the kept article.
+    """
+    new = []
+    for article in articles:
+        canonical, values = duplicates.check(article["url"], f"{article['title'] or ''}\n{article['text'] or ''}")
+        if canonical is not None:
+            continue
+        news_index.add(article["url"], article["title"], article["text"], article["authors"], article["publish_date"])
+        # Registered once stored, a failed add leaves the URL unknown and scraped again next time.
+        if values is not None:
+            duplicates.register(article["url"], values)
+        new.append(article)
+    sentiment.score_batch(new)
+
+
+def stored_article(url: str) -> dict | None:
+    """The kept article of a URL, or of the article it duplicates, None when it was never scraped."""
+    canonical = duplicates.resolve(url)
+    return news_index.get(canonical) if canonical is not None else None
+
 
 @router.post(
     "/news/pull-data",
@@ -30,11 +73,15 @@ async def pulling_data(
     url: str = Form(..., description="News URL to pull data"),
 ):
     try:
+        if (article := await unblock(stored_article, url)) is not None:
+            return NewsArticleOutput(title=article["title"], authors=article["authors"], text=article["text"])
+
         news_api = NewsAPI()
         news_api.pull_data(url)
         article_data = news_api.get_article_data()
 
         if article_data:
+            await unblock(store_articles, [article_data | {"url": url}])
             output_data = NewsArticleOutput(
                 title=article_data["title"],
                 authors=article_data["authors"],
@@ -48,3 +95,64 @@ async def pulling_data(
     except Exception as error:
         logger.error(Utility.format_exception(error))
         return JSONResponse(status_code=500, content={"message": str(error)})
+
+
+@router.post(
+    "/news/pull-data/page",
+    responses={
+        400: {"model": Message},
+        401: {"model": Message},
+        500: {"model": Message},
+        503: {"model": Message},
+    },
+)
+@Utility.exception_guard
+async def pulling_data_page(
+    urls: list[str] = Form(..., description="News URLs to pull data, in paging order"),
+    cursor: str | None = Form(None, description="`nextCursor` of the previous page, empty for the first page"),
+    page_size: int = Form(10, ge=1, le=100, description="Maximum number of articles in the page"),
+):
+    page = await unblock(NewsAPI().pull_data_page, urls, cursor, page_size)
+    await unblock(store_articles, [{"url": article.url, "title": article.title, "text": article.text, "authors": article.authors, "publish_date": article.publish_date} for article in page.data])
+    return page
+
+
+@router.get(
+    "/news/search",
+    response_model=NewsSearchOutput,
+    responses={
+        500: {"model": Message},
+        503: {"model": Message},
+    },
+)
+async def searching(
+    q: str = Query("", description="Words to look for in the titles and texts, most relevant first. Without it, most recent first"),
+    tickers: list[str] = Query([], description="Only the articles mentioning one of these tickers"),
+    since: datetime.datetime | None = Query(None, description="Only the articles published since then"),
+    until: datetime.datetime | None = Query(None, description="Only the articles published until then"),
+    limit: int = Query(20, ge=1, le=200, description="Most articles to return"),
+):
+    """Search the scraped articles, e.g. all the TSLA news of the week: `?tickers=TSLA&since=2024-05-06`."""
+    try:
+        results = await unblock(news_index.search, q, tickers, since, until, limit)
+        return NewsSearchOutput(total=len(news_index), results=results)
+
+    except PoolSaturatedError as error:
+        logger.warning(str(error))
+        return JSONResponse(status_code=503, content={"message": str(error)})
+
+    except Exception as error:
+        logger.error(Utility.format_exception(error))
+        return JSONResponse(status_code=500, content={"message": str(error)})
+
+
+@router.get("/news/sentiment/{ticker}", response_model=NewsSentimentOutput)
+async def daily_sentiment(
+    ticker: str,
+    from_date: str | None = Query(None, description="First day (YYYY-MM-DD)"),
+    end_date: str | None = Query(None, description="Last day (YYYY-MM-DD)"),
+):
+    """Daily sentiment of the scraped articles mentioning a ticker, averaged by relevance, on the days with news."""
+    days = sentiment.daily(ticker)
+    keep = [index for index, date in enumerate(days["date"]) if (from_date is None or date >= from_date) and (end_date is None or date <= end_date)]
+    return NewsSentimentOutput(ticker=ticker.upper(), **{column: [values[index] for index in keep] for column, values in days.items()})
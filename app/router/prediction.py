@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import datetime
+import logging
+import math
+import os
+
+from constant import Message
+from fastapi import APIRouter, Form
+from fastapi.responses import JSONResponse
+from helpers.resilience import UpstreamUnavailableError
+from helpers.utility import PoolSaturatedError, Utility
+from model.api.finnhub import FinnHubAPI
+from model.data.prediction_api import PredictionOutput
+from model.feature_store import FEATURE_STORE
+from model.prediction import MicroBatcher, features, load_predictor
+
+MODULE_NAME = "Prediction"
+
+unblock = Utility.unblock_custom(MODULE_NAME, max_workers=7)
+
+router = APIRouter(prefix="/api/shelby-backend", tags=["Prediction"])
+logger = logging.getLogger(MODULE_NAME)
+
+finnhub = FinnHubAPI()
+
+batcher = MicroBatcher(
+    load_predictor(os.environ.get("PREDICTION_MODEL")),
+    max_batch=int(os.environ.get("PREDICTION_MAX_BATCH", 64)),
+    max_wait=float(os.environ.get("PREDICTION_MAX_WAIT_MS", 5)) / 1000,
+)
+
+
+def feature_row(ticker: str, from_date: str, end_date: str):
+    """Daily candles of the ticker and the feature row of its last bar, from the feature store when it has the bar."""
+    response = finnhub.pull_columns(ticker, from_date, end_date, "D")
+    if not response["time"]:
+        raise LookupError(f"No candles of {ticker} from {from_date} to {end_date}")
+    return response, features(FEATURE_STORE, ticker, response)
+
+
+@router.post(
+    "/prediction/predict",
+    response_model=PredictionOutput,
+    responses={
+        400: {"model": Message},
+        401: {"model": Message},
+        404: {"model": Message},
+        500: {"model": Message},
+        503: {"model": Message},
+    },
+)
+async def predicting(
+    ticker: str = Form(..., description="Name of the ticker to predict"),
+    from_date: str = Form(..., description="Start date of the daily candles the features are computed from, enough history for them when the store lacks the last bar"),
+    end_date: str = Form(..., description="End date of the candles, the prediction is for the bar after it"),
+):
+    try:
+        datetime.date.fromisoformat(from_date)
+        datetime.date.fromisoformat(end_date)
+    except ValueError as error:
+        return JSONResponse(status_code=400, content={"message": str(error)})
+
+    try:
+        response, row = await unblock(feature_row, ticker, from_date, end_date)
+        predicted = await batcher.predict(row)
+        close = response["close"][-1]
+
+        return PredictionOutput(
+            ticker=ticker,
+            date=response["time"][-1],
+            close=close,
+            predicted_return=math.expm1(predicted),
+            predicted_close=close * math.exp(predicted),
+            model=batcher.predictor.name,
+        )
+
+    except ValueError as error:
+        return JSONResponse(status_code=400, content={"message": str(error)})
+
+    except LookupError as error:
+        return JSONResponse(status_code=404, content={"message": str(error)})
+
+    except (PoolSaturatedError, UpstreamUnavailableError) as error:
+        logger.warning(str(error))
+        return JSONResponse(status_code=503, content={"message": str(error)})
+
+    except Exception as error:
+        logger.error(Utility.format_exception(error))
+        return JSONResponse(status_code=500, content={"message": str(error)})
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import logging
+import os
+
+from constant import Message
+from fastapi import APIRouter, Form
+from fastapi.responses import JSONResponse
+from helpers.utility import PoolSaturatedError, Utility
+from model.api.finnhub import FinnHubAPI
+from model.data.screener_api import ScreenerOutput
+from model.screener import Screener, load_universe
+
+MODULE_NAME = "Screener"
+
+unblock = Utility.unblock_custom(MODULE_NAME, max_workers=7)
+
+router = APIRouter(prefix="/api/shelby-backend", tags=["Screener"])
+logger = logging.getLogger(MODULE_NAME)
+
+finnhub = FinnHubAPI()
+
+
+def pull_daily(ticker: str, from_date: str, to_date: str) -> dict:
+    """Daily candles through `FINNHUB_UPSTREAM`, so the builds of the screener share its cache, circuit and rate budget."""
+    response = finnhub.pull_candles(ticker, finnhub.convert_date_to_unix(from_date), finnhub.convert_date_to_unix(to_date) + 86399, "D")
+    return finnhub.clean_data(response, "D")
+
+
+screener = Screener(
+    pull_daily,
+    load_universe(os.environ.get("SCREENER_UNIVERSE")),
+    lookback_days=int(os.environ.get("SCREENER_LOOKBACK_DAYS", 400)),
+    refresh=float(os.environ.get("SCREENER_REFRESH_SECONDS", 900)),
+    warm=tuple(filter(None, os.environ.get("SCREENER_WARM", "sma_20,sma_50,sma_200,rsi_14").split(","))),
+)
+
+
+@router.post(
+    "/screener/screen",
+    response_model=ScreenerOutput,
+    responses={
+        400: {"model": Message},
+        401: {"model": Message},
+        500: {"model": Message},
+        503: {"model": Message},
+    },
+)
+async def screening(
+    expression: str = Form(..., description="Filter, e.g. `cross_above(close, sma_50) and rsi_14 < 70`"),
+    date: str | None = Form(None, description="Screen as of this date (YYYY-MM-DD) instead of the last one"),
+    columns: str = Form("close", description="Comma separated columns to return for each match, e.g. close,sma_50,rsi_14"),
+):
+    try:
+        names = tuple(dict.fromkeys(filter(None, (name.strip().lower() for name in columns.split(",")))))
+        return await unblock(screener.screen, expression, date, names)
+
+    except ValueError as error:
+        return JSONResponse(status_code=400, content={"message": str(error)})
+
+    except PoolSaturatedError as error:
+        logger.warning(str(error))
+        return JSONResponse(status_code=503, content={"message": str(error)})
+
+    except Exception as error:
+        logger.error(Utility.format_exception(error))
+        return JSONResponse(status_code=500, content={"message": str(error)})
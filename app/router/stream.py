@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+
+import streamlit as st
+from fastapi import APIRouter, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from model.api.stream import FeedHub, FinnHubTickSource, ReplayTickSource
+
+MODULE_NAME = "Stream"
+
+router = APIRouter(prefix="/api/shelby-backend", tags=["Stream"])
+logger = logging.getLogger(MODULE_NAME)
+
+# TICK_REPLAY_FILE replays recorded ticks instead of subscribing to FinnHub, e.g. for local development.
+if replay_file := os.environ.get("TICK_REPLAY_FILE"):
+    source = ReplayTickSource(replay_file, speed=float(os.environ.get("TICK_REPLAY_SPEED", 1)))
+else:
+    source = FinnHubTickSource(st.secrets["FINNHUB_API_KEY"])
+
+hub = FeedHub(source, bar_seconds=int(os.environ.get("STREAM_BAR_SECONDS", 60)))
+
+
+async def send_updates(websocket: WebSocket, queue: asyncio.Queue) -> None:
+    while True:
+        await websocket.send_text((await queue.get()).decode())
+
+
+async def wait_disconnect(websocket: WebSocket) -> None:
+    """Read and drop whatever the client sends, raises WebSocketDisconnect once it is gone."""
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+
+
+@router.websocket("/stream/{ticker}")
+async def stream_websocket(websocket: WebSocket, ticker: str):
+    """Live bars of a ticker: the current bar, then only the fields that changed, one JSON message per update."""
+    await websocket.accept()
+    try:
+        async with hub.subscribe(ticker.upper()) as queue:
+            # Sending alone never notices a client gone while no update comes, so its subscription would never end.
+            tasks = {asyncio.create_task(send_updates(websocket, queue)), asyncio.create_task(wait_disconnect(websocket))}
+            try:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+            for task in done:
+                task.result()
+    except WebSocketDisconnect:
+        pass
+
+
+@router.get("/stream/{ticker}/sse")
+async def stream_sse(ticker: str, heartbeat: float = Query(15.0, gt=0, description="Seconds between keep-alive comments when no update comes")):
+    """Live bars of a ticker as Server-Sent Events, same messages as the websocket."""
+
+    async def events():
+        async with hub.subscribe(ticker.upper()) as queue:
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+                    continue
+                yield b"data: " + message + b"\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -6,9 +6,12 @@ import logging
 from constant import Message
 from fastapi import APIRouter, Form
 from fastapi.responses import JSONResponse
-from helpers.utility import Utility
+from helpers.resilience import UpstreamUnavailableError
+from helpers.utility import PoolSaturatedError, Utility
+from model.api.bars import Resolution
 from model.api.yahoo import YahooFinanceAPI
 from model.data.finance_api import FinanceAPIOutput
+from model.indicators import parse_names
 
 MODULE_NAME = "Yahoo"
 
@@ -23,18 +26,38 @@ yahoo = YahooFinanceAPI()
 @router.post(
     "/yahoo/pull-data",
     response_model=FinanceAPIOutput,
+    response_model_exclude_none=True,
     responses={
+        400: {"model": Message},
         401: {"model": Message},
+        404: {"model": Message},
         500: {"model": Message},
+        503: {"model": Message},
     },
 )
 async def pulling_data(
     ticker: str = Form(..., description="Name of the ticker to pull data"),
+    period: str = Form("30d", description="How far back to pull, e.g. 5d, 1mo, 1y, max"),
+    resolution: Resolution = Form(Resolution.DAY, description="Bar size, switching it reuses the already pulled series"),
+    indicators: str = Form("", description="Comma separated indicators to add, e.g. sma_50,ema_20,rsi_14,macd_12_26_9,bbands_20_2,atr_14,vwap"),
 ):
     try:
-        response = await unblock(yahoo.pull_data, ticker)
+        names = parse_names(indicators)
+    except ValueError as error:
+        return JSONResponse(status_code=400, content={"message": str(error)})
 
-        return FinanceAPIOutput(close=response["Close"], open=response["Open"], high=response["High"], low=response["Low"], volumn=response["Volume"], date=response["Date"])
+    try:
+        response = await unblock(yahoo.pull_data, ticker, period, resolution)
+        columns = await unblock(yahoo.compute_indicators, ticker, resolution, response, names) if names else None
+
+        return FinanceAPIOutput(close=response["Close"], open=response["Open"], high=response["High"], low=response["Low"], volumn=response["Volume"], date=response["Date"], indicators=columns)
+
+    except LookupError as error:
+        return JSONResponse(status_code=404, content={"message": str(error)})
+
+    except (PoolSaturatedError, UpstreamUnavailableError) as error:
+        logger.warning(str(error))
+        return JSONResponse(status_code=503, content={"message": str(error)})
 
     except Exception as error:
         logger.error(Utility.format_exception(error))
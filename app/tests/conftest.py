@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+from pathlib import Path
+
+# The modules import each other from the app folder, and read their settings when imported.
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+for name in ("FINNHUB_API_KEY", "AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"):
+    os.environ.setdefault(name, "test")
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+
+from model.backtest import BacktestEngine, configurations
+from model.data.backtest_api import BacktestInput, BacktestResult
+
+
+def test_grid_keeps_fractional_values():
+    request = BacktestInput(tickers=["AAPL"], strategy="bollinger_reversion", grid={"period": [20], "width": [1.5, 2]})
+    assert request.grid == {"period": [20], "width": [1.5, 2]}
+    assert isinstance(request.grid["period"][0], int)
+    assert [config["width"] for config in configurations(request.strategy, request.grid)] == [1.5, 2]
+
+
+def test_result_keeps_fractional_params():
+    result = BacktestResult(ticker="AAPL", params={"period": 20, "width": 1.5}, total_return=0, cagr=0, sharpe=0, max_drawdown=0, trades=0, exposure=0)
+    assert result.params == {"period": 20, "width": 1.5}
+
+
+@pytest.mark.parametrize("strategy, grid", [("momentum", {"lookback": [2.5]}), ("sma_cross", {"fast": [10.0]}), ("rsi_reversion", {"period": [-5]})])
+def test_windows_must_be_positive_whole_bars(strategy, grid):
+    with pytest.raises(ValueError, match="positive whole number of bars"):
+        configurations(strategy, grid)
+
+
+def test_sweep_splits_configurations_across_processes():
+    closes = {"AAPL": 100 + np.cumsum(np.random.default_rng(0).normal(size=300))}
+    grid = {"fast": [5, 10, 15, 20], "slow": [30, 50, 100]}
+    engine = BacktestEngine(processes=2)
+    try:
+        parallel = engine.sweep(closes, "sma_cross", grid)
+    finally:
+        engine.shutdown()
+    assert parallel == BacktestEngine(processes=1).sweep(closes, "sma_cross", grid)
+    assert len(parallel) == 12
@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from helpers.paging import InvalidCursorError, encode_cursor
+from model.api.news import NewsAPI
+
+
+def test_news_page_rejects_stale_cursor():
+    with pytest.raises(InvalidCursorError):
+        NewsAPI().pull_data_page(["https://a.example"], encode_cursor("https://gone.example"))
+
+
+def test_news_page_rejects_malformed_cursor():
+    with pytest.raises(InvalidCursorError):
+        NewsAPI().pull_data_page(["https://a.example"], "not a cursor")
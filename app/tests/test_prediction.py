@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+import datetime
+
+import numpy as np
+import orjson
+
+from model.feature_store import FeatureStore
+from model.prediction import FEATURE_COLUMNS, features
+
+
+def test_served_features_match_the_store(tmp_path):
+    rng = np.random.default_rng(7)
+    dates = [str(datetime.date(2023, 1, 2) + datetime.timedelta(days=day)) for day in range(120)]
+    candles = {"time": dates, "close": (100 + rng.standard_normal(120).cumsum()).tolist(), "volumn": rng.integers(1000, 5000, 120).astype(float).tolist()}
+    objects = [{"Key": "AAPL-2023-01-02-2023-05-01-2023-05-01", "ETag": "1", "LastModified": datetime.datetime(2023, 5, 1, tzinfo=datetime.timezone.utc)}]
+    store = FeatureStore(tmp_path, list_objects=lambda prefix: objects, read_object=lambda key: orjson.dumps(candles))
+    store.materialize("AAPL")
+
+    stored = features(store, "AAPL", candles)
+    # A store without the bar, e.g. the bar of today not in the lake yet, has the features computed from the candles.
+    computed = features(FeatureStore(tmp_path / "empty"), "AAPL", candles)
+    assert stored.shape == (len(FEATURE_COLUMNS),)
+    np.testing.assert_allclose(stored, computed, rtol=1e-6)
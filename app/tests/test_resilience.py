@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+import pytest
+
+from helpers.resilience import CircuitBreaker, Upstream, UpstreamUnavailableError
+
+
+class ClientError(Exception):
+    status_code = 403
+
+
+class FakeProvider:
+    """Answers its calls with the next of *answers*, an exception is raised and a number is slept for first."""
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, name: str):
+        with self.lock:
+            self.calls += 1
+            call = self.calls
+            answer = self.answers.pop(0) if len(self.answers) > 1 else self.answers[0]
+        if isinstance(answer, Exception):
+            raise answer
+        if isinstance(answer, (int, float)):
+            time.sleep(answer)
+        return f"{name} {call}"
+
+
+def test_stale_response_is_served_while_pulled_again():
+    provider = FakeProvider(0, 0.2)
+    upstream = Upstream("FakeStale", timeout=1)
+    assert upstream.call("key", provider, "candles", ttl=0.05) == "candles 1"
+    time.sleep(0.1)
+
+    started = time.monotonic()
+    assert upstream.call("key", provider, "candles", ttl=0.05) == "candles 1"
+    assert time.monotonic() - started < 0.1
+    time.sleep(0.3)
+    assert upstream.call("key", provider, "candles", ttl=10) == "candles 2"
+    assert provider.calls == 2
+
+
+def test_open_circuit_answers_without_calling():
+    provider = FakeProvider(ConnectionError("refused"))
+    upstream = Upstream("FakeOpen", failures=2, reset_after=60)
+    for _ in range(2):
+        with pytest.raises(UpstreamUnavailableError, match="refused"):
+            upstream.call("key", provider, "candles")
+
+    with pytest.raises(UpstreamUnavailableError, match="circuit"):
+        upstream.call("key", provider, "candles")
+    assert upstream.breaker.state == CircuitBreaker.OPEN
+    assert provider.calls == 2
+
+
+def test_half_open_circuit_lets_one_probe_through():
+    provider = FakeProvider(ConnectionError("refused"), ConnectionError("refused"), 0.2, 0)
+    upstream = Upstream("FakeProbe", failures=1, reset_after=0.05, workers=2)
+    with pytest.raises(UpstreamUnavailableError):
+        upstream.call("first", provider, "candles")
+    time.sleep(0.1)
+
+    # A failed probe opens the circuit again.
+    with pytest.raises(UpstreamUnavailableError, match="refused"):
+        upstream.call("first", provider, "candles")
+    assert upstream.breaker.state == CircuitBreaker.OPEN
+    time.sleep(0.1)
+
+    probe = threading.Thread(target=upstream.call, args=("probe", provider, "candles"))
+    probe.start()
+    time.sleep(0.05)
+    with pytest.raises(UpstreamUnavailableError, match="circuit"):
+        upstream.call("other", provider, "candles")
+    probe.join()
+    assert upstream.breaker.state == CircuitBreaker.CLOSED
+    assert upstream.call("other", provider, "candles") == "candles 4"
+
+
+def test_calls_share_one_timeout():
+    provider = FakeProvider(0.2)
+    upstream = Upstream("FakeTimeout", timeout=0.3, workers=3)
+    started = time.monotonic()
+    assert upstream.call_all([(name, provider, (name,), None) for name in ("a", "b", "c")]) == ["a 1", "b 2", "c 3"]
+    assert time.monotonic() - started < 0.3
+
+    slow = FakeProvider(0.5)
+    started = time.monotonic()
+    with pytest.raises(UpstreamUnavailableError, match="did not answer"):
+        upstream.call_all([(name, slow, (name,), None) for name in ("d", "e", "f")])
+    assert time.monotonic() - started < 0.45
+
+
+def test_client_errors_do_not_open_the_circuit():
+    provider = FakeProvider(ClientError("forbidden"))
+    upstream = Upstream("FakeClient", failures=1)
+    for _ in range(3):
+        with pytest.raises(ClientError):
+            upstream.call("key", provider, "candles")
+    assert upstream.breaker.state == CircuitBreaker.CLOSED
+    assert provider.calls == 3
+
+
+def test_calls_beyond_the_budget_are_not_sent():
+    provider = FakeProvider(0)
+    upstream = Upstream("FakeBudget", calls_per_minute=3)
+    with pytest.raises(UpstreamUnavailableError, match="exceed the rate budget"):
+        upstream.call_all([(name, provider, (name,), None) for name in ("a", "b", "c", "d")])
+    assert provider.calls == 0
+
+    assert upstream.call_all([(name, provider, (name,), None) for name in ("a", "b", "c")]) == ["a 1", "b 2", "c 3"]
+    with pytest.raises(UpstreamUnavailableError, match="spent"):
+        upstream.call("d", provider, "d")
+    assert provider.calls == 3
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+import datetime
+
+import numpy as np
+import pytest
+
+from helpers.resilience import UpstreamUnavailableError
+from model.screener import Expression, Panel, Screener
+
+
+def panel(tickers: int = 5, days: int = 60) -> Panel:
+    rng = np.random.default_rng(0)
+    dates = [str(datetime.date(2023, 1, 2) + datetime.timedelta(days=day)) for day in range(days)]
+    series = {}
+    for ticker in range(tickers):
+        close = 100 + np.cumsum(rng.normal(size=days))
+        series[f"T{ticker}"] = {"time": dates, "open": list(close), "high": list(close + 1), "low": list(close - 1), "close": list(close), "volumn": [1000.0] * days}
+    return Panel(series)
+
+
+def test_nested_windows_match_their_definition():
+    prices = panel()
+    close = prices.column("close")
+    index = len(prices.dates) - 1
+    # The highest 3 bar high of the last 4 bars is the highest close of the last 6 bars.
+    expected = close[:, index - 5 : index + 1].max(axis=1) > close[:, index - 10]
+    assert (Expression("highest(highest(close, 3), 4) > close[10]").evaluate(prices, index) == expected).all()
+
+
+def test_costly_nested_windows_are_rejected():
+    with pytest.raises(ValueError, match="values per ticker"):
+        Expression("highest(highest(highest(close, 1000), 1000), 1000) > 0")
+
+
+def test_builds_beyond_the_budget_fill_in_the_universe():
+    budget = []
+
+    def pull(ticker: str, from_date: str, to_date: str) -> dict:
+        if not budget:
+            raise UpstreamUnavailableError("The rate budget is spent")
+        budget.pop()
+        return {"time": ["2024-01-02"], "open": [1.0], "high": [1.0], "low": [1.0], "close": [1.0], "volumn": [1.0]}
+
+    screener = Screener(pull, ("A", "B", "C", "D", "E"), workers=1)
+    built = None
+    for tickers in (["A", "B"], ["A", "B", "C", "D"], ["A", "B", "C", "D", "E"]):
+        budget[:] = [1, 1]
+        built = screener.build(built)
+        assert built.tickers == tickers
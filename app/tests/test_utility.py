@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+import asyncio
+
+from helpers.metrics import METRICS
+from helpers.resilience import UpstreamUnavailableError
+from helpers.utility import PoolSaturatedError, Utility
+
+
+def errors(name: str, func) -> float:
+    return METRICS.counter(f"{name}_errors_total", module=func.__module__, function=func.__qualname__).get()
+
+
+def test_measure_runtime_counts_failures():
+    def pull():
+        raise RuntimeError("provider down")
+
+    measured = Utility.measure_runtime(pull)
+    assert measured() is None
+    assert measured() is None
+    assert errors("function", pull) == 2
+
+
+def test_measure_runtime_counts_async_failures():
+    async def pull():
+        raise RuntimeError("provider down")
+
+    assert asyncio.run(Utility.measure_runtime(pull)()) is None
+    assert errors("function", pull) == 1
+
+
+def test_exception_guard_maps_failures():
+    async def saturated():
+        raise PoolSaturatedError("pool is full")
+
+    async def unavailable():
+        raise UpstreamUnavailableError("circuit is open")
+
+    async def broken():
+        raise RuntimeError("bug")
+
+    assert asyncio.run(Utility.exception_guard(saturated)()).status_code == 503
+    assert asyncio.run(Utility.exception_guard(unavailable)()).status_code == 503
+    assert asyncio.run(Utility.exception_guard(broken)()).status_code == 500
+    assert errors("route", saturated) == 1
+    assert errors("route", broken) == 1
@@ -1,16 +1,63 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
-import ast
 import datetime
+from concurrent.futures import ThreadPoolExecutor
 
+import pandas as pd
 import requests
 import streamlit as st
+from requests.adapters import HTTPAdapter
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
 URL_FINHUB = "http://localhost:8080/api/shelby-backend/finnhub/pull-data"
 URL_YAHOO = "http://localhost:8080/api/shelby-backend/yahoo/pull-data"
 URL_NEWS = "http://localhost:8080/api/shelby-backend/news/pull-data"
 
+# Seconds a pulled series is reused across reruns and sessions.
+CACHE_TTL = 300
+REQUEST_TIMEOUT = 60
+
+
+@st.cache_resource
+def get_session() -> requests.Session:
+    """One pooled session shared by every rerun, so the backend connections are kept alive."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def post(url: str, data: dict) -> requests.Response:
+    response = get_session().post(url, data=data, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return response
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def fetch_finnhub(ticker: str, from_date: datetime.date, end_date: datetime.date) -> pd.DataFrame:
+    return pd.DataFrame(post(URL_FINHUB, {"ticker": ticker, "from_date": from_date, "end_date": end_date}).json())
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def fetch_yahoo(ticker: str) -> pd.DataFrame:
+    return pd.DataFrame(post(URL_YAHOO, {"ticker": ticker}).json())
+
+
+def fetch_all(ticker: str, from_date: datetime.date, end_date: datetime.date) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Pull both series at the same time, failed pulls raise and are not cached."""
+    ctx = get_script_run_ctx()
+
+    def run(func, *args):
+        add_script_run_ctx(ctx=ctx)
+        return func(*args)
+
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="Thread - Homepage") as executor:
+        finnhub = executor.submit(run, fetch_finnhub, ticker, from_date, end_date)
+        yahoo = executor.submit(run, fetch_yahoo, ticker)
+        return finnhub.result(), yahoo.result()
+
 
 def input_form():
     with st.form("data-form"):
@@ -30,23 +77,13 @@ def interface():
 
     if export_api:
         with st.spinner("Ngủ đi! Hàng đang về"):
-            response_finnhub = requests.request(
-                "POST",
-                URL_FINHUB,
-                headers={},
-                data={"ticker": ticker, "from_date": from_date, "end_date": end_date},
-            )
-
-            response_yahoo = requests.request(
-                "POST",
-                URL_YAHOO,
-                headers={},
-                data={"ticker": ticker},
-            )
-
-            st.write(response_finnhub.text)
-            st.dataframe(response_finnhub.text, use_container_width=True)
-            st.dataframe(response_yahoo.text, use_container_width=True)
+            try:
+                data_finnhub, data_yahoo = fetch_all(ticker, from_date, end_date)
+            except requests.RequestException as error:
+                st.error(f"Failed to pull the data: {error}")
+            else:
+                st.dataframe(data_finnhub, use_container_width=True)
+                st.dataframe(data_yahoo, use_container_width=True)
 
     news_scraper_section()
 
@@ -57,14 +94,10 @@ def news_scraper_section():
     scrape_button = st.sidebar.button("Scrape Article")
 
     if scrape_button and article_url:
-        response_news = requests.post(
-            URL_NEWS,
-            data={"url": article_url},
-            headers={},
-        )
+        response_news = get_session().post(URL_NEWS, data={"url": article_url}, timeout=REQUEST_TIMEOUT)
 
         if response_news.status_code == 200:
-            news_data = ast.literal_eval(response_news.text)
+            news_data = response_news.json()
 
             st.subheader("News Article Details")
             st.write(f"Title: {news_data['title']}")